@@ -0,0 +1,170 @@
+"""
+The Contacts resource for falcon.asgi.App (e.g. served by uvicorn).\n
+
+SQLite can only be used through blocking calls, so every responder hands the work to
+the (WSGI) Contacts resource in a bounded pool of threads. The event loop is then free
+to look after any number of slow or idle (keep-alive) connections, while only as many
+threads as there are connections to the phonebook talk to it.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import falcon
+from api.resources.contacts import Contacts
+
+
+class BlockingStream:
+    """
+    A file-like object that lets code running in a worker thread read the body of an
+    ASGI request, by reading it in the event loop and waiting for the result
+    """
+
+    def __init__(self, stream, loop: asyncio.AbstractEventLoop):
+        """
+        :param - stream (falcon.asgi.BoundedStream) - the body of the request\n
+        :param - loop (asyncio.AbstractEventLoop) - the event loop the request is
+        being handled in
+        """
+        self.stream = stream
+        self.loop = loop
+
+    def read(self, size: int | None = None) -> bytes:
+        """Reads (at most) size bytes of the body, or all of the rest if size is None"""
+        if size is not None and size < 0:
+            size = None
+
+        return asyncio.run_coroutine_threadsafe(
+            self.stream.read(size), self.loop
+        ).result()
+
+
+class AsyncContacts:
+    """
+    The ASGI version of api.resources.contacts.Contacts, which it shares all of its
+    logic (and the http_methods) with.
+    """
+
+    def __init__(
+        self, contacts: Contacts | None = None, max_workers: int | None = None
+    ):
+        """
+        :param - contacts (Contacts) - the resource to hand the work to (a new one is
+        created if one isn't given)\n
+        :param - max_workers (int) - how many threads can talk to the phonebook at once
+        (the concurrency of the store by default, e.g. the size of the SQLite store's
+        connection pool, as more threads would only wait for a connection)
+        """
+        self.contacts = contacts if contacts is not None else Contacts()
+        self.store = self.contacts.store
+        self.max_workers = (
+            max_workers if max_workers is not None else self.store.concurrency
+        )
+        self.executor = None
+
+        self.open()
+
+    def open(self) -> None:
+        """Starts the threads and lets the store be used (again)"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="phonebook"
+            )
+
+        self.store.reopen()
+
+    def close(self) -> None:
+        """Stops the threads and closes the store of the phonebook"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+        self.contacts.close()
+
+    # The ASGI app calls these when the server starts and shuts down (see main_asgi.py),
+    # which can happen more than once (e.g. in tests)
+    async def process_startup(self, scope, event) -> None:
+        """Opens the resource when the ASGI server starts"""
+        self.open()
+
+    async def process_shutdown(self, scope, event) -> None:
+        """Closes the resource when the ASGI server shuts down"""
+        self.close()
+
+    async def run(self, function, *args):
+        """
+        Runs function(*args) in one of the resource's threads and returns the result
+        """
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self.executor, partial(function, *args))
+
+    async def iterate(self, chunks):
+        """
+        Yields the chunks of a (blocking) iterator, reading each one in a thread. Used
+        for responses that are streamed as they are read from the phonebook.
+        """
+        try:
+            while True:
+                chunk = await self.run(next, chunks, None)
+
+                if chunk is None:
+                    break
+
+                yield chunk
+        finally:
+            # Let go of what the chunks were being read with
+            if hasattr(chunks, "close"):
+                await self.run(chunks.close)
+
+    # Post methods (Create)
+    async def on_post(self, req, resp):
+        """See Contacts.on_post()"""
+        stream = BlockingStream(req.bounded_stream, asyncio.get_running_loop())
+
+        await self.run(self.contacts.post, req, resp, stream)
+
+    # Get methods (Read)
+    async def on_get(self, req, resp):
+        """See Contacts.on_get()"""
+        await self.run(self.contacts.on_get, req, resp)
+
+        if resp.stream is not None:
+            resp.stream = self.iterate(iter(resp.stream))
+
+    async def on_get_search(self, req, resp):
+        """See Contacts.on_get_search()"""
+        await self.run(self.contacts.on_get_search, req, resp)
+
+    async def on_get_suggest(self, req, resp):
+        """See Contacts.on_get_suggest()"""
+        await self.run(self.contacts.on_get_suggest, req, resp)
+
+    async def on_get_stats(self, req, resp):
+        """See Contacts.on_get_stats()"""
+        await self.run(self.contacts.on_get_stats, req, resp)
+
+    async def on_get_by_id(self, req, resp, contact_id: str):
+        """See Contacts.on_get_by_id()"""
+        await self.run(self.contacts.on_get_by_id, req, resp, contact_id)
+
+    # Update method (Update)
+    async def on_put_by_id(self, req, resp, contact_id: str):
+        """See Contacts.on_put_by_id()"""
+        req.content_type = falcon.MEDIA_JSON
+        contact_data = await req.get_media()
+
+        await self.run(self.contacts.put_by_id, req, resp, contact_id, contact_data)
+
+    # Delete method (Delete)
+    async def on_delete_by_id(self, req, resp, contact_id: str):
+        """See Contacts.on_delete_by_id()"""
+        await self.run(self.contacts.on_delete_by_id, req, resp, contact_id)
+
+    async def on_delete(self, req, resp):
+        """See Contacts.on_delete()"""
+        req.content_type = falcon.MEDIA_JSON
+        contacts_data = await req.get_media()
+
+        await self.run(self.contacts.delete, resp, contacts_data)
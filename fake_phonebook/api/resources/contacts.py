@@ -2,38 +2,168 @@
 A resource that users can call to retrieve all the contacts in the phonebook
 """
 
-from json import dumps, loads
+from json import loads
 
 import falcon
+from api.resources.helpers.cache import CachedResult, get_result_cache
+from api.resources.helpers.compression import strip_encoding
+from api.resources.helpers.dial_codes import DIAL_CODES
+from api.resources.helpers.etag import contact_etag
+from api.resources.helpers.media import (
+    LIST_MEDIA_TYPES,
+    OBJECT_MEDIA_TYPES,
+    find_handler,
+    negotiate,
+    serialize,
+)
+from api.resources.helpers.phone import MIN_PHONE_SUFFIX_LENGTH
+from api.resources.helpers.search import MAX_SEARCH_TERMS, MIN_PREFIX_LENGTH
+from api.resources.helpers.streaming import (
+    CHUNK_SIZE,
+    MEDIA_NDJSON,
+    iter_json_array,
+    iter_ndjson,
+    stream_json,
+    stream_ndjson,
+)
+from api.resources.helpers.validation import (
+    ValidationError,
+    validate_contact,
+    validate_contact_ids,
+    validate_update,
+)
 from api.resources.http_methods.delete import (
     delete_contact_from_db,
-    delete_contacts_from_db,
+    delete_contacts_by_id,
+)
+from api.resources.http_methods.get import (
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_SEARCH_LIMIT,
+    DEFAULT_SUGGESTIONS,
+    MAX_PAGE_SIZE,
+    MAX_SEARCH_LIMIT,
+    MAX_SUGGESTIONS,
+    get_contact_by_id,
+    get_contact_stats,
+    get_contacts,
+    get_contacts_by_phone,
+    get_country_filter,
+    get_fields,
+    get_name_filter,
+    get_page_of_contacts,
+    iter_contacts,
+    search_contacts,
+    suggest_contacts,
 )
-from api.resources.http_methods.get import get_contact_by_id, get_contacts
-from api.resources.http_methods.post import post_contact_to_db
+from api.resources.http_methods.post import post_contact_to_db, post_contacts_to_db
 from api.resources.http_methods.update import update_contact_in_db
+from api.resources.stores.base import (
+    CONTACT_FIELDS,
+    ContactStore,
+    NameTakenError,
+    PreconditionFailedError,
+    project,
+)
+from api.resources.stores.config import create_store
+
+
+def send_validation_error(resp, error: ValidationError) -> None:
+    """
+    Sends a 400 (Bad Request) with the errors of a request body that isn't valid, e.g.
+    {"title": "Bad request", "description": "...", "errors": [{"field": "name",
+    "message": "..."}]}
+    """
+    resp.status = falcon.HTTP_400
+    resp.content_type = falcon.MEDIA_JSON
+    resp.media = error.to_media()
 
 
 # Falcon follows the REST architectural style, meaning (among
 # other things) that you think in terms of resources and state
 # transitions, which map to HTTP verbs.
 class Contacts:
+    def __init__(self, store: ContactStore | None = None):
+        """
+        :param - store (ContactStore) - where the phonebook is stored, which this
+        resource owns (the store chosen by the PHONEBOOK_STORE environment variable is
+        created if one isn't given, see api.resources.stores.config)
+        """
+        self.store = store if store is not None else create_store()
+
+    def close(self) -> None:
+        """Closes the store of the phonebook held by this resource"""
+        self.store.close()
+
     # Post methods (Create)
     def on_post(self, req, resp):
         """
         Handles a POST request for adding a new entry into the phonebook.\n
-        {name, phone_number}
+        {name, phone_number}\n
+        If the body is a JSON array (or newline delimited JSON) of these, all of them
+        are added to the phonebook in bulk. So are the rows of a CSV body (with a
+        header row of name,phone_number), or a MessagePack array.
         """
-        req.content_type = falcon.MEDIA_JSON
-        contact_data = loads(dumps(req.media))
+        self.post(req, resp, req.bounded_stream)
+
+    def post(self, req, resp, stream) -> None:
+        """
+        Does the work of on_post(), reading the body of the request from stream (a
+        file-like object), so that the ASGI resource can share it.
+        """
+        if req.content_type is not None and req.content_type.startswith(MEDIA_NDJSON):
+            self.post_in_bulk(resp, iter_ndjson(stream))
+            return
+
+        # Other media types (e.g. CSV) are read by the handlers registered on the app.
+        # JSON isn't, as it is read (and added to the phonebook) as it arrives instead.
+        if req.content_type is not None and not req.content_type.startswith(
+            falcon.MEDIA_JSON
+        ):
+            handler = find_handler(req.options.media_handlers, req.content_type)
 
-        contact_id = post_contact_to_db(contact_data)
+            if handler is not None:
+                try:
+                    media = handler.deserialize(stream, req.content_type, None)
+                except falcon.MediaMalformedError:
+                    media = None
+
+                if isinstance(media, list):
+                    self.post_in_bulk(resp, media)
+                else:
+                    self.post_one(resp, media)
+                return
+
+        # Peek at the start of the body to find out if it is an array of contacts
+        first_chunk = stream.read(CHUNK_SIZE)
+
+        if first_chunk.lstrip().startswith(b"["):
+            self.post_in_bulk(resp, iter_json_array(stream, first_chunk))
+            return
+
+        try:
+            contact_data = loads(first_chunk + stream.read())
+        except ValueError:
+            contact_data = None
+
+        self.post_one(resp, contact_data)
+
+    def post_one(self, resp, contact_data) -> None:
+        """
+        Adds the contact in the body of a POST request to the phonebook, or sends a 400
+        (Bad Request) with the errors of its fields if it isn't valid
+        """
+        try:
+            contact_data = validate_contact(contact_data)
+        except ValidationError as error:
+            send_validation_error(resp, error)
+            return
+
+        contact_id = post_contact_to_db(contact_data, self.store, validated=True)
 
         if contact_id is None:
             resp.status = falcon.HTTP_400
             resp.text = (
-                "Bad request. Please ensure that the 'name' and 'phone_number' "
-                "key-value pairs are present and that this new contact you would like "
+                "Bad request. Please ensure that this new contact you would like to add "
                 "to the phonebook does not currently exist in the phonebook."
             )
         else:
@@ -43,23 +173,352 @@ class Contacts:
                 f"following id: {contact_id}"
             )
 
+    def post_in_bulk(self, resp, contacts_data) -> None:
+        """
+        Adds the contacts in the body of a bulk POST request to the phonebook (while
+        the body is still being read) and responds with the id each contact was added
+        with, or the reason it was not added.
+        """
+        results = post_contacts_to_db(contacts_data, self.store)
+        created = len([result for result in results if "id" in result])
+
+        resp.status = falcon.HTTP_201 if created != 0 else falcon.HTTP_400
+        resp.media = {
+            "created": created,
+            "rejected": len(results) - created,
+            "results": results,
+        }
+
     # Get methods (Read)
     def on_get(self, req, resp):
-        """Handles GET requests"""
+        """
+        Handles GET requests.\n
+        If a phone query parameter is given, only the contacts with that phone number
+        are returned (or whose phone number ends with it, with match=suffix).\n
+        If a country query parameter is given (e.g. country=GB), only the contacts whose
+        phone number is from that country are returned.\n
+        If a fields query parameter is given (e.g. fields=id,name), only those fields of
+        the contacts are returned (and read from the phonebook).\n
+        If a limit and/or cursor query parameter is given, only a page of contacts is
+        returned and the link to the next page is given in the Link header.\n
+        Otherwise, if the client accepts application/x-ndjson or gives the stream=1
+        query parameter, the contacts are streamed as they are read from the phonebook.
+        \n
+        Lists of contacts that aren't streamed are cached (until the phonebook changes)
+        and given an ETag, so clients can send If-None-Match to get a 304 (Not Modified)
+        if nothing has changed. They are sent as CSV, MessagePack or newline delimited
+        JSON instead of JSON if the client's Accept header prefers them.
+        """
         resp.status = falcon.HTTP_200  # This is the default status
         resp.content_type = falcon.MEDIA_JSON
-        resp.media = get_contacts(req.params)
+
+        if "phone" in req.params:
+            try:
+                fields = get_fields(req.params)
+            except ValueError:
+                # read_contacts_by_phone() refuses them, with the 400 below
+                fields = None
+
+            self.send_result(
+                req,
+                resp,
+                lambda: self.read_contacts_by_phone(req),
+                "Bad request. Please give (at least one digit of) a phone number in the "
+                "phone query parameter, with match=exact (the default) or match=suffix "
+                f"(which needs at least {MIN_PHONE_SUFFIX_LENGTH} digits), and that "
+                f"fields is some of {','.join(CONTACT_FIELDS)}. The phone "
+                "query parameter can't be used with the name, country, cursor or stream "
+                "ones.",
+                fields=fields,
+            )
+            return
+
+        # Checked before the contacts are streamed, as a 400 can't be sent once they are
+        try:
+            get_name_filter(req.params)
+            get_country_filter(req.params)
+            fields = get_fields(req.params)
+        except ValueError:
+            resp.status = falcon.HTTP_400
+            resp.text = (
+                "Bad request. Please ensure that the name query parameter is only given "
+                "once, that the country one is the code of a country (e.g. country=GB) "
+                "and that the fields one is some of "
+                f"{','.join(CONTACT_FIELDS)} (e.g. fields=id,name)."
+            )
+            return
+
+        paginated = "limit" in req.params or "cursor" in req.params
+
+        # When both are equally acceptable (i.e. */*), client_prefers() picks the last
+        # one, so JSON stays the default
+        if (
+            not paginated
+            and req.client_prefers([MEDIA_NDJSON, falcon.MEDIA_JSON]) == MEDIA_NDJSON
+        ):
+            resp.content_type = MEDIA_NDJSON
+            resp.stream = stream_ndjson(iter_contacts(req.params, self.store))
+            return
+
+        if not paginated and req.get_param_as_bool("stream", default=False):
+            resp.stream = stream_json(iter_contacts(req.params, self.store))
+            return
+
+        self.send_result(
+            req,
+            resp,
+            lambda: self.read_contacts(req, paginated),
+            "Bad request. Please ensure that the cursor is one given in the Link header "
+            "of a previous page of contacts.",
+            fields=fields,
+        )
+
+    def read_contacts_by_phone(self, req) -> tuple[list[dict[str, str]], None]:
+        """
+        Reads the contacts with the phone number (or the end of it) given in the phone
+        query parameter and returns them (there is no next page).\n
+
+        Raises a ValueError if the query parameters are not valid.
+        """
+        if any(
+            param in req.params for param in ["name", "country", "cursor", "stream"]
+        ):
+            raise ValueError(
+                "phone can't be used with name, country, cursor or stream."
+            )
+
+        limit = req.get_param_as_int(
+            "limit", min_value=1, max_value=MAX_PAGE_SIZE, default=DEFAULT_PAGE_SIZE
+        )
+        contacts = get_contacts_by_phone(
+            req.get_param("phone"),
+            req.get_param("match", default="exact"),
+            limit,
+            self.store,
+            get_fields(req.params),
+        )
+
+        return contacts, None
+
+    def send_result(
+        self,
+        req,
+        resp,
+        read,
+        bad_request: str,
+        media_types: tuple[str, ...] = LIST_MEDIA_TYPES,
+        fields: tuple[str, ...] | None = None,
+    ) -> None:
+        """
+        Sends what read() returns (the media and the link to its next page, or None),
+        written as the one of media_types the client prefers, or the result cached for
+        the request's uri (and media type) if the phonebook hasn't changed since it was
+        read.\n
+
+        If read() raises a ValueError, a 400 (Bad Request) is sent with the text
+        bad_request. If the request's If-None-Match header matches the result's ETag, a
+        304 (Not Modified) is sent instead of the result.\n
+
+        fields are the fields of the contacts read() returns (see
+        api.resources.helpers.media.serialize()), if only some of them were asked for.
+        """
+        media_type = negotiate(req, resp, media_types)
+        key = f"{media_type} {req.relative_uri}"
+
+        # Caches between the api and the client have to tell the media types apart too
+        resp.append_header("Vary", "Accept")
+
+        # The version of the phonebook is read before reading from it, so a result
+        # read while the phonebook changes is cached under a version that is already
+        # out of date (and so is never served)
+        cache = get_result_cache(self.store.name)
+        version = self.store.version()
+        result = cache.get(key, version)
+
+        if result is None:
+            try:
+                media, next_link = read()
+            except ValueError:
+                resp.status = falcon.HTTP_400
+                resp.text = bad_request
+                return
+
+            result = CachedResult(serialize(resp, media, media_type, fields), next_link)
+            cache.put(key, version, result)
+
+        resp.content_type = media_type
+        resp.etag = result.etag
+
+        if result.next_link is not None:
+            resp.append_link(result.next_link, "next")
+
+        # A client that was sent a compressed result sends its ETag back with the
+        # encoding on the end
+        matches = [
+            etag
+            for etag in req.if_none_match or []
+            if etag == "*" or strip_encoding(etag) == result.etag
+        ]
+
+        if len(matches) != 0:
+            resp.status = falcon.HTTP_304
+            resp.delete_header("Content-Type")
+
+            # The 304 has the ETag of the (compressed or not) result the client has
+            if matches[0] != "*":
+                resp.set_header("ETag", matches[0].dumps())
+            return
+
+        resp.data = result.body
+
+    def read_contacts(
+        self, req, paginated: bool
+    ) -> tuple[list[dict[str, str]], str | None]:
+        """
+        Reads (a page of) the contacts asked for from the phonebook and returns them,
+        along with the link to the next page (if there is one).\n
+
+        Raises a ValueError if the cursor query parameter is not valid.
+        """
+        next_link = None
+
+        if not paginated:
+            contacts = get_contacts(req.params, self.store)
+        else:
+            limit = req.get_param_as_int(
+                "limit", min_value=1, max_value=MAX_PAGE_SIZE, default=DEFAULT_PAGE_SIZE
+            )
+            contacts, next_cursor = get_page_of_contacts(
+                req.params, limit, req.get_param("cursor"), self.store
+            )
+
+            if next_cursor is not None:
+                params = dict(req.params, limit=limit, cursor=next_cursor)
+                next_link = f"{req.path}{falcon.to_query_str(params)}"
+
+        return contacts, next_link
+
+    def on_get_search(self, req, resp):
+        """
+        Handles a GET request for searching the phonebook by name, e.g.
+        /contacts/search?q=smith&limit=10.\n
+        Returns the contacts whose names have every word in q (a word ending in * only
+        has to start a word in the name), best matches first. Results are cached and
+        given an ETag like the list of contacts.
+        """
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+
+        query = req.get_param("q", default="")
+        limit = req.get_param_as_int(
+            "limit",
+            min_value=1,
+            max_value=MAX_SEARCH_LIMIT,
+            default=DEFAULT_SEARCH_LIMIT,
+        )
+
+        self.send_result(
+            req,
+            resp,
+            lambda: (search_contacts(query, limit, self.store), None),
+            "Bad request. Please give the words to search for in the q query "
+            "parameter, e.g. /contacts/search?q=smith (at most "
+            f"{MAX_SEARCH_TERMS} words, and words ending in * must have at least "
+            f"{MIN_PREFIX_LENGTH} letters or digits).",
+        )
+
+    def on_get_suggest(self, req, resp):
+        """
+        Handles a GET request for suggesting names as they are typed, e.g.
+        /contacts/suggest?prefix=john+s&k=5.\n
+        Returns the id and name of (at most k) contacts whose name starts with prefix
+        (ignoring case and accents), in alphabetical order. These aren't cached, as
+        looking them up is quicker than a cache would be.
+        """
+        prefix = req.get_param("prefix", default="")
+        k = req.get_param_as_int(
+            "k", min_value=1, max_value=MAX_SUGGESTIONS, default=DEFAULT_SUGGESTIONS
+        )
+
+        if len(prefix.strip()) == 0:
+            resp.status = falcon.HTTP_400
+            resp.text = (
+                "Bad request. Please give the start of a name in the prefix query "
+                "parameter, e.g. /contacts/suggest?prefix=jo"
+            )
+            return
+
+        media_type = negotiate(req, resp, LIST_MEDIA_TYPES)
+
+        resp.status = falcon.HTTP_200
+        resp.content_type = media_type
+        resp.append_header("Vary", "Accept")
+        resp.data = serialize(
+            resp, suggest_contacts(prefix, k, self.store), media_type, ("id", "name")
+        )
+
+    def on_get_stats(self, req, resp):
+        """
+        Handles a GET request for how many contacts there are in the phonebook and how
+        many of them are from each country, e.g.\n
+        {"contacts": 3, "countries": [{"code": "GB", "name": "United Kingdom",
+        "dial_code": "+44", "contacts": 2}], "unknown_country": 1}\n
+        The counts are cached and given an ETag like the list of contacts.
+        """
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+
+        self.send_result(
+            req,
+            resp,
+            lambda: (get_contact_stats(self.store), None),
+            "Bad request.",
+            OBJECT_MEDIA_TYPES,
+        )
 
     def on_get_by_id(self, req, resp, contact_id: str):
-        """Handles a GET request for a specific contact"""
+        """
+        Handles a GET request for a specific contact.\n
+        The contact's ETag can be sent back in the If-Match header of a PUT request, so
+        that the contact is only updated if it hasn't changed since.\n
+        The contact comes with the country its phone number is from (its code, name and
+        dial code), or null if that isn't known.\n
+        If a fields query parameter is given (e.g. fields=name,country), only those
+        fields of the contact are returned. The ETag is still that of the whole contact.
+        \n
+        The contact is sent as MessagePack instead of JSON if the client prefers it.
+        """
         resp.content_type = falcon.MEDIA_JSON
 
-        if get_contact_by_id(contact_id) is None:
+        try:
+            fields = get_fields(req.params, CONTACT_FIELDS + ("country",))
+        except ValueError:
+            resp.status = falcon.HTTP_400
+            resp.text = (
+                "Bad request. Please ensure that the fields query parameter is some of "
+                f"{','.join(CONTACT_FIELDS + ('country',))}.\n"
+            )
+            return
+
+        contact = get_contact_by_id(contact_id, self.store)
+
+        if contact is None:
             resp.status = falcon.HTTP_404
             resp.text = f"Contact with id: '{contact_id}' was not found.\n"
         else:
             resp.status = falcon.HTTP_200
-            resp.media = get_contact_by_id(contact_id)
+            resp.etag = contact_etag(
+                contact["id"], contact["name"], contact["phone_number"]
+            )
+            # The country is only worked out if it is asked for
+            if fields is None or "country" in fields:
+                contact = dict(
+                    contact, country=DIAL_CODES.resolve(contact["phone_number"])
+                )
+
+            resp.content_type = negotiate(req, resp, OBJECT_MEDIA_TYPES)
+            resp.append_header("Vary", "Accept")
+            resp.media = project(contact, fields)
 
     # Update method (Update)
     def on_put_by_id(self, req, resp, contact_id: str):
@@ -67,23 +526,66 @@ class Contacts:
         Handles a PUT request for updating information about someone in the phonebook
         (either name or phone_number).\n
         The user of the api will receive a message saying that a contact (identified by
-        their id is has a (new) name and (new) phone number.
+        their id is has a (new) name and (new) phone number.\n
+        If an If-Match header is given, the contact is only updated if its ETag matches
+        (otherwise the response is 412 Precondition Failed).\n
+        Renaming a contact to the name of another contact (ignoring case) is refused
+        with a 409 (Conflict).
         """
         req.content_type = falcon.MEDIA_JSON
-        contact_data = loads(dumps(req.media))
+        self.put_by_id(req, resp, contact_id, req.media)
+
+    def put_by_id(self, req, resp, contact_id: str, contact_data) -> None:
+        """
+        Does the work of on_put_by_id() once the body of the request (contact_data) has
+        been read, so that the ASGI resource can share it.
+        """
+        try:
+            contact_data = validate_update(contact_data)
+        except ValidationError as error:
+            send_validation_error(resp, error)
+            return
+
         contact_data["id"] = contact_id
 
-        updated_contact = update_contact_in_db(contact_data)
+        # Weak ETags never match an If-Match header, and the ETag of a compressed
+        # response matches the contact it is of
+        if_match = None
+        if req.if_match is not None:
+            if_match = [
+                strip_encoding(etag)
+                for etag in req.if_match
+                if not getattr(etag, "is_weak", False)
+            ]
 
-        if updated_contact is None:
-            resp.status = falcon.HTTP_400
+        try:
+            updated_contact = update_contact_in_db(
+                contact_data, self.store, if_match, validated=True
+            )
+        except PreconditionFailedError:
+            resp.status = falcon.HTTP_412
+            resp.text = (
+                f"The contact with id: {contact_id} has changed since it was last read."
+            )
+            return
+        except NameTakenError:
+            resp.status = falcon.HTTP_409
             resp.text = (
-                "Bad request. Please ensure that the 'name' and 'phone_number' "
-                "key-value pairs are present in the body of the api call and that the "
-                "contact you would like to update the details of exists in the phonebook. "
+                "Another contact in the phonebook is already called "
+                f"{contact_data.get('name')}."
             )
+            return
+
+        if updated_contact is None:
+            resp.status = falcon.HTTP_404
+            resp.text = f"Contact with id: {contact_id} was not found."
         else:
             resp.status = falcon.HTTP_201
+            resp.etag = contact_etag(
+                updated_contact["id"],
+                updated_contact["name"],
+                updated_contact["phone_number"],
+            )
             resp.text = (
                 f"The contact with an id of {updated_contact.get('id')} was updated to "
                 f"be called {updated_contact.get('name')}, with a phone number of: "
@@ -97,13 +599,12 @@ class Contacts:
         The user of the api will receive a message saying that a contact (identified by
         their name and phone number) has been removed from the phonebook.
         """
-        contact_data = get_contact_by_id(contact_id)
+        deleted_data = delete_contact_from_db({"id": contact_id}, self.store)
 
-        if contact_data is None:
+        if deleted_data is None:
             resp.status = falcon.HTTP_404
             resp.text = f"Contact with id: {contact_id} was not found."
         else:
-            deleted_data = delete_contact_from_db(contact_data)
             resp.status = falcon.HTTP_201
             resp.text = (
                 f"A contact, called {deleted_data.get('name')}, with a phone number "
@@ -114,29 +615,42 @@ class Contacts:
     def on_delete(self, req, resp):
         """
         Handles a DELETE request for deleting multiple entries in the phonebook.\n
-        The user of the api will receive a message listing the contacts (identified by
-        their name and phone number) have been removed from the phonebook.
+        The user of the api will receive a JSON object with the number of contacts
+        removed from the phonebook, the contacts themselves (their id, name and phone
+        number) and the ids that were not found in the phonebook.
         """
         req.content_type = falcon.MEDIA_JSON
-        contacts_data = loads(dumps(req.media))
+        self.delete(resp, req.media)
+
+    def delete(self, resp, contacts_data) -> None:
+        """
+        Does the work of on_delete() once the body of the request (contacts_data) has
+        been read, so that the ASGI resource can share it.
+        """
+        try:
+            contact_ids = validate_contact_ids(contacts_data)
+        except ValidationError as error:
+            send_validation_error(resp, error)
+            return
 
-        deleted_data = delete_contacts_from_db(contacts_data)
+        deleted_data = delete_contacts_by_id(contact_ids, self.store)
 
         if deleted_data is None:
             resp.status = falcon.HTTP_400
             resp.text = (
-                "Bad request. Please ensure that you have supplied a list of ids of "
-                "the contacts you would like to remove is given as key-value pairs, in "
-                "the body of the api call and that these ids exist in the phonebook."
+                "Bad request. Please ensure that the ids of the contacts you would like "
+                "to remove exist in the phonebook."
             )
         else:
-            resp.status = falcon.HTTP_201
-            part_of_response = ""
-            for contact in deleted_data:
-                part_of_response += (
-                    f"A contact, called {contact.get('name')}, with a phone number "
-                    f"of '{contact.get('phone_number')}' has been removed from the "
-                    "phonebook.\n"
-                )
+            deleted_ids = set(contact["id"] for contact in deleted_data)
 
-            resp.text = part_of_response
+            resp.status = falcon.HTTP_201
+            resp.media = {
+                "deleted": len(deleted_data),
+                "contacts": deleted_data,
+                "not_found": [
+                    contact_id
+                    for contact_id in contact_ids
+                    if contact_id not in deleted_ids
+                ],
+            }
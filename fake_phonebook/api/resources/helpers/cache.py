@@ -0,0 +1,308 @@
+"""
+In-process caches of contacts by their id and of (serialized) lists of contacts, so
+that reading the same contact or list again does not have to go to the database.
+
+The http methods keep the caches up to date whenever they write to the database. Other
+processes (e.g. the other workers of a server, or anything writing to the database
+directly) can't do this, so the caches also watch the version of the contacts (see
+ContactStore.version(), which every process sees change):\n
+
+- every cached list keeps the version it was read at, and is only used while the
+contacts are still at that version (reading a list costs far more than the version)\n
+- the cache of contacts checks the version at most every check_interval seconds, and
+is cleared when it has changed, so a contact that is cached is returned without going
+to the database at all. A write by another process is seen within check_interval
+seconds.\n
+
+Entries also expire after a while.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 60.0
+DEFAULT_VERSION_CHECK_INTERVAL = 1.0
+
+DEFAULT_RESULT_CACHE_SIZE = 256
+DEFAULT_MAX_RESULT_SIZE = 8 * 1024 * 1024
+
+
+class ContactCache:
+    """
+    A bounded, least recently used cache of contacts (dictionaries) keyed by their id,
+    whose entries expire ttl seconds after they were cached. It is cleared whenever
+    check_version() finds that the version of the contacts has changed.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        ttl: float = DEFAULT_CACHE_TTL,
+        check_interval: float = DEFAULT_VERSION_CHECK_INTERVAL,
+    ):
+        """
+        :param - max_size (int) - the most contacts the cache will hold\n
+        :param - ttl (float) - how many seconds a contact stays in the cache\n
+        :param - check_interval (float) - how many seconds check_version() goes without
+        reading the version of the contacts again
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_interval = check_interval
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_check = 0.0
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._version_checks = 0
+        self._version_changes = 0
+
+    def check_version(self, read_version) -> None:
+        """
+        Clears the cache if the version of the contacts has changed since it was last
+        checked (i.e. anyone, in any process, has written to them since). The version
+        is only read (with read_version()) if check_interval seconds have passed since
+        it last was, so this is free most of the time.\n
+
+        :param - read_version (function) - returns the current version of the contacts,
+        e.g. ContactStore.version
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            if now < self._next_check:
+                return
+
+            # Set before the version is read, so that only one thread reads it
+            self._next_check = now + self.check_interval
+
+        version = read_version()
+
+        with self._lock:
+            self._version_checks += 1
+
+            if version != self._version:
+                if self._version is not None:
+                    self._version_changes += 1
+
+                self._version = version
+                self._entries.clear()
+
+    def get(self, contact_id: str) -> dict[str, str] | None:
+        """
+        Returns a copy of the cached contact with this id, or None if it isn't cached
+        (or has expired)
+        """
+        with self._lock:
+            entry = self._entries.get(contact_id)
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            expires_at, contact = entry
+
+            if expires_at < time.monotonic():
+                del self._entries[contact_id]
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(contact_id)
+            self._hits += 1
+
+            return dict(contact)
+
+    def put(self, contact: dict[str, str]) -> None:
+        """
+        Caches (a copy of) a contact under its id, evicting the least recently used
+        contact if the cache is full
+        """
+        with self._lock:
+            self._entries[contact["id"]] = (time.monotonic() + self.ttl, dict(contact))
+            self._entries.move_to_end(contact["id"])
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, contact_id: str) -> None:
+        """Removes the contact with this id from the cache (if it is cached)"""
+        with self._lock:
+            self._entries.pop(contact_id, None)
+
+    def clear(self) -> None:
+        """Removes every contact from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """Returns how often the cache was hit or missed and how full it is"""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "version_checks": self._version_checks,
+                "version_changes": self._version_changes,
+            }
+
+
+class CachedResult:
+    """
+    The serialized body of a response listing contacts, its (strong) ETag and the link
+    to its next page (if there is one).
+    """
+
+    def __init__(self, body: bytes, next_link: str | None = None):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.next_link = next_link
+
+
+class ResultCache:
+    """
+    A bounded, least recently used cache of serialized lists of contacts, keyed by the
+    query (i.e. the filters) that produced them, along with the version of the contacts
+    they were read at.\n
+
+    The version changes on every write to the contacts (by any process), so a cached
+    list is never served once the contacts it was read from have changed.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_RESULT_CACHE_SIZE,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_result_size: int = DEFAULT_MAX_RESULT_SIZE,
+    ):
+        """
+        :param - max_size (int) - the most results the cache will hold\n
+        :param - ttl (float) - how many seconds a result stays in the cache\n
+        :param - max_result_size (int) - results bigger than this (in bytes) are not
+        cached
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_result_size = max_result_size
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+
+    def clear(self) -> None:
+        """Removes every cached result (once this process has changed the contacts)"""
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, query: str, version: int) -> CachedResult | None:
+        """
+        Returns the cached result of the query if it was read at this version of the
+        contacts (their current version), or None if it isn't cached (or has expired)
+        """
+        with self._lock:
+            entry = self._entries.get(query)
+
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                self._entries.pop(query, None)
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(query)
+            self._hits += 1
+
+            return entry[2]
+
+    def put(self, query: str, version: int, result: CachedResult) -> None:
+        """
+        Caches the result of a query that was read at the given version of the
+        contacts.\n
+
+        :param - query (str) - the path and query string of the request\n
+        :param - version (int) - the version of the contacts from before the query was
+        run (if they changed while it was running, the result is never served, as the
+        version it is cached under is already out of date)\n
+        :param - result (CachedResult) - the serialized contacts
+        """
+        if len(result.body) > self.max_result_size:
+            return
+
+        with self._lock:
+            self._entries[query] = (version, time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(query)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        """Returns how often the cache was hit or missed and how full it is"""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+_caches = {}
+_result_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_contact_cache(path_to_db: str) -> ContactCache:
+    """
+    Returns the cache of contacts in the database at path_to_db.\n
+
+    Every pool of connections to the same database shares one cache, so that a write
+    through one pool is seen by readers using another.
+    """
+    with _caches_lock:
+        if path_to_db not in _caches:
+            _caches[path_to_db] = ContactCache()
+
+        return _caches[path_to_db]
+
+
+def get_result_cache(path_to_db: str) -> ResultCache:
+    """
+    Returns the cache of lists of contacts read from the database at path_to_db (shared
+    by every pool of connections to it)
+    """
+    with _caches_lock:
+        if path_to_db not in _result_caches:
+            _result_caches[path_to_db] = ResultCache()
+
+        return _result_caches[path_to_db]
+
+
+def invalidate_contacts(path_to_db: str, contact_ids: list[str]) -> None:
+    """
+    Drops the contacts with these ids from the cache, and every cached list of contacts
+    (the version of the contacts has changed, so they would never be served again).
+    Every write path calls this once it has committed.\n
+
+    :param - path_to_db (str) - the database that was written to\n
+    :param - contact_ids (list of str) - the ids of the contacts written
+    """
+    contact_cache = get_contact_cache(path_to_db)
+
+    for contact_id in contact_ids:
+        contact_cache.invalidate(contact_id)
+
+    get_result_cache(path_to_db).clear()
@@ -0,0 +1,446 @@
+"""
+A middleware that compresses response bodies for the clients that accept it (see their
+Accept-Encoding header), with gzip, or zstd or brotli if the zstandard or brotli
+package is installed.\n
+
+Lists of contacts are very repetitive JSON (the same keys, and phone numbers that start
+the same way), so they compress to a small part of their size. Bodies smaller than
+min_size are sent as they are, as compressing them would save less than it costs.
+Streamed bodies (which can be any size) are always compressed, a chunk at a time. Each
+chunk is flushed, so the client can decode everything it has been sent so far.\n
+
+A compressed response keeps a strong ETag, with the encoding added to the end of it
+(e.g. "abc" is "abc-gzip"), as its bytes are different to the uncompressed ones. The
+resources take the encoding off the ETags that clients send back (see
+strip_encoding()), so they still match If-Match and If-None-Match headers.\n
+
+How many bytes went into the compressors and how many came out is counted (see
+CompressionMiddleware.stats()), to tune the level and min_size by.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import zlib
+
+from api.resources.helpers.storage import flag
+from api.resources.helpers.streaming import CHUNK_SIZE
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVEL = 6
+
+# Only text is worth compressing (and the api only sends text)
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class _Gzip:
+    """A gzip compressor (zlib's deflate in a gzip wrapper, as browsers expect)"""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Zstd:
+    """A zstd compressor (only used if the zstandard package is installed)"""
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+class _Brotli:
+    """A brotli compressor (only used if the brotli package is installed)"""
+
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+# The compressors of every encoding (by its name in Accept-Encoding), in the order they
+# are preferred in when a client accepts more than one equally
+ENCODERS = {"zstd": _Zstd, "br": _Brotli, "gzip": _Gzip}
+
+# The encodings whose packages are installed
+AVAILABLE_ENCODINGS = tuple(
+    encoding
+    for encoding, available in [
+        ("zstd", zstandard is not None),
+        ("br", brotli is not None),
+        ("gzip", True),
+    ]
+    if available
+)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    Returns the ETag header of a response once it is compressed with an encoding, e.g.
+    "abc" is "abc-gzip" (and a weak ETag stays weak)\n
+
+    :param - etag (str) - the ETag header of the uncompressed response\n
+    :param - encoding (str) - the encoding the response is compressed with
+    """
+    prefix = "W/" if etag.startswith("W/") else ""
+    tag = etag[len(prefix) :].strip('"')
+
+    return f'{prefix}"{tag}-{encoding}"'
+
+
+def strip_encoding(etag: str) -> str:
+    """
+    Returns the ETag (without its quotes, as falcon parses If-Match and If-None-Match
+    headers) of a response before it was compressed, e.g. abc-gzip is abc. ETags that
+    don't end with an encoding are returned as they are.
+    """
+    tag, _, encoding = etag.rpartition("-")
+
+    return tag if encoding in ENCODERS and len(tag) != 0 else str(etag)
+
+
+def choose_encoding(
+    accept_encoding: str | None, encodings: tuple[str, ...]
+) -> str | None:
+    """
+    Returns the encoding (of encodings, which are in order of preference) that a client
+    with this Accept-Encoding header wants the most, or None if it doesn't accept any of
+    them (or didn't send the header).\n
+
+    e.g. "gzip, br;q=0.5" prefers gzip, "*" accepts any and "gzip;q=0" refuses gzip.
+    """
+    if accept_encoding is None:
+        return None
+
+    qualities = {}
+
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+
+        for parameter in parameters.split(";"):
+            name, _, value = parameter.partition("=")
+
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if len(coding) != 0:
+            qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+
+        # Ties go to the encoding that comes first
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses the bodies of the responses (see the module docstring). Works with both
+    the WSGI (main.py) and ASGI (main_asgi.py) apps.
+    """
+
+    def __init__(
+        self,
+        min_size: int = DEFAULT_MIN_SIZE,
+        level: int = DEFAULT_LEVEL,
+        encodings: tuple[str, ...] | None = None,
+    ):
+        """
+        :param - min_size (int) - the smallest body (in bytes) that is compressed\n
+        :param - level (int) - how hard to compress, from 1 (fastest) to 9 (smallest).
+        The same level is given to zstd and brotli, whose scales go further.\n
+        :param - encodings (tuple) - the encodings to offer, in order of preference (all
+        the available ones by default, an empty tuple turns compression off)
+        """
+        encodings = AVAILABLE_ENCODINGS if encodings is None else tuple(encodings)
+
+        for encoding in encodings:
+            if encoding not in ENCODERS:
+                raise ValueError(f"The encodings must be some of {tuple(ENCODERS)}.")
+
+            if encoding not in AVAILABLE_ENCODINGS:
+                raise ValueError(
+                    f"{encoding} is not available (its package isn't installed)."
+                )
+
+        if min_size < 0:
+            raise ValueError("min_size can't be negative.")
+
+        if not 1 <= level <= 9:
+            raise ValueError("The level must be between 1 and 9.")
+
+        self.min_size = int(min_size)
+        self.level = int(level)
+        self.encodings = encodings
+
+        self._lock = threading.Lock()
+        self._responses = {encoding: 0 for encoding in encodings}
+        self._too_small = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._compress_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "CompressionMiddleware":
+        """
+        Returns the middleware configured by the environment variables, using the
+        defaults of CompressionMiddleware for any that aren't set:\n
+        PHONEBOOK_COMPRESSION (0 turns compression off), PHONEBOOK_COMPRESSION_MIN_SIZE,
+        PHONEBOOK_COMPRESSION_LEVEL and PHONEBOOK_COMPRESSION_ENCODINGS (a comma
+        separated list, e.g. gzip or zstd,gzip)
+        """
+        variables = {
+            "enabled": ("PHONEBOOK_COMPRESSION", flag),
+            "min_size": ("PHONEBOOK_COMPRESSION_MIN_SIZE", int),
+            "level": ("PHONEBOOK_COMPRESSION_LEVEL", int),
+        }
+
+        kwargs = {}
+
+        for parameter, (variable, convert) in variables.items():
+            if environ.get(variable) is None:
+                continue
+
+            try:
+                kwargs[parameter] = convert(environ[variable])
+            except ValueError:
+                raise ValueError(
+                    f"{variable} must be a {convert.__name__}, not "
+                    f"'{environ[variable]}'."
+                )
+
+        if not kwargs.pop("enabled", True):
+            return cls(encodings=())
+
+        if environ.get("PHONEBOOK_COMPRESSION_ENCODINGS") is not None:
+            kwargs["encodings"] = tuple(
+                encoding.strip().lower()
+                for encoding in environ["PHONEBOOK_COMPRESSION_ENCODINGS"].split(",")
+                if len(encoding.strip()) != 0
+            )
+
+        return cls(**kwargs)
+
+    def _choose(self, req, resp) -> str | None:
+        """Returns the encoding to compress the response with, or None to leave it"""
+        if (
+            len(self.encodings) == 0
+            or req.method == "HEAD"
+            or resp.get_header("Content-Encoding") is not None
+            # (media without a content type is sent as the default media type)
+            or not (resp.content_type or resp.options.default_media_type).startswith(
+                COMPRESSIBLE_TYPES
+            )
+        ):
+            return None
+
+        # Whether or not this response is compressed, caches have to know that another
+        # Accept-Encoding could get a different one
+        resp.append_header("Vary", "Accept-Encoding")
+
+        return choose_encoding(req.get_header("Accept-Encoding"), self.encodings)
+
+    def _set_headers(self, resp, encoding: str) -> None:
+        """Marks a response as compressed with this encoding"""
+        resp.set_header("Content-Encoding", encoding)
+        resp.delete_header("Content-Length")
+
+        # The compressed bytes are a different representation of the same contacts, so
+        # they get their own (strong) ETag, which can still be sent in an If-Match
+        etag = resp.get_header("ETag")
+
+        if etag is not None:
+            resp.set_header("ETag", encoded_etag(etag, encoding))
+
+    def _count(self, bytes_in: int, bytes_out: int, seconds: float) -> None:
+        """Adds to the number of bytes compressed and the time it took"""
+        with self._lock:
+            self._bytes_in += bytes_in
+            self._bytes_out += bytes_out
+            self._compress_seconds += seconds
+
+    def _count_response(self, encoding: str | None) -> None:
+        """Counts a response compressed with an encoding, or one too small to (None)"""
+        with self._lock:
+            if encoding is None:
+                self._too_small += 1
+            else:
+                self._responses[encoding] += 1
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        """Returns a whole body compressed with an encoding"""
+        started = time.perf_counter()
+        compressor = ENCODERS[encoding](self.level)
+        compressed = compressor.compress(body) + compressor.finish()
+        self._count(len(body), len(compressed), time.perf_counter() - started)
+
+        return compressed
+
+    def _compress_chunk(self, compressor, chunk: bytes) -> bytes:
+        """Returns a chunk of a streamed body, compressed and flushed"""
+        started = time.perf_counter()
+        compressed = compressor.compress(chunk) + compressor.flush()
+        self._count(len(chunk), len(compressed), time.perf_counter() - started)
+
+        return compressed
+
+    def _finish(self, compressor) -> bytes:
+        """Returns the end of a streamed body"""
+        started = time.perf_counter()
+        compressed = compressor.finish()
+        self._count(0, len(compressed), time.perf_counter() - started)
+
+        return compressed
+
+    def _compress_stream(self, stream, encoding: str):
+        """Yields the chunks of a (WSGI) streamed body, compressed as they come"""
+        compressor = ENCODERS[encoding](self.level)
+
+        # Falcon lets a stream be a file-like object as well as an iterable
+        if hasattr(stream, "read"):
+            chunks = iter(lambda: stream.read(CHUNK_SIZE), b"")
+        else:
+            chunks = iter(stream)
+
+        try:
+            for chunk in chunks:
+                if len(chunk) != 0:
+                    yield self._compress_chunk(compressor, chunk)
+
+            yield self._finish(compressor)
+        finally:
+            # If the client goes away part way through, let go of what the stream
+            # is being read with (e.g. a connection) straight away
+            if hasattr(stream, "close"):
+                stream.close()
+
+    async def _compress_stream_async(self, stream, encoding: str):
+        """Yields the chunks of an (ASGI) streamed body, compressed as they come"""
+        compressor = ENCODERS[encoding](self.level)
+
+        try:
+            async for chunk in stream:
+                if len(chunk) != 0:
+                    yield self._compress_chunk(compressor, chunk)
+
+            yield self._finish(compressor)
+        finally:
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+
+    def process_response(self, req, resp, resource, req_succeeded: bool) -> None:
+        """Compresses the body of a response of the WSGI app, if it should be"""
+        encoding = self._choose(req, resp)
+
+        if encoding is None:
+            return
+
+        if resp.stream is not None:
+            resp.stream = self._compress_stream(resp.stream, encoding)
+        else:
+            body = resp.render_body()
+
+            if body is None or len(body) < self.min_size:
+                if body is not None:
+                    self._count_response(None)
+
+                return
+
+            resp.text = None
+            resp.data = self._compress(body, encoding)
+
+        self._count_response(encoding)
+        self._set_headers(resp, encoding)
+
+    async def process_response_async(
+        self, req, resp, resource, req_succeeded: bool
+    ) -> None:
+        """Compresses the body of a response of the ASGI app, if it should be"""
+        encoding = self._choose(req, resp)
+
+        if encoding is None:
+            return
+
+        if resp.stream is not None:
+            resp.stream = self._compress_stream_async(resp.stream, encoding)
+        else:
+            body = await resp.render_body()
+
+            if body is None or len(body) < self.min_size:
+                if body is not None:
+                    self._count_response(None)
+
+                return
+
+            resp.text = None
+
+            # Big bodies are compressed in a thread, so as not to hold up the event loop
+            if len(body) > CHUNK_SIZE:
+                resp.data = await asyncio.to_thread(self._compress, body, encoding)
+            else:
+                resp.data = self._compress(body, encoding)
+
+        self._count_response(encoding)
+        self._set_headers(resp, encoding)
+
+    def stats(self) -> dict[str, int | float | dict[str, int]]:
+        """
+        Returns how many responses were compressed (with each encoding) and how many
+        were too small to be, how many bytes went into the compressors and came out of
+        them (and their ratio) and how long compressing took (in milliseconds)
+        """
+        with self._lock:
+            return {
+                "level": self.level,
+                "min_size": self.min_size,
+                "responses": dict(self._responses),
+                "too_small": self._too_small,
+                "bytes_in": self._bytes_in,
+                "bytes_out": self._bytes_out,
+                "ratio": self._bytes_out / self._bytes_in if self._bytes_in else 0,
+                "compress_ms": self._compress_seconds * 1000,
+            }
@@ -0,0 +1,317 @@
+"""
+A pool of long-lived SQLite connections that the http methods share, so that a request
+does not have to pay for opening (and tearing down) a connection to the database.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from queue import Empty, Full, LifoQueue
+
+from api.resources.helpers.env import PATH_TO_DB
+from api.resources.helpers.etag import contact_etag
+from api.resources.helpers.schema import CONTACTS_MIGRATIONS, migrate
+from api.resources.helpers.storage import StorageConfig, is_busy_error
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_TIMEOUT = 5.0
+
+
+class PoolClosedError(Exception):
+    """Raised when a connection is requested from a pool that has been closed"""
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection became free before the pool's timeout"""
+
+
+class ConnectionPool:
+    """
+    A bounded pool of sqlite3 connections to a database.\n
+
+    Connections are opened lazily (up to max_size), configured once with the pragmas of
+    the pool's StorageConfig (and the contact_etag() SQL function) and handed back to
+    the pool once a caller is finished with them. The first connection the pool opens
+    also brings the database's schema up to date.
+    """
+
+    def __init__(
+        self,
+        path_to_db: str = PATH_TO_DB,
+        max_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+        migrations: list = CONTACTS_MIGRATIONS,
+        storage: StorageConfig | None = None,
+    ):
+        """
+        :param - path_to_db (str) - the database the connections are opened to\n
+        :param - max_size (int) - the most connections the pool will ever open\n
+        :param - timeout (float) - how many seconds to wait for a free connection\n
+        :param - migrations (list) - the migrations to run on the database\n
+        :param - storage (StorageConfig) - how to configure SQLite (read from the
+        environment by default)
+        """
+        self.path_to_db = path_to_db
+        self.max_size = max_size
+        self.timeout = timeout
+        self.migrations = migrations
+        self.storage = storage if storage is not None else StorageConfig.from_env()
+        self._migrated = False
+        self._last_checkpoint = time.monotonic()
+
+        self._idle = LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._connections = []
+        self._closed = False
+
+        # Metrics
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._busy_retries = 0
+        self._checkpoints = 0
+
+    def _open(self) -> sqlite3.Connection:
+        """Opens a new connection to the database and runs the pragmas on it"""
+        # Transactions that write take the write lock as soon as they begin (rather than
+        # when they first write), so that two of them can't both read and then
+        # deadlock trying to upgrade to the write lock, which fails at once with
+        # SQLITE_BUSY instead of waiting for busy_timeout
+        con = sqlite3.connect(
+            self.path_to_db,
+            check_same_thread=False,
+            cached_statements=256,
+            isolation_level="IMMEDIATE",
+        )
+
+        for pragma in self.storage.pragmas():
+            con.execute(pragma)
+
+        con.create_function("contact_etag", 3, contact_etag, deterministic=True)
+
+        # Only called while holding self._lock, so this runs once per pool
+        if not self._migrated:
+            migrate(con, self.migrations)
+            self._migrated = True
+
+        return con
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Returns a connection from the pool, opening a new one if none are idle and the
+        pool has not reached max_size. Otherwise, waits for a connection to be released.
+        """
+        if self._closed:
+            raise PoolClosedError("The connection pool has been closed.")
+
+        start = time.perf_counter()
+
+        try:
+            con = self._idle.get_nowait()
+        except Empty:
+            con = None
+
+            with self._lock:
+                if len(self._connections) < self.max_size:
+                    con = self._open()
+                    self._connections.append(con)
+
+            if con is None:
+                try:
+                    con = self._idle.get(timeout=self.timeout)
+                except Empty:
+                    raise PoolTimeoutError(
+                        f"No connection was free after {self.timeout} seconds."
+                    )
+
+                waited = time.perf_counter() - start
+
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time += waited
+                    self._max_wait_time = max(self._max_wait_time, waited)
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+
+        return con
+
+    def release(self, con: sqlite3.Connection) -> None:
+        """
+        Hands a connection back to the pool. Any transaction left open by the caller is
+        rolled back so the next caller gets a clean connection.\n
+
+        A connection that was lent out before the pool was closed isn't one of the
+        pool's connections any more (even if the pool has been reopened since), so it is
+        closed rather than handed back.
+        """
+        if con.in_transaction:
+            con.rollback()
+
+        if self._checkpoint_is_due():
+            self._checkpoint(con, "PASSIVE")
+
+        with self._lock:
+            self._in_use -= 1
+            is_current = not self._closed and any(
+                con is pooled for pooled in self._connections
+            )
+
+        if not is_current:
+            con.close()
+            return
+
+        # The queue can't be full of the pool's own connections while this one is out,
+        # but if it somehow is, never block the caller to hand it back
+        try:
+            self._idle.put_nowait(con)
+        except Full:
+            con.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        A context manager that lends out a connection from the pool, i.e.\n
+        with pool.connection() as con:\n
+            con.execute(...)
+        """
+        con = self.acquire()
+
+        try:
+            yield con
+        finally:
+            self.release(con)
+
+    def run_in_transaction(self, work):
+        """
+        Runs work(con) with a connection from the pool and commits, retrying up to
+        storage.busy_retries times (with an exponential backoff) if the transaction
+        fails because another process is holding the database's lock.\n
+
+        :param - work (function) - takes a connection and writes to the database
+        through it (without committing). It may be called more than once, as the
+        transaction is rolled back before it is retried.\n
+
+        Returns what work returned
+        """
+        attempt = 0
+
+        while True:
+            with self.connection() as con:
+                try:
+                    result = work(con)
+                    con.commit()
+                    return result
+                except sqlite3.OperationalError as error:
+                    if con.in_transaction:
+                        con.rollback()
+
+                    if not is_busy_error(error) or attempt >= self.storage.busy_retries:
+                        raise
+
+            with self._lock:
+                self._busy_retries += 1
+
+            time.sleep(self.storage.backoff(attempt))
+            attempt += 1
+
+    def _checkpoint_is_due(self) -> bool:
+        """
+        Returns True (once) every storage.checkpoint_interval seconds if the database
+        is in WAL mode
+        """
+        if self.storage.journal_mode != "WAL" or self.storage.checkpoint_interval == 0:
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+
+            if now - self._last_checkpoint < self.storage.checkpoint_interval:
+                return False
+
+            self._last_checkpoint = now
+
+            return True
+
+    def _checkpoint(self, con: sqlite3.Connection, mode: str) -> None:
+        """
+        Copies the pages in the WAL back into the database. A PASSIVE checkpoint
+        doesn't wait for readers or writers, so it never holds up a request, and
+        TRUNCATE also empties the WAL file once no one is using it.
+        """
+        try:
+            con.execute(f"PRAGMA wal_checkpoint({mode})")
+        except sqlite3.OperationalError:
+            # Another connection is checkpointing, so there is nothing to do
+            return
+
+        with self._lock:
+            self._checkpoints += 1
+
+    def close(self) -> None:
+        """Closes every idle connection and stops the pool from lending out new ones"""
+        self._closed = True
+        checkpointed = self.storage.journal_mode != "WAL"
+
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except Empty:
+                break
+
+            # Leave the database in one file when the api stops
+            if not checkpointed:
+                self._checkpoint(con, "TRUNCATE")
+                checkpointed = True
+
+            con.close()
+
+        with self._lock:
+            self._connections = []
+
+    def reopen(self) -> None:
+        """
+        Lets a closed pool lend out connections again (opening new ones as they are
+        needed), e.g. when an ASGI server starts the app again after shutting it down
+        """
+        self._closed = False
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Returns the size of the pool, how long callers have waited for a connection and
+        how often transactions were retried and the WAL was checkpointed
+        """
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": len(self._connections),
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "total_wait_time": self._wait_time,
+                "max_wait_time": self._max_wait_time,
+                "busy_retries": self._busy_retries,
+                "checkpoints": self._checkpoints,
+            }
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the pool shared by the http methods when they are not given one explicitly
+    """
+    global _default_pool
+
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            _default_pool = ConnectionPool()
+
+        return _default_pool
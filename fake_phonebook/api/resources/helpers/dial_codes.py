@@ -0,0 +1,112 @@
+"""
+Finds the country a phone number is from by its dial code (e.g. +44 is the United
+Kingdom), using a trie of the dial codes in
+create_and_load/phone_numbers/country_codes.py that is built once, when this module is
+imported.\n
+
+Each digit of a number is one step down the trie, and the country of the deepest dial
+code passed on the way is the answer (so +1 684 is American Samoa while +1 555 is the
+United States). Resolving a number takes as many steps as it has digits, however many
+dial codes there are.
+"""
+
+from api.resources.helpers.phone import phone_digits
+from create_and_load.phone_numbers.country_codes import country_codes
+
+# Some dial codes are shared by several countries. The country listed first in
+# country_codes gets the dial code, apart from these (by the digits of the dial code),
+# which are the ones most numbers with the dial code are from (+595 is also listed for
+# Guyana, whose dial code is really +592)
+PREFERRED_COUNTRIES = {"1": "US", "262": "RE", "500": "FK", "595": "PY"}
+
+# Where a node of the trie keeps the country of the dial code that ends there (digits
+# are the keys of its children)
+_COUNTRY = "country"
+
+
+class DialCodeTrie:
+    """A trie of dial codes (see the module docstring)"""
+
+    def __init__(self, countries: list[dict[str, str | None]]):
+        """
+        :param - countries (list of dicts) - the name, dial_code and (ISO 3166) code of
+        each country, like country_codes (countries without a dial_code are skipped)
+        """
+        self._root = {}
+        # Every country with a dial code, by its code
+        self.countries = {}
+
+        for country in countries:
+            if country.get("dial_code") is None:
+                continue
+
+            self.countries[country["code"]] = {
+                "code": country["code"],
+                "name": country["name"],
+                "dial_code": country["dial_code"],
+            }
+
+            digits = phone_digits(country["dial_code"])
+            node = self._root
+
+            for digit in digits:
+                node = node.setdefault(digit, {})
+
+            if _COUNTRY in node and PREFERRED_COUNTRIES.get(digits) != country["code"]:
+                continue
+
+            node[_COUNTRY] = self.countries[country["code"]]
+
+    def resolve(self, phone_number: str) -> dict[str, str] | None:
+        """
+        Returns the code, name and dial code of the country a phone number is from, or
+        None if it doesn't start with a known dial code (or with + or 00, as the dial
+        code of a national number isn't written down)
+        """
+        phone_number = phone_number.lstrip()
+
+        if not phone_number.startswith(("+", "00")):
+            return None
+
+        node = self._root
+        country = None
+
+        for digit in phone_digits(phone_number):
+            node = node.get(digit)
+
+            if node is None:
+                break
+
+            country = node.get(_COUNTRY, country)
+
+        return country
+
+    def resolve_many(self, phone_numbers) -> list[dict[str, str] | None]:
+        """
+        Returns the country of each phone number (see resolve()), in the same order.
+        Numbers that appear more than once (e.g. in a bulk import) are only resolved
+        once.
+        """
+        phone_numbers = list(phone_numbers)
+        resolved = {}
+        resolve = self.resolve
+
+        for phone_number in phone_numbers:
+            if phone_number not in resolved:
+                resolved[phone_number] = resolve(phone_number)
+
+        return [resolved[phone_number] for phone_number in phone_numbers]
+
+    def resolve_codes(self, phone_numbers) -> list[str]:
+        """
+        Returns the code of the country of each phone number, in the same order, or ""
+        for the numbers whose country isn't known (this is what the contacts'
+        country_code column holds)
+        """
+        return [
+            country["code"] if country is not None else ""
+            for country in self.resolve_many(phone_numbers)
+        ]
+
+
+DIAL_CODES = DialCodeTrie(country_codes)
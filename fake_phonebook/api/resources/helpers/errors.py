@@ -0,0 +1,40 @@
+"""
+Error handlers registered on the app (see register_error_handlers()), for the errors
+that can be raised by any responder and so aren't caught by each one.\n
+
+A request that waits too long for a connection to the phonebook (because every one of
+them is in use) is answered with a 503 (Service Unavailable) and a Retry-After header,
+rather than a 500 (Internal Server Error), so that clients know to try again.
+"""
+
+import falcon
+import falcon.asgi
+from api.resources.helpers.connection_pool import PoolTimeoutError
+
+# How many seconds a client is asked to wait before it retries a request the phonebook
+# was too busy for
+RETRY_AFTER = 1
+
+
+def handle_pool_timeout(req, resp, ex, params) -> None:
+    """Answers a request that no connection to the phonebook became free for"""
+    resp.status = falcon.HTTP_503
+    resp.content_type = falcon.MEDIA_TEXT
+    resp.retry_after = RETRY_AFTER
+    resp.text = (
+        "The phonebook is too busy to answer right now. Please try again in "
+        f"{RETRY_AFTER} second(s).\n"
+    )
+
+
+async def handle_pool_timeout_async(req, resp, ex, params) -> None:
+    """The ASGI version of handle_pool_timeout()"""
+    handle_pool_timeout(req, resp, ex, params)
+
+
+def register_error_handlers(app) -> None:
+    """Makes an app (WSGI or ASGI) answer the errors above with their status codes"""
+    if isinstance(app, falcon.asgi.App):
+        app.add_error_handler(PoolTimeoutError, handle_pool_timeout_async)
+    else:
+        app.add_error_handler(PoolTimeoutError, handle_pool_timeout)
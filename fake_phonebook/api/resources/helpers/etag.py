@@ -0,0 +1,22 @@
+"""
+The ETag of a single contact, i.e. a version of the contact that changes whenever its
+name or phone number does.\n
+
+The connection pool registers contact_etag() as an SQL function too, so that an UPDATE
+can check a client's If-Match header in the same statement that changes the contact.
+"""
+
+import hashlib
+
+
+def contact_etag(contact_id: str, name: str, phone_number: str) -> str:
+    """
+    Returns the (strong) ETag of a contact with this id, name and phone_number\n
+
+    :param - contact_id (str) - the id of the contact\n
+    :param - name (str) - the name of the contact\n
+    :param - phone_number (str) - the phone number of the contact
+    """
+    return hashlib.blake2b(
+        "\x00".join([contact_id, name, phone_number]).encode("utf-8"), digest_size=16
+    ).hexdigest()
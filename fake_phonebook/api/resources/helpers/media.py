@@ -0,0 +1,182 @@
+"""
+The media types the api can send (and read) contacts as, besides JSON: newline delimited
+JSON, CSV and (if the msgpack package is installed) MessagePack. Their handlers are
+registered on the app (see register_media_handlers()), and the one a response is
+written with is chosen by the request's Accept header (see negotiate()).\n
+
+JSON is written with orjson if it is installed, which is several times quicker than the
+json module at the long lists of contacts the api sends (see
+api.resources.helpers.streaming.dumps(), which streamed bodies are written with too).
+"""
+
+import csv
+import io
+
+import falcon
+import falcon.media
+from api.resources.helpers.streaming import MEDIA_NDJSON, dumps, loads
+from api.resources.stores.base import CONTACT_FIELDS
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MEDIA_CSV = "text/csv"
+MEDIA_MSGPACK = falcon.MEDIA_MSGPACK
+
+# What a list of contacts can be sent as, and what anything else (e.g. a single contact)
+# can. When the client accepts them equally (e.g. */*), client_prefers() picks the last
+# one, so JSON stays the default.
+LIST_MEDIA_TYPES = (MEDIA_MSGPACK, MEDIA_CSV, MEDIA_NDJSON, falcon.MEDIA_JSON)
+OBJECT_MEDIA_TYPES = (MEDIA_MSGPACK, falcon.MEDIA_JSON)
+
+# The media types whose packages are installed
+AVAILABLE_MEDIA_TYPES = frozenset(
+    media_type
+    for media_type, available in [
+        (MEDIA_MSGPACK, msgpack is not None),
+        (MEDIA_CSV, True),
+        (MEDIA_NDJSON, True),
+        (falcon.MEDIA_JSON, True),
+    ]
+    if available
+)
+
+
+class NDJSONHandler(falcon.media.BaseHandler):
+    """
+    Writes a list as newline delimited JSON (one item per line), and reads it back. No
+    contacts (None, as get_contacts() returns) is an empty body.
+    """
+
+    def serialize(self, media, content_type) -> bytes:
+        if media is None:
+            return b""
+
+        if not isinstance(media, list):
+            media = [media]
+
+        return b"".join(dumps(item) + b"\n" for item in media)
+
+    def deserialize(self, stream, content_type, content_length) -> list:
+        try:
+            return [loads(line) for line in stream.read().splitlines() if line.strip()]
+        except ValueError as error:
+            raise falcon.MediaMalformedError(MEDIA_NDJSON) from error
+
+
+class CSVHandler(falcon.media.BaseHandler):
+    """
+    Writes a list of flat dictionaries (e.g. contacts) as CSV, with a header row of
+    their keys, and reads it back. Values that aren't strings (e.g. a contact's country)
+    are written as JSON. No contacts (None, as get_contacts() returns, or an empty list)
+    is just the header row.
+    """
+
+    def serialize(
+        self, media, content_type, fields: tuple[str, ...] | None = None
+    ) -> bytes:
+        """
+        :param - fields (tuple of str) - the header row to write when there are no rows
+        (the fields of a contact by default)
+        """
+        if media is None:
+            media = []
+        elif not isinstance(media, list):
+            media = [media]
+
+        text = io.StringIO()
+        writer = csv.writer(text)
+
+        if len(media) == 0:
+            writer.writerow(fields if fields is not None else CONTACT_FIELDS)
+            return text.getvalue().encode("utf-8")
+
+        writer.writerow(media[0].keys())
+
+        if all(isinstance(value, str) for value in media[0].values()):
+            # Contacts are strings only, which the writer can take as they are
+            writer.writerows(row.values() for row in media)
+        else:
+            writer.writerows(
+                [
+                    value if isinstance(value, str) else dumps(value).decode("utf-8")
+                    for value in row.values()
+                ]
+                for row in media
+            )
+
+        return text.getvalue().encode("utf-8")
+
+    def deserialize(self, stream, content_type, content_length) -> list:
+        try:
+            return list(csv.DictReader(io.StringIO(stream.read().decode("utf-8"))))
+        except (csv.Error, UnicodeError) as error:
+            raise falcon.MediaMalformedError(MEDIA_CSV) from error
+
+
+def create_media_handlers() -> falcon.media.Handlers:
+    """Returns the handlers of every available media type"""
+    handlers = {
+        falcon.MEDIA_JSON: falcon.media.JSONHandler(dumps=dumps, loads=loads),
+        MEDIA_NDJSON: NDJSONHandler(),
+        MEDIA_CSV: CSVHandler(),
+    }
+
+    if msgpack is not None:
+        handlers[MEDIA_MSGPACK] = falcon.media.MessagePackHandler()
+
+    return falcon.media.Handlers(handlers)
+
+
+def register_media_handlers(app) -> None:
+    """Makes an app (WSGI or ASGI) read request bodies and write responses with them"""
+    handlers = create_media_handlers()
+
+    app.req_options.media_handlers = handlers
+    app.resp_options.media_handlers = handlers
+
+
+def negotiate(req, resp, media_types: tuple[str, ...]) -> str:
+    """
+    Returns the media type (of media_types, whose handlers are registered on the app)
+    the client prefers, or JSON if it doesn't accept any of them
+    """
+    handlers = resp.options.media_handlers
+    media_types = [
+        media_type
+        for media_type in media_types
+        if media_type in AVAILABLE_MEDIA_TYPES and media_type in handlers
+    ]
+
+    return req.client_prefers(media_types) or falcon.MEDIA_JSON
+
+
+def find_handler(handlers, content_type: str | None):
+    """
+    Returns the handler (of those registered on the app) of a Content-Type header (its
+    parameters, e.g. charset=utf-8, are ignored), or None if there isn't one
+    """
+    if content_type is None:
+        return None
+
+    return handlers.get(content_type.partition(";")[0].strip().lower())
+
+
+def serialize(
+    resp, media, media_type: str, fields: tuple[str, ...] | None = None
+) -> bytes:
+    """
+    Returns media written as this media type, by the handler registered on the app.\n
+
+    :param - fields (tuple of str) - the fields of the contacts in media, which are the
+    header row of a CSV of no contacts (the fields of a contact by default)
+    """
+    handlers = resp.options.media_handlers
+    handler = find_handler(handlers, media_type) or handlers[falcon.MEDIA_JSON]
+
+    if isinstance(handler, CSVHandler):
+        return handler.serialize(media, media_type, fields)
+
+    return handler.serialize(media, media_type)
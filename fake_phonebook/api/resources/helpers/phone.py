@@ -0,0 +1,51 @@
+"""
+Normalizes phone numbers to their digits, so that a contact can be found by its phone
+number however it was written (e.g. "+44 5361 237462", "+44-5361-237462" and
+"0044 5361237462" are all 445361237462).\n
+
+The contacts table keeps the digits (for exact lookups) and the digits reversed (so
+that "the number ends with 7462" is a search of an index for reversed numbers that start
+with 2647, rather than a scan of every number).
+"""
+
+import re
+
+_NOT_A_DIGIT = re.compile(r"[^0-9]")
+
+# Suffixes shorter than this match too many contacts to be worth looking up
+MIN_PHONE_SUFFIX_LENGTH = 3
+
+
+def phone_digits(phone_number: str) -> str:
+    """
+    Returns the digits of a phone number in E.164 form, without the + (i.e. the
+    country code and the number). A leading 00 (the international call prefix) is
+    dropped from numbers that don't start with +.
+    """
+    digits = _NOT_A_DIGIT.sub("", phone_number)
+
+    if not phone_number.lstrip().startswith("+") and digits.startswith("00"):
+        digits = digits[2:]
+
+    return digits
+
+
+def phone_columns(phone_number: str) -> tuple[str, str]:
+    """
+    Returns the phone_digits and phone_digits_reversed columns of a contact with this
+    phone number
+    """
+    digits = phone_digits(phone_number)
+
+    return digits, digits[::-1]
+
+
+def reversed_suffix_range(suffix: str) -> tuple[str, str]:
+    """
+    Returns the range of phone_digits_reversed (from, up to but not including) that the
+    numbers ending with these digits are in
+    """
+    reversed_suffix = suffix[::-1]
+
+    # ":" is the character after "9"
+    return reversed_suffix, reversed_suffix + ":"
@@ -0,0 +1,347 @@
+"""
+The schema of the fake_contacts and fake_people databases, kept as a list of numbered
+migrations so that existing databases can be upgraded in place.
+
+The version a database is at is stored in its user_version pragma. Migration i (counting
+from 1) takes a database from version i - 1 to version i.
+"""
+
+import os
+import sqlite3
+
+from api.resources.helpers.dial_codes import DIAL_CODES
+from api.resources.helpers.env import PARENT_DIR, PATH_TO_DB
+from api.resources.helpers.phone import phone_digits
+
+PATH_TO_PEOPLE_DB = os.path.join(PARENT_DIR, "fake_people.db")
+
+
+def _contacts_v1(cur: sqlite3.Cursor) -> None:
+    """
+    Rebuilds the (untyped) contacts table with a typed id primary key, a case
+    insensitive name (so that the name index can serve LIKE 'x%' queries) and indexes on
+    (name, id) and phone_number.
+    """
+    # Databases created before the migrations existed already have this table
+    cur.execute("CREATE TABLE IF NOT EXISTS contacts(id, name, phone_number)")
+
+    cur.execute(
+        """
+        CREATE TABLE contacts_v1(
+            id TEXT NOT NULL PRIMARY KEY,
+            name TEXT NOT NULL COLLATE NOCASE,
+            phone_number TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO contacts_v1(id, name, phone_number)
+        SELECT id, COALESCE(name, ''), COALESCE(phone_number, '')
+        FROM contacts
+        WHERE id IS NOT NULL
+        """
+    )
+    cur.execute("DROP TABLE contacts")
+    cur.execute("ALTER TABLE contacts_v1 RENAME TO contacts")
+    cur.execute("CREATE INDEX contacts_name_idx ON contacts(name, id)")
+    cur.execute("CREATE INDEX contacts_phone_number_idx ON contacts(phone_number)")
+
+
+def _contacts_v2(cur: sqlite3.Cursor) -> None:
+    """
+    Adds contacts_fts, a full text index of the contacts' names (so that a name can be
+    found by any word in it, see api.resources.helpers.search), and fills it with the
+    contacts already in the table.\n
+
+    The index is an external content FTS5 table: it doesn't keep a copy of the names,
+    only which rowid of contacts each word is in, and triggers keep it in sync with
+    contacts. VACUUM can renumber the rowids of contacts, so run INSERT INTO
+    contacts_fts(contacts_fts) VALUES('rebuild') after it.
+    """
+    # The prefix indexes make "sm*" and "smi*" lookups rather than scans of every word
+    # that starts with "sm" or "smi" (shorter prefixes are refused, see
+    # api.resources.helpers.search)
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE contacts_fts USING fts5(
+            name,
+            content='contacts',
+            content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts(rowid, name) VALUES(new.rowid, new.name);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, name)
+            VALUES('delete', old.rowid, old.name);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER contacts_fts_update AFTER UPDATE OF name ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, name)
+            VALUES('delete', old.rowid, old.name);
+            INSERT INTO contacts_fts(rowid, name) VALUES(new.rowid, new.name);
+        END
+        """
+    )
+    # Index the contacts that are already in the table
+    cur.execute("INSERT INTO contacts_fts(contacts_fts) VALUES('rebuild')")
+
+
+def _contacts_v3(cur: sqlite3.Cursor) -> None:
+    """
+    Adds the phone_digits and phone_digits_reversed columns (see
+    api.resources.helpers.phone) and indexes on them, so that contacts can be found by
+    (the end of) their phone number, and fills them in for the contacts already in the
+    table.\n
+
+    The columns are filled in by whatever writes a contact (the stores), rather than by
+    triggers, as SQLite can't reverse a string without a function of our own.
+    """
+    cur.execute("ALTER TABLE contacts ADD COLUMN phone_digits TEXT")
+    cur.execute("ALTER TABLE contacts ADD COLUMN phone_digits_reversed TEXT")
+
+    # Only registered on the connection running the migration
+    cur.connection.create_function("phone_digits", 1, phone_digits, deterministic=True)
+    cur.connection.create_function(
+        "reverse", 1, lambda digits: digits[::-1], deterministic=True
+    )
+    cur.execute(
+        """
+        UPDATE contacts
+        SET phone_digits = phone_digits(phone_number),
+            phone_digits_reversed = reverse(phone_digits(phone_number))
+        """
+    )
+
+    cur.execute("CREATE INDEX contacts_phone_digits_idx ON contacts(phone_digits)")
+    cur.execute(
+        """
+        CREATE INDEX contacts_phone_digits_reversed_idx
+        ON contacts(phone_digits_reversed)
+        """
+    )
+
+
+def _contacts_v4(cur: sqlite3.Cursor) -> None:
+    """
+    Adds the country_code column (the code of the country a contact's phone number is
+    from, see api.resources.helpers.dial_codes, or '' if it isn't known) with an index
+    on (country_code, name, id), so that the contacts of a country can be listed in
+    order, and fills it in for the contacts already in the table.\n
+
+    Also adds contact_country_counts, how many contacts there are of each country_code,
+    which triggers keep up to date so that it never has to be counted again. Like the
+    digits of the phone number, country_code is filled in by the stores.
+    """
+    cur.execute("ALTER TABLE contacts ADD COLUMN country_code TEXT NOT NULL DEFAULT ''")
+
+    # Only registered on the connection running the migration
+    cur.connection.create_function(
+        "country_code",
+        1,
+        lambda phone_number: DIAL_CODES.resolve_codes([phone_number])[0],
+        deterministic=True,
+    )
+    cur.execute("UPDATE contacts SET country_code = country_code(phone_number)")
+    cur.execute(
+        "CREATE INDEX contacts_country_code_idx ON contacts(country_code, name, id)"
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE contact_country_counts(
+            country_code TEXT NOT NULL PRIMARY KEY,
+            contacts INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO contact_country_counts(country_code, contacts)
+        SELECT country_code, COUNT(*) FROM contacts GROUP BY country_code
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER contact_country_counts_insert AFTER INSERT ON contacts BEGIN
+            INSERT INTO contact_country_counts(country_code, contacts)
+            VALUES(new.country_code, 1)
+            ON CONFLICT(country_code) DO UPDATE SET contacts = contacts + 1;
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER contact_country_counts_delete AFTER DELETE ON contacts BEGIN
+            UPDATE contact_country_counts SET contacts = contacts - 1
+            WHERE country_code = old.country_code;
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER contact_country_counts_update
+        AFTER UPDATE OF country_code ON contacts
+        WHEN old.country_code IS NOT new.country_code BEGIN
+            UPDATE contact_country_counts SET contacts = contacts - 1
+            WHERE country_code = old.country_code;
+            INSERT INTO contact_country_counts(country_code, contacts)
+            VALUES(new.country_code, 1)
+            ON CONFLICT(country_code) DO UPDATE SET contacts = contacts + 1;
+        END
+        """
+    )
+
+
+def _contacts_v5(cur: sqlite3.Cursor) -> None:
+    """
+    Adds contacts_version, a single row holding a number that triggers bump on every
+    insert, update and delete of contacts. Every process using the database reads it to
+    find out if the contacts it has cached have changed (see
+    api.resources.helpers.cache), whichever process (or tool) changed them.
+    """
+    cur.execute(
+        """
+        CREATE TABLE contacts_version(
+            id INTEGER NOT NULL PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """
+    )
+    cur.execute("INSERT INTO contacts_version(id, version) VALUES(1, 0)")
+
+    for event in ["INSERT", "UPDATE", "DELETE"]:
+        cur.execute(
+            f"""
+            CREATE TRIGGER contacts_version_{event.lower()}
+            AFTER {event} ON contacts BEGIN
+                UPDATE contacts_version SET version = version + 1 WHERE id = 1;
+            END
+            """
+        )
+
+
+def _people_v1(cur: sqlite3.Cursor) -> None:
+    """
+    Rebuilds the (untyped) people table with typed columns and indexes on id, full_name
+    and phone_number.\n
+
+    The id is not made a primary key, as the csv loader is allowed to load the same
+    people more than once.
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS people(
+            id,
+            full_name,
+            first_name,
+            last_name,
+            email_address,
+            phone_number,
+            linkedin_profile
+        )
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE people_v1(
+            id TEXT NOT NULL,
+            full_name TEXT COLLATE NOCASE,
+            first_name TEXT,
+            last_name TEXT,
+            email_address TEXT,
+            phone_number TEXT,
+            linkedin_profile TEXT
+        )
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO people_v1
+        SELECT * FROM people WHERE id IS NOT NULL
+        """
+    )
+    cur.execute("DROP TABLE people")
+    cur.execute("ALTER TABLE people_v1 RENAME TO people")
+    cur.execute("CREATE INDEX people_id_idx ON people(id)")
+    cur.execute("CREATE INDEX people_full_name_idx ON people(full_name)")
+    cur.execute("CREATE INDEX people_phone_number_idx ON people(phone_number)")
+
+
+# Never edit or reorder a migration once it has been released, add a new one instead
+CONTACTS_MIGRATIONS = [
+    _contacts_v1,
+    _contacts_v2,
+    _contacts_v3,
+    _contacts_v4,
+    _contacts_v5,
+]
+PEOPLE_MIGRATIONS = [_people_v1]
+
+
+def get_schema_version(con: sqlite3.Connection) -> int:
+    """Returns the version of the schema the database is at"""
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(con: sqlite3.Connection, migrations: list) -> int:
+    """
+    Applies the migrations that the database hasn't had yet, in order, inside a single
+    transaction.\n
+
+    :param - con (sqlite3.Connection) - a connection to the database to migrate\n
+    :param - migrations (list) - CONTACTS_MIGRATIONS or PEOPLE_MIGRATIONS\n
+
+    Returns the number of migrations that were applied
+    """
+    if get_schema_version(con) >= len(migrations):
+        return 0
+
+    if con.in_transaction:
+        con.commit()
+
+    # Take the write lock before checking the version again, so that two processes
+    # starting at the same time don't both try to migrate the database
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+
+    try:
+        version = get_schema_version(con)
+
+        for migration in migrations[version:]:
+            migration(cur)
+
+        cur.execute(f"PRAGMA user_version = {len(migrations)}")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+    return max(len(migrations) - version, 0)
+
+
+if __name__ == "__main__":
+    # Upgrade both databases in place, i.e. python -m api.resources.helpers.schema
+    for path_to_db, migrations in [
+        (PATH_TO_DB, CONTACTS_MIGRATIONS),
+        (PATH_TO_PEOPLE_DB, PEOPLE_MIGRATIONS),
+    ]:
+        con = sqlite3.connect(path_to_db)
+        applied = migrate(con, migrations)
+        print(f"Applied {applied} migration(s) to {path_to_db}.")
+        con.close()
@@ -0,0 +1,77 @@
+"""
+Turns what someone typed into the search box (the q query parameter of GET
+/contacts/search) into search terms, and matches names against them.\n
+
+A query is split into words (letters and digits), which are compared ignoring case and
+accents, like the contacts_fts table's unicode61 tokenizer does. Every word has to be in
+a contact's name for it to match, e.g. "smith" finds "Adam Smith". A word ending in *
+only has to start a word in the name, e.g. "smi*" finds "Adam Smith" and "Smithers".
+"""
+
+import re
+import unicodedata
+
+# Underscores are separators for the unicode61 tokenizer too
+_WORD = re.compile(r"([^\W_]+)(\*?)")
+_TOKEN = re.compile(r"[^\W_]+")
+
+# Queries with more words than this are refused, as each word is a lookup in the index
+MAX_SEARCH_TERMS = 8
+
+# Shorter prefixes match so many names that ranking them all takes too long
+MIN_PREFIX_LENGTH = 2
+
+
+def fold(token: str) -> str:
+    """Returns a word without its case or accents (e.g. Zoë -> zoe)"""
+    decomposed = unicodedata.normalize("NFKD", token.lower())
+
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def parse_search_query(query: str) -> list[tuple[str, bool]]:
+    """
+    Returns the (folded word, whether it is a prefix) terms of a search query.\n
+
+    Raises a ValueError if the query has no words, more than MAX_SEARCH_TERMS or a
+    prefix shorter than MIN_PREFIX_LENGTH.
+    """
+    terms = [(fold(word), star == "*") for word, star in _WORD.findall(query)]
+
+    if len(terms) == 0:
+        raise ValueError("The search query must have at least one letter or digit.")
+
+    if len(terms) > MAX_SEARCH_TERMS:
+        raise ValueError(
+            f"The search query can't have more than {MAX_SEARCH_TERMS} words."
+        )
+
+    for word, prefix in terms:
+        if prefix and len(word) < MIN_PREFIX_LENGTH:
+            raise ValueError(
+                f"A word ending in * must have at least {MIN_PREFIX_LENGTH} letters or "
+                "digits."
+            )
+
+    return terms
+
+
+def to_fts5_query(terms: list[tuple[str, bool]]) -> str:
+    """
+    Returns the FTS5 MATCH expression for the terms. Every word is quoted, so nothing a
+    user types can be read as FTS5 syntax (e.g. AND, NEAR or a column filter).
+    """
+    return " ".join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in terms)
+
+
+def name_tokens(name: str) -> list[str]:
+    """Returns the folded words of a name"""
+    return [fold(token) for token in _TOKEN.findall(name)]
+
+
+def matches(terms: list[tuple[str, bool]], tokens: list[str]) -> bool:
+    """Returns True if the words of a name (see name_tokens()) match every term"""
+    return all(
+        any(token.startswith(word) if prefix else token == word for token in tokens)
+        for word, prefix in terms
+    )
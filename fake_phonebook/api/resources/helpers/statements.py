@@ -0,0 +1,275 @@
+"""
+The SQL statements the http methods run, each under a name.\n
+
+Values are only ever bound to a statement as parameters, never formatted into its SQL,
+so the SQL of a statement is the same every time it runs. This means sqlite3 prepares
+(parses and plans) each statement once per connection and takes it from the
+connection's statement cache after that. It also means a value can't change what a
+statement does.\n
+
+The statements that read contacts can be asked for only some of their columns (see
+execute()). Their columns can only be ones in CONTACT_COLUMNS, so each of them has a
+handful of variants, which are cached like any other statement.\n
+
+How many times each statement has been run is counted, see get_statement_stats().
+"""
+
+import sqlite3
+import threading
+from collections import Counter
+from functools import lru_cache
+
+from api.resources.stores.base import nocase
+
+# The columns of a contact the statements that read contacts return, in this order
+# (unless they are asked for fewer of them)
+CONTACT_COLUMNS = ("id", "name", "phone_number")
+
+# {columns} is filled in by execute()
+_SELECT_CONTACTS = "SELECT {columns} FROM contacts"
+
+# The names starting with a prefix are a range of contacts_name_idx (see
+# name_prefix_range()). The pages after the first start at (name, id) > (?, ?) instead
+# of at the prefix, so that SQLite seeks straight to the cursor, rather than to the
+# prefix and then past every name before the cursor. A list of every contact is read as
+# one page after another too (see SQLiteContactStore.iter_contacts()).
+# Lists (of ids or ETags) are bound as a single JSON array and read with json_each(),
+# so that the SQL doesn't depend on how long the list is
+STATEMENTS = {
+    # get.py
+    "select_page": f"{_SELECT_CONTACTS} ORDER BY name, id LIMIT ?",
+    "select_page_by_name": (
+        f"{_SELECT_CONTACTS} WHERE name >= ? AND name < ? ORDER BY name, id LIMIT ?"
+    ),
+    "select_page_after": (
+        f"{_SELECT_CONTACTS} WHERE (name, id) > (?, ?) ORDER BY name, id LIMIT ?"
+    ),
+    "select_page_by_name_after": (
+        f"{_SELECT_CONTACTS} WHERE (name, id) > (?, ?) AND name < ? "
+        "ORDER BY name, id LIMIT ?"
+    ),
+    # The contacts of a country are listed in order by contacts_country_code_idx
+    "select_page_in_country": (
+        f"{_SELECT_CONTACTS} WHERE country_code = ? ORDER BY name, id LIMIT ?"
+    ),
+    "select_page_by_name_in_country": (
+        f"{_SELECT_CONTACTS} WHERE country_code = ? AND name >= ? AND name < ? "
+        "ORDER BY name, id LIMIT ?"
+    ),
+    "select_page_in_country_after": (
+        f"{_SELECT_CONTACTS} WHERE country_code = ? AND (name, id) > (?, ?) "
+        "ORDER BY name, id LIMIT ?"
+    ),
+    "select_page_by_name_in_country_after": (
+        f"{_SELECT_CONTACTS} WHERE country_code = ? AND (name, id) > (?, ?) "
+        "AND name < ? ORDER BY name, id LIMIT ?"
+    ),
+    # Kept up to date by triggers on contacts (see api.resources.helpers.schema)
+    "select_country_counts": """
+        SELECT country_code, contacts FROM contact_country_counts WHERE contacts > 0
+    """,
+    "select_contacts_by_phone": (
+        f"{_SELECT_CONTACTS} WHERE phone_digits = ? ORDER BY name, id LIMIT ?"
+    ),
+    # Numbers ending with some digits are a range of the reversed digits
+    "select_contacts_by_phone_suffix": (
+        f"{_SELECT_CONTACTS} WHERE phone_digits_reversed >= ? "
+        "AND phone_digits_reversed < ? ORDER BY name, id LIMIT ?"
+    ),
+    "select_contact_by_id": f"{_SELECT_CONTACTS} WHERE id = ?",
+    # Bumped by triggers on contacts (see api.resources.helpers.schema)
+    "select_contacts_version": "SELECT version FROM contacts_version WHERE id = 1",
+    "contact_exists": "SELECT 1 FROM contacts WHERE id = ?",
+    "name_taken": "SELECT 1 FROM contacts WHERE name = ? AND id <> ?",
+    # The best matches (by bm25) first, with ties in the usual order
+    "search_contacts": """
+        SELECT contacts.id, contacts.name, contacts.phone_number
+        FROM contacts_fts
+        JOIN contacts ON contacts.rowid = contacts_fts.rowid
+        WHERE contacts_fts MATCH ?
+        ORDER BY contacts_fts.rank, contacts.name, contacts.id
+        LIMIT ?
+    """,
+    # post.py
+    "create_incoming_contacts": """
+        CREATE TEMP TABLE IF NOT EXISTS incoming_contacts(
+            position INTEGER PRIMARY KEY,
+            id TEXT NOT NULL,
+            name TEXT NOT NULL COLLATE NOCASE,
+            phone_number TEXT NOT NULL,
+            phone_digits TEXT NOT NULL,
+            phone_digits_reversed TEXT NOT NULL,
+            country_code TEXT NOT NULL
+        )
+    """,
+    "create_incoming_contacts_name_idx": """
+        CREATE INDEX IF NOT EXISTS temp.incoming_contacts_name_idx
+        ON incoming_contacts(name, position)
+    """,
+    "insert_incoming_contact": """
+        INSERT INTO temp.incoming_contacts(
+            id, name, phone_number, phone_digits, phone_digits_reversed, country_code
+        )
+        VALUES(?, ?, ?, ?, ?, ?)
+    """,
+    # Only the first record with each name is inserted, as records inserted by this
+    # statement aren't seen by its NOT EXISTS
+    "insert_new_contacts": """
+        INSERT INTO contacts(
+            id, name, phone_number, phone_digits, phone_digits_reversed, country_code
+        )
+        SELECT
+            incoming.id,
+            incoming.name,
+            incoming.phone_number,
+            incoming.phone_digits,
+            incoming.phone_digits_reversed,
+            incoming.country_code
+        FROM temp.incoming_contacts AS incoming
+        WHERE NOT EXISTS (
+            SELECT 1 FROM contacts WHERE contacts.name = incoming.name
+        )
+        AND incoming.position = (
+            SELECT MIN(earlier.position)
+            FROM temp.incoming_contacts AS earlier
+            WHERE earlier.name = incoming.name
+        )
+        ORDER BY incoming.position
+        RETURNING id
+    """,
+    "clear_incoming_contacts": "DELETE FROM temp.incoming_contacts",
+    # update.py (a name or phone_number that is None is left as it is, and so are the
+    # digits and country_code of the phone_number)
+    # A contact isn't renamed to the name of another contact (the NOCASE collation of
+    # the name column makes the comparison ignore case, and it searches the name index)
+    "update_contact": """
+        UPDATE contacts
+        SET name = coalesce(?, name),
+            phone_number = coalesce(?, phone_number),
+            phone_digits = coalesce(?, phone_digits),
+            phone_digits_reversed = coalesce(?, phone_digits_reversed),
+            country_code = coalesce(?, country_code)
+        WHERE id = ?
+        AND (? IS NULL OR NOT EXISTS (
+            SELECT 1 FROM contacts AS other
+            WHERE other.name = ? AND other.id <> contacts.id
+        ))
+        RETURNING id, name, phone_number
+    """,
+    "update_contact_if_match": """
+        UPDATE contacts
+        SET name = coalesce(?, name),
+            phone_number = coalesce(?, phone_number),
+            phone_digits = coalesce(?, phone_digits),
+            phone_digits_reversed = coalesce(?, phone_digits_reversed),
+            country_code = coalesce(?, country_code)
+        WHERE id = ?
+        AND contact_etag(id, name, phone_number) IN (SELECT value FROM json_each(?))
+        AND (? IS NULL OR NOT EXISTS (
+            SELECT 1 FROM contacts AS other
+            WHERE other.name = ? AND other.id <> contacts.id
+        ))
+        RETURNING id, name, phone_number
+    """,
+    # delete.py
+    "delete_contacts": """
+        DELETE FROM contacts WHERE id IN (SELECT value FROM json_each(?))
+        RETURNING id, name, phone_number
+    """,
+}
+
+_executions = Counter()
+_executions_lock = threading.Lock()
+
+
+def name_prefix_range(prefix: str) -> tuple[str, str]:
+    """
+    Returns the range of names (from, up to but not including) that the names starting
+    with prefix are in, compared the way the name column is (NOCASE, which only folds
+    A to Z), e.g. "adam" is ("adam", "adan").\n
+
+    Raises a ValueError if there is no name after every name starting with prefix
+    (i.e. it is only U+10FFFF, the last character there is).
+    """
+    # NOCASE compares the lower case of A to Z, so the end of the range is found among
+    # the folded characters (which have no upper case letters)
+    folded = nocase(prefix)
+
+    while len(folded) != 0:
+        after = ord(folded[-1]) + 1
+
+        if ord("A") <= after <= ord("Z"):
+            after = ord("Z") + 1
+
+        # Surrogates can't be encoded as UTF-8 (and don't sort between any names)
+        if 0xD800 <= after <= 0xDFFF:
+            after = 0xE000
+
+        if after <= 0x10FFFF:
+            return prefix, folded[:-1] + chr(after)
+
+        folded = folded[:-1]
+
+    raise ValueError(f"'{prefix}' is not the start of a name.")
+
+
+@lru_cache(maxsize=None)
+def get_sql(name: str, columns: tuple[str, ...] | None = None) -> str:
+    """
+    Returns the SQL of the statement with this name, reading only these columns of the
+    contacts (all of them if None) if it reads contacts.\n
+
+    Raises a ValueError if the columns aren't some of CONTACT_COLUMNS.
+    """
+    sql = STATEMENTS[name]
+
+    if "{columns}" not in sql:
+        return sql
+
+    if columns is not None and (
+        len(columns) == 0 or any(column not in CONTACT_COLUMNS for column in columns)
+    ):
+        raise ValueError(f"{columns} are not columns of a contact.")
+
+    return sql.format(columns=", ".join(columns or CONTACT_COLUMNS))
+
+
+def execute(
+    cur, name: str, parameters=(), columns: tuple[str, ...] | None = None
+) -> sqlite3.Cursor:
+    """
+    Runs the statement with this name and returns the cursor (to read its rows from).\n
+
+    :param - cur (sqlite3.Cursor or sqlite3.Connection) - what to run the statement
+    with\n
+    :param - name (str) - the name of the statement in STATEMENTS\n
+    :param - parameters (sequence) - the values to bind to the statement\n
+    :param - columns (tuple) - for the statements that read contacts, the columns (in
+    CONTACT_COLUMNS) to read, if not all of them. Reading fewer columns lets SQLite
+    answer from an index alone (e.g. id and name from contacts_name_idx).
+    """
+    sql = get_sql(name, columns)
+
+    with _executions_lock:
+        _executions[name] += 1
+
+    return cur.execute(sql, parameters)
+
+
+def executemany(cur, name: str, seq_of_parameters) -> sqlite3.Cursor:
+    """
+    Runs the statement with this name once for every sequence of parameters (this
+    counts as one execution)
+    """
+    sql = get_sql(name, None)
+
+    with _executions_lock:
+        _executions[name] += 1
+
+    return cur.executemany(sql, seq_of_parameters)
+
+
+def get_statement_stats() -> dict[str, int]:
+    """Returns how many times each statement has been run (since the api started)"""
+    with _executions_lock:
+        return {name: _executions[name] for name in STATEMENTS}
@@ -0,0 +1,212 @@
+"""
+How the connections to the phonebook configure SQLite, read from the environment (so
+that a deployment with several workers can be tuned without changing the code).\n
+
+By default the database is put in WAL mode, so that readers don't block a writer (or
+each other) and a writer only blocks other writers. A writer that finds the database
+locked waits for up to busy_timeout milliseconds, and a transaction that still fails
+with SQLITE_BUSY is retried a few times with an exponential backoff.\n
+
+Writes can also be group committed: queued to a single writer thread that commits them
+in batches (see api.resources.helpers.write_queue), so that many writes share one
+commit (and one fsync) when they arrive in bursts.
+"""
+
+import os
+import random
+import sqlite3
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# The primary result code of SQLITE_BUSY and SQLITE_LOCKED (and their extended codes)
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+def flag(value: str) -> bool:
+    """Returns the bool an environment variable (e.g. 1, true, yes, on) is set to"""
+    if value.strip().lower() in ("1", "true", "yes", "on"):
+        return True
+
+    if value.strip().lower() in ("0", "false", "no", "off", ""):
+        return False
+
+    raise ValueError(f"'{value}' is not a flag.")
+
+
+class StorageConfig:
+    """
+    The pragmas run on every connection to the phonebook, how often the WAL is
+    checkpointed and how transactions that fail with SQLITE_BUSY are retried.
+    """
+
+    def __init__(
+        self,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        busy_timeout: int = 5000,
+        cache_size: int = 8000,
+        mmap_size: int = 256 * 1024 * 1024,
+        wal_autocheckpoint: int = 1000,
+        checkpoint_interval: float = 60.0,
+        busy_retries: int = 5,
+        busy_backoff: float = 0.01,
+        max_busy_backoff: float = 0.5,
+        group_commit: bool = False,
+        group_commit_size: int = 64,
+        group_commit_delay: float = 0.002,
+    ):
+        """
+        :param - journal_mode (str) - one of JOURNAL_MODES\n
+        :param - synchronous (str) - one of SYNCHRONOUS_MODES (NORMAL is safe in WAL
+        mode, a power cut can only lose the last transactions)\n
+        :param - busy_timeout (int) - how many milliseconds to wait for a lock\n
+        :param - cache_size (int) - how many KiB of pages each connection caches\n
+        :param - mmap_size (int) - how many bytes of the database to memory map\n
+        :param - wal_autocheckpoint (int) - how many pages the WAL can grow to before
+        the writer that commits checkpoints it (0 turns this off)\n
+        :param - checkpoint_interval (float) - how many seconds the pool leaves between
+        passive checkpoints of its own (0 turns this off)\n
+        :param - busy_retries (int) - how many times a transaction is retried after it
+        failed with SQLITE_BUSY\n
+        :param - busy_backoff (float) - how many seconds to wait before the first retry
+        (doubled for every retry after that)\n
+        :param - max_busy_backoff (float) - the longest wait between retries in seconds\n
+        :param - group_commit (bool) - whether writes are queued and committed in
+        batches by a single writer thread\n
+        :param - group_commit_size (int) - the most writes committed in one batch\n
+        :param - group_commit_delay (float) - how many seconds the writer waits for more
+        writes to join a batch after the first one arrives
+        """
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"The journal mode must be one of {JOURNAL_MODES}.")
+
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(
+                f"The synchronous mode must be one of {SYNCHRONOUS_MODES}."
+            )
+
+        for name, value in [
+            ("busy_timeout", busy_timeout),
+            ("cache_size", cache_size),
+            ("mmap_size", mmap_size),
+            ("wal_autocheckpoint", wal_autocheckpoint),
+            ("checkpoint_interval", checkpoint_interval),
+            ("busy_retries", busy_retries),
+            ("busy_backoff", busy_backoff),
+            ("max_busy_backoff", max_busy_backoff),
+            ("group_commit_delay", group_commit_delay),
+        ]:
+            if value < 0:
+                raise ValueError(f"{name} can't be negative.")
+
+        if group_commit_size < 1:
+            raise ValueError("group_commit_size must be at least 1.")
+
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = int(busy_timeout)
+        self.cache_size = int(cache_size)
+        self.mmap_size = int(mmap_size)
+        self.wal_autocheckpoint = int(wal_autocheckpoint)
+        self.checkpoint_interval = float(checkpoint_interval)
+        self.busy_retries = int(busy_retries)
+        self.busy_backoff = float(busy_backoff)
+        self.max_busy_backoff = float(max_busy_backoff)
+        self.group_commit = bool(group_commit)
+        self.group_commit_size = int(group_commit_size)
+        self.group_commit_delay = float(group_commit_delay)
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "StorageConfig":
+        """
+        Returns the configuration given by the PHONEBOOK_* environment variables, using
+        the defaults of StorageConfig for any that aren't set:\n
+        PHONEBOOK_JOURNAL_MODE, PHONEBOOK_SYNCHRONOUS, PHONEBOOK_BUSY_TIMEOUT_MS,
+        PHONEBOOK_CACHE_SIZE_KB, PHONEBOOK_MMAP_SIZE, PHONEBOOK_WAL_AUTOCHECKPOINT,
+        PHONEBOOK_CHECKPOINT_INTERVAL, PHONEBOOK_BUSY_RETRIES, PHONEBOOK_BUSY_BACKOFF,
+        PHONEBOOK_MAX_BUSY_BACKOFF, PHONEBOOK_GROUP_COMMIT, PHONEBOOK_GROUP_COMMIT_SIZE
+        and PHONEBOOK_GROUP_COMMIT_DELAY_MS
+        """
+        variables = {
+            "journal_mode": ("PHONEBOOK_JOURNAL_MODE", str),
+            "synchronous": ("PHONEBOOK_SYNCHRONOUS", str),
+            "busy_timeout": ("PHONEBOOK_BUSY_TIMEOUT_MS", int),
+            "cache_size": ("PHONEBOOK_CACHE_SIZE_KB", int),
+            "mmap_size": ("PHONEBOOK_MMAP_SIZE", int),
+            "wal_autocheckpoint": ("PHONEBOOK_WAL_AUTOCHECKPOINT", int),
+            "checkpoint_interval": ("PHONEBOOK_CHECKPOINT_INTERVAL", float),
+            "busy_retries": ("PHONEBOOK_BUSY_RETRIES", int),
+            "busy_backoff": ("PHONEBOOK_BUSY_BACKOFF", float),
+            "max_busy_backoff": ("PHONEBOOK_MAX_BUSY_BACKOFF", float),
+            "group_commit": ("PHONEBOOK_GROUP_COMMIT", flag),
+            "group_commit_size": ("PHONEBOOK_GROUP_COMMIT_SIZE", int),
+            "group_commit_delay": ("PHONEBOOK_GROUP_COMMIT_DELAY_MS", float),
+        }
+
+        kwargs = {}
+
+        for parameter, (variable, convert) in variables.items():
+            if environ.get(variable) is None:
+                continue
+
+            try:
+                kwargs[parameter] = convert(environ[variable])
+            except ValueError:
+                raise ValueError(
+                    f"{variable} must be a {convert.__name__}, not "
+                    f"'{environ[variable]}'."
+                )
+
+        # The delay is given in milliseconds, like the busy timeout
+        if "group_commit_delay" in kwargs:
+            kwargs["group_commit_delay"] /= 1000
+
+        return cls(**kwargs)
+
+    def pragmas(self) -> list[str]:
+        """Returns the pragmas to run on every connection when it is opened"""
+        pragmas = [
+            # Set first, so that waiting for the lock to change the journal mode is
+            # covered by the timeout too
+            f"PRAGMA busy_timeout = {self.busy_timeout}",
+            f"PRAGMA journal_mode = {self.journal_mode}",
+            f"PRAGMA synchronous = {self.synchronous}",
+            # A negative cache_size is in KiB rather than pages
+            f"PRAGMA cache_size = -{self.cache_size}",
+            f"PRAGMA mmap_size = {self.mmap_size}",
+            "PRAGMA temp_store = MEMORY",
+        ]
+
+        if self.journal_mode == "WAL":
+            pragmas.append(f"PRAGMA wal_autocheckpoint = {self.wal_autocheckpoint}")
+
+        return pragmas
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns how many seconds to wait before retrying a transaction for the
+        attempt-th time (counting from 0), with some jitter so that the workers that
+        collided don't all retry at once
+        """
+        backoff = min(self.busy_backoff * 2**attempt, self.max_busy_backoff)
+
+        return random.uniform(backoff / 2, backoff)
+
+
+def is_busy_error(error: sqlite3.Error) -> bool:
+    """Returns True if an error was raised because the database was busy or locked"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+
+    # The primary result code is the low byte of the (extended) error code
+    error_code = getattr(error, "sqlite_errorcode", None)
+
+    if error_code is not None:
+        return error_code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+
+    return "locked" in str(error) or "busy" in str(error)
@@ -0,0 +1,256 @@
+"""
+Helpers to write a (possibly very long) iterable of contacts to a response body a chunk
+at a time, rather than serializing all of them into one string first, and to read
+contacts from a request body as they arrive, rather than parsing all of it at once.\n
+
+Contacts are written with the same dumps() as the (not streamed) JSON and newline
+delimited JSON media handlers (see api.resources.helpers.media), so a streamed body is
+byte for byte the same as the body that isn't streamed.
+"""
+
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MEDIA_NDJSON = "application/x-ndjson"
+
+# Roughly how many bytes are written to the response (or read from the request) at a
+# time
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Writes (and reads) JSON with orjson if it is installed, or the json module written
+# the way orjson writes it (UTF-8, without spaces) if it isn't
+if orjson is not None:
+    dumps = orjson.dumps
+    loads = orjson.loads
+else:
+
+    def dumps(media) -> bytes:
+        return json.dumps(media, ensure_ascii=False, separators=(",", ":")).encode(
+            "utf-8"
+        )
+
+    loads = json.loads
+
+
+class MalformedItem:
+    """
+    Yielded in place of an item of a request body that could not be parsed, so that
+    the items around it can still be processed
+    """
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+def _chunked(pieces, chunk_size: int = CHUNK_SIZE):
+    """
+    Joins an iterable of bytes into chunks of about chunk_size bytes.\n
+
+    The first piece is sent on its own so that the client gets the first byte of the
+    response without waiting for a whole chunk to be read from the database.
+    """
+    try:
+        for piece in pieces:
+            yield piece
+            break
+
+        buffer = []
+        buffered = 0
+
+        for piece in pieces:
+            buffer.append(piece)
+            buffered += len(piece)
+
+            if buffered >= chunk_size:
+                yield b"".join(buffer)
+                buffer = []
+                buffered = 0
+
+        if buffer != []:
+            yield b"".join(buffer)
+    finally:
+        # If the client goes away part way through, stop reading the contacts straight
+        # away
+        pieces.close()
+
+
+def _close(contacts) -> None:
+    """Closes an iterable of contacts if it is a generator"""
+    if hasattr(contacts, "close"):
+        contacts.close()
+
+
+def stream_json(contacts, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the bytes of a JSON array of contacts in chunks of about chunk_size bytes.\n
+
+    :param - contacts (iterable) - the contacts (dictionaries) to write\n
+    :param - chunk_size (int) - roughly how many bytes to yield at a time
+    """
+
+    def pieces():
+        try:
+            yield b"["
+
+            separator = b""
+            for contact in contacts:
+                yield separator + dumps(contact)
+                separator = b","
+
+            yield b"]"
+        finally:
+            _close(contacts)
+
+    return _chunked(pieces(), chunk_size)
+
+
+def stream_ndjson(contacts, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the bytes of newline delimited JSON (one contact per line) in chunks of
+    about chunk_size bytes.\n
+
+    :param - contacts (iterable) - the contacts (dictionaries) to write\n
+    :param - chunk_size (int) - roughly how many bytes to yield at a time
+    """
+
+    def pieces():
+        try:
+            for contact in contacts:
+                yield dumps(contact) + b"\n"
+        finally:
+            _close(contacts)
+
+    return _chunked(pieces(), chunk_size)
+
+
+def iter_json_array(stream, first_chunk: bytes = b"", chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the items of a JSON array read from a file-like stream, parsing each item as
+    soon as all of it has been read.\n
+
+    :param - stream (file-like object) - the stream to read the array from\n
+    :param - first_chunk (bytes) - the start of the array, if some of the stream has
+    already been read\n
+    :param - chunk_size (int) - how many bytes to read from the stream at a time\n
+
+    If the array is not valid JSON, a MalformedItem is yielded and no more items are
+    read.
+    """
+    decoder = json.JSONDecoder()
+    decode = codecs.getincrementaldecoder("utf-8")().decode
+
+    text = decode(first_chunk)
+    position = 0
+    finished = False
+
+    def read_more() -> None:
+        nonlocal text, position, finished
+
+        chunk = stream.read(chunk_size)
+        finished = len(chunk) == 0
+        text = text[position:] + decode(chunk, final=finished)
+        position = 0
+
+    def skip_whitespace() -> str:
+        """Returns the next character after any whitespace ("" at the end)"""
+        nonlocal position
+
+        while True:
+            position = WHITESPACE.match(text, position).end()
+
+            if position < len(text) or finished:
+                return text[position : position + 1]
+
+            read_more()
+
+    try:
+        if skip_whitespace() != "[":
+            yield MalformedItem("The body is not a JSON array.")
+            return
+
+        position += 1
+
+        if skip_whitespace() == "]":
+            return
+
+        while True:
+            skip_whitespace()
+
+            try:
+                item, end = decoder.raw_decode(text, position)
+            except json.JSONDecodeError:
+                item, end = None, None
+
+            # A value that runs up to the end of what has been read so far (i.e. a
+            # number) may carry on in the next chunk
+            if end is None or (end == len(text) and not finished):
+                if finished:
+                    yield MalformedItem("The item is not valid JSON.")
+                    return
+
+                read_more()
+                continue
+
+            position = end
+            yield item
+
+            separator = skip_whitespace()
+            position += 1
+
+            if separator == "]":
+                return
+
+            if separator == "":
+                yield MalformedItem("The array is not closed with a ].")
+                return
+
+            if separator != ",":
+                yield MalformedItem("The items are not separated by commas.")
+                return
+    except UnicodeDecodeError:
+        yield MalformedItem("The body is not encoded as UTF-8.")
+
+
+def iter_ndjson(stream, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the items of newline delimited JSON (one item per line) read from a
+    file-like stream, parsing each line as soon as all of it has been read.\n
+
+    :param - stream (file-like object) - the stream to read the lines from\n
+    :param - chunk_size (int) - how many bytes to read from the stream at a time\n
+
+    Blank lines are skipped and a MalformedItem is yielded for a line that is not valid
+    JSON.
+    """
+
+    def parse(line: bytes):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return MalformedItem("The line is not valid JSON.")
+
+    rest = b""
+
+    while True:
+        chunk = stream.read(chunk_size)
+
+        if len(chunk) == 0:
+            break
+
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+
+        for line in lines:
+            if line.strip() != b"":
+                yield parse(line)
+
+    if rest.strip() != b"":
+        yield parse(rest)
@@ -0,0 +1,289 @@
+"""
+An in-process index of the contacts' names for type-ahead suggestions (GET
+/contacts/suggest), so that a request sent on every keystroke is a bisect of a sorted
+list rather than a query of the phonebook.\n
+
+Names are kept folded (lower case, without accents and with single spaces), so "zoe s"
+suggests "Zoë Smith". The index is loaded from the store the first time it is used, and
+the http methods update it whenever they write. As other processes (or anything writing
+to the database directly) can't do this, it is also reloaded in the background every
+refresh_interval seconds.\n
+
+Memory is bounded by max_entries: if there are more contacts than that, the index lets
+go of its names and suggest() returns None, so that the caller asks the store instead.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from api.resources.helpers.search import fold
+
+DEFAULT_SUGGEST_MAX_ENTRIES = 1000000
+DEFAULT_SUGGEST_REFRESH_INTERVAL = 300.0
+
+# Separates the folded name from the id in a key, and sorts before any other character
+_SEPARATOR = "\0"
+
+
+def fold_name(name: str) -> str:
+    """Returns a name without its case or accents, and with single spaces"""
+    return " ".join(fold(name.replace(_SEPARATOR, " ")).split())
+
+
+def fold_prefix(prefix: str) -> str:
+    """
+    Returns the folded form of what was typed so far. A space at the end is kept, so
+    that "john " suggests "John Smith" but not "Johnson".
+    """
+    folded = fold_name(prefix)
+
+    if len(folded) != 0 and prefix[-1].isspace():
+        folded += " "
+
+    return folded
+
+
+class SuggestIndex:
+    """
+    A sorted list of the keys (folded name, then id) of the contacts, with a list of
+    their names in the same order (see the module docstring)
+    """
+
+    def __init__(
+        self,
+        load,
+        max_entries: int = DEFAULT_SUGGEST_MAX_ENTRIES,
+        refresh_interval: float = DEFAULT_SUGGEST_REFRESH_INTERVAL,
+    ):
+        """
+        :param - load (function) - returns an iterable of every contact (e.g. a store's
+        iter_contacts)\n
+        :param - max_entries (int) - the most names the index will hold\n
+        :param - refresh_interval (float) - how many seconds the index is used for
+        before it is reloaded (in the background)
+        """
+        self.load = load
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+
+        self._keys = []
+        self._names = []
+        self._key_by_id = {}
+        self._overflowed = False
+
+        # When the index was last loaded (None until it is first loaded)
+        self._loaded_at = None
+        # The writes made while the index is being (re)loaded, to apply to the new index
+        # (None when it isn't being loaded)
+        self._pending = None
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+        # Metrics
+        self._lookups = 0
+        self._loads = 0
+
+    def _build(self) -> tuple[list[str], list[str], dict[str, str], bool]:
+        """
+        Reads every contact and returns the keys, names and keys by id of a new index
+        (empty if there were more than max_entries contacts) and whether there were
+        """
+        entries = []
+
+        for contact in self.load():
+            if len(entries) == self.max_entries:
+                return [], [], {}, True
+
+            key = f"{fold_name(contact['name'])}{_SEPARATOR}{contact['id']}"
+            entries.append((key, contact["id"], contact["name"]))
+
+        entries.sort()
+
+        return (
+            [key for key, _, _ in entries],
+            [name for _, _, name in entries],
+            {contact_id: key for key, contact_id, _ in entries},
+            False,
+        )
+
+    def _reload(self) -> None:
+        """Loads a new index and swaps it in, with the writes made in the meantime"""
+        try:
+            keys, names, key_by_id, overflowed = self._build()
+        except Exception:
+            with self._lock:
+                self._pending = None
+
+            raise
+
+        with self._lock:
+            self._keys, self._names, self._key_by_id = keys, names, key_by_id
+            self._overflowed = overflowed
+
+            for operation, argument in self._pending:
+                operation(argument)
+
+            self._pending = None
+            self._loaded_at = time.monotonic()
+            self._loads += 1
+
+    def _refresh_in_background(self) -> None:
+        """
+        Reloads the index, keeping the old one if that fails (it is tried again later)
+        """
+        try:
+            self._reload()
+        except Exception:
+            with self._lock:
+                self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self) -> None:
+        """Loads the index if it hasn't been, or starts reloading it if it is stale"""
+        with self._lock:
+            if self._loaded_at is not None:
+                if (
+                    self._pending is None
+                    and time.monotonic() - self._loaded_at > self.refresh_interval
+                ):
+                    self._pending = []
+                    threading.Thread(
+                        target=self._refresh_in_background,
+                        name="phonebook-suggest",
+                        daemon=True,
+                    ).start()
+
+                return
+
+        # Only one thread loads the index the first time, the rest wait for it
+        with self._load_lock:
+            with self._lock:
+                if self._loaded_at is not None:
+                    return
+
+                self._pending = []
+
+            self._reload()
+
+    def suggest(self, prefix: str, k: int) -> list[dict[str, str]] | None:
+        """
+        Returns the id and name of (at most) k contacts whose folded name starts with
+        the folded prefix, in order of their folded names.\n
+
+        Returns None if there are too many contacts for the index to hold.
+        """
+        self._ensure_loaded()
+        prefix = fold_prefix(prefix)
+
+        with self._lock:
+            self._lookups += 1
+
+            if self._overflowed:
+                return None
+
+            suggestions = []
+            position = bisect_left(self._keys, prefix)
+
+            while (
+                len(suggestions) < k
+                and position < len(self._keys)
+                and self._keys[position].startswith(prefix)
+            ):
+                suggestions.append(
+                    {
+                        "id": self._keys[position].rpartition(_SEPARATOR)[2],
+                        "name": self._names[position],
+                    }
+                )
+                position += 1
+
+            return suggestions
+
+    def _add(self, contacts: list[dict[str, str]]) -> None:
+        """Adds (or moves) contacts in the index (only called while holding the lock)"""
+        self._remove(contact["id"] for contact in contacts)
+
+        if self._overflowed:
+            return
+
+        if len(self._keys) + len(contacts) > self.max_entries:
+            # Let go of the names, until a reload finds there are few enough contacts
+            self._keys, self._names, self._key_by_id = [], [], {}
+            self._overflowed = True
+            return
+
+        for contact in contacts:
+            key = f"{fold_name(contact['name'])}{_SEPARATOR}{contact['id']}"
+            position = bisect_left(self._keys, key)
+
+            self._keys.insert(position, key)
+            self._names.insert(position, contact["name"])
+            self._key_by_id[contact["id"]] = key
+
+    def _remove(self, contact_ids) -> None:
+        """Removes contacts from the index (only called while holding the lock)"""
+        for contact_id in contact_ids:
+            key = self._key_by_id.pop(contact_id, None)
+
+            if key is None:
+                continue
+
+            position = bisect_left(self._keys, key)
+            del self._keys[position]
+            del self._names[position]
+
+    def _write(self, operation, argument) -> None:
+        """
+        Applies a write to the index if it is loaded, and remembers it if the index is
+        being (re)loaded
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((operation, argument))
+
+            if self._loaded_at is not None:
+                operation(argument)
+
+    def add(self, contacts: list[dict[str, str]]) -> None:
+        """
+        Adds contacts (dictionaries with an id and name) that were written to the
+        phonebook, replacing their old names if they were already in the index
+        """
+        self._write(self._add, list(contacts))
+
+    def remove(self, contact_ids: list[str]) -> None:
+        """Removes the contacts with these ids, which were deleted from the phonebook"""
+        self._write(self._remove, list(contact_ids))
+
+    def stats(self) -> dict[str, int | bool]:
+        """
+        Returns how many names the index holds, and how often it was used and loaded
+        """
+        with self._lock:
+            return {
+                "max_entries": self.max_entries,
+                "size": len(self._keys),
+                "overflowed": self._overflowed,
+                "lookups": self._lookups,
+                "loads": self._loads,
+            }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_suggest_index(store) -> SuggestIndex:
+    """
+    Returns the suggestion index of the contacts in a store (shared by every store of
+    the same contacts, like the caches)
+    """
+    with _indexes_lock:
+        if store.name not in _indexes:
+            # Only the ids and names are read (from the name index alone, with SQLite)
+            _indexes[store.name] = SuggestIndex(
+                lambda: store.iter_contacts(fields=("id", "name"))
+            )
+
+        return _indexes[store.name]
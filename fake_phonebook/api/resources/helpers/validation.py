@@ -0,0 +1,223 @@
+"""
+Checks (and normalizes) the contacts in the bodies of POST, PUT and DELETE requests, so
+that every http method accepts the same names, phone numbers and ids, and a client
+that sends a bad one is told which field is wrong and why.\n
+
+The validators are compiled once, when this module is imported, from the checks of the
+fields they take (see compile_validator()), so validating a contact is a few dictionary
+lookups and regular expression matches. This keeps it cheap enough to run on every
+contact of a bulk POST of hundreds of thousands of them.
+"""
+
+import re
+
+from api.resources.helpers.phone import phone_digits
+
+MAX_NAME_LENGTH = 200
+MAX_ID_LENGTH = 64
+
+# E.164 numbers have at most 15 digits, and shorter ones than this aren't phone numbers
+MIN_PHONE_DIGITS = 3
+MAX_PHONE_DIGITS = 15
+
+# A + (or 00) and digits, which can be grouped by spaces, dashes, dots, slashes and
+# brackets, e.g. "+44 (0)20 7946-0018"
+_PHONE_NUMBER = re.compile(r"\+?[0-9(][0-9 ()./-]*")
+_WHITESPACE = re.compile(r"\s+")
+_CONTROL_CHARACTER = re.compile(r"[\x00-\x1f\x7f]")
+
+
+class ValidationError(ValueError):
+    """
+    Raised when a request body isn't valid, with an error for each thing wrong with it,
+    e.g. {"field": "phone_number", "message": "The 'phone_number' must have ..."}
+    (errors with the body as a whole have no field, and errors with an item of a list
+    have its index)
+    """
+
+    def __init__(self, errors: list[dict[str, str | int]]):
+        """
+        :param - errors (list of dicts) - the field (if there is one) and message of
+        each error
+        """
+        super().__init__(" ".join(error["message"] for error in errors))
+        self.errors = errors
+
+    def to_media(self) -> dict:
+        """Returns the body of the 400 (Bad Request) response to send for this error"""
+        return {"title": "Bad request", "description": str(self), "errors": self.errors}
+
+
+def normalize_name(name) -> str:
+    """
+    Returns a name without the whitespace around it.\n
+
+    Raises a ValueError if it isn't a string of 1 to MAX_NAME_LENGTH characters without
+    control characters (e.g. new lines).
+    """
+    if not isinstance(name, str):
+        raise ValueError("The 'name' must be a string.")
+
+    name = name.strip()
+
+    if len(name) == 0 or len(name) > MAX_NAME_LENGTH:
+        raise ValueError(
+            f"The 'name' must have between 1 and {MAX_NAME_LENGTH} characters."
+        )
+
+    if _CONTROL_CHARACTER.search(name) is not None:
+        raise ValueError("The 'name' can't have control characters (e.g. new lines).")
+
+    return name
+
+
+def normalize_phone_number(phone_number) -> str:
+    """
+    Returns a phone number without the whitespace around it, with single spaces and a +
+    in place of a leading 00 (e.g. "0044  5361 237462" is "+44 5361 237462").\n
+
+    Raises a ValueError if it isn't a string of MIN_PHONE_DIGITS to MAX_PHONE_DIGITS
+    digits, a + (or 00) and separators.
+    """
+    if not isinstance(phone_number, str):
+        raise ValueError("The 'phone_number' must be a string.")
+
+    phone_number = _WHITESPACE.sub(" ", phone_number.strip())
+
+    if _PHONE_NUMBER.fullmatch(phone_number) is None:
+        raise ValueError(
+            "The 'phone_number' can only have digits, a leading + and spaces, dashes, "
+            "dots, slashes or brackets."
+        )
+
+    if not MIN_PHONE_DIGITS <= len(phone_digits(phone_number)) <= MAX_PHONE_DIGITS:
+        raise ValueError(
+            f"The 'phone_number' must have between {MIN_PHONE_DIGITS} and "
+            f"{MAX_PHONE_DIGITS} digits."
+        )
+
+    if phone_number.startswith("00"):
+        phone_number = "+" + phone_number[2:].lstrip(" ")
+
+    return phone_number
+
+
+def normalize_id(contact_id) -> str:
+    """
+    Returns the id of a contact.\n
+
+    Raises a ValueError if it isn't a string of 1 to MAX_ID_LENGTH characters.
+    """
+    if not isinstance(contact_id, str) or not 0 < len(contact_id) <= MAX_ID_LENGTH:
+        raise ValueError(
+            f"The 'id' must be a string of between 1 and {MAX_ID_LENGTH} characters."
+        )
+
+    return contact_id
+
+
+# How each field of a contact is checked and normalized
+FIELDS = {
+    "id": normalize_id,
+    "name": normalize_name,
+    "phone_number": normalize_phone_number,
+}
+
+
+def compile_validator(required: tuple[str, ...] = (), optional: tuple[str, ...] = ()):
+    """
+    Returns a function that takes a request body (or an item of one) and returns the
+    normalized fields of it that are required or optional (other keys are ignored).\n
+
+    The function raises a ValidationError if the body isn't a dictionary, a required
+    field is missing (or null), a field isn't valid or (if there are only optional
+    fields) none of the fields are given.\n
+
+    :param - required (tuple of str) - the fields (in FIELDS) the body must have\n
+    :param - optional (tuple of str) - the fields (in FIELDS) the body may have
+    """
+    # Looked up once, rather than for every body that is validated
+    checks = [(field, FIELDS[field], True) for field in required] + [
+        (field, FIELDS[field], False) for field in optional
+    ]
+    needs_a_field = len(required) == 0
+    at_least_one = (
+        "At least one of "
+        + ", ".join(f"'{field}'" for field in optional)
+        + " must be given."
+    )
+
+    def validate(body) -> dict[str, str]:
+        if not isinstance(body, dict):
+            raise ValidationError([{"message": "The body must be a JSON object."}])
+
+        fields = {}
+        errors = None
+
+        for field, normalize, is_required in checks:
+            value = body.get(field)
+
+            if value is None:
+                if is_required:
+                    errors = errors or []
+                    errors.append(
+                        {
+                            "field": field,
+                            "message": f"The '{field}' key-value pair is missing.",
+                        }
+                    )
+                continue
+
+            try:
+                fields[field] = normalize(value)
+            except ValueError as error:
+                errors = errors or []
+                errors.append({"field": field, "message": str(error)})
+
+        if errors is not None:
+            raise ValidationError(errors)
+
+        if needs_a_field and len(fields) == 0:
+            raise ValidationError([{"message": at_least_one}])
+
+        return fields
+
+    return validate
+
+
+# A new contact (POST, or each contact of a bulk POST)
+validate_contact = compile_validator(required=("name", "phone_number"))
+
+# The new details of a contact (PUT)
+validate_update = compile_validator(optional=("name", "phone_number"))
+
+# A contact to delete (each item of the body of a DELETE)
+_validate_contact_id = compile_validator(required=("id",))
+
+
+def validate_contact_ids(body) -> list[str]:
+    """
+    Returns the ids of the contacts in the body of a DELETE request (a list of
+    dictionaries with an id), in the order they were given.\n
+
+    Raises a ValidationError if the body isn't a non-empty list or any of its items
+    aren't valid (their errors have the index of the item).
+    """
+    if not isinstance(body, list) or len(body) == 0:
+        raise ValidationError(
+            [{"message": "The body must be a JSON array of objects with an 'id'."}]
+        )
+
+    contact_ids = []
+    errors = []
+
+    for index, item in enumerate(body):
+        try:
+            contact_ids.append(_validate_contact_id(item)["id"])
+        except ValidationError as error:
+            errors.extend(dict(item_error, index=index) for item_error in error.errors)
+
+    if len(errors) != 0:
+        raise ValidationError(errors)
+
+    return contact_ids
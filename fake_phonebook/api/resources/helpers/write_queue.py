@@ -0,0 +1,210 @@
+"""
+A queue of writes to the phonebook that a single writer thread commits in batches (group
+commit), instead of every write committing (and syncing to disk) on its own.\n
+
+A write is queued with submit(), which waits until the batch it was put in has been
+committed. The writer takes the first write in the queue, then waits up to max_delay
+seconds for more (up to max_batch of them) and runs them all in one transaction. Each
+write runs in its own savepoint, so a write that fails is rolled back without failing
+the others in its batch.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from api.resources.helpers.storage import is_busy_error
+
+
+class WriteQueueClosedError(Exception):
+    """Raised when a write is submitted to a write queue that has been closed"""
+
+
+class WriteQueue:
+    """See the module docstring"""
+
+    def __init__(self, pool, max_batch: int = 64, max_delay: float = 0.002):
+        """
+        :param - pool (ConnectionPool) - the pool the writer borrows a connection from
+        for each batch\n
+        :param - max_batch (int) - the most writes committed in one batch\n
+        :param - max_delay (float) - how many seconds the writer waits for more writes
+        to join a batch after the first one arrives
+        """
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # The writer is only started when the first write is submitted, so that it
+        # isn't started before the api is forked into workers (threads don't survive
+        # a fork)
+        self._writer = None
+        self._closed = False
+
+        self._batches = 0
+        self._writes = 0
+        self._max_batch_size = 0
+        self._max_queue_depth = 0
+        self._flush_seconds = 0.0
+        self._last_flush_seconds = 0.0
+        self._max_flush_seconds = 0.0
+
+    def submit(self, work):
+        """
+        Queues work(con) to be run in the next batch and waits until that batch is
+        committed.\n
+
+        :param - work (function) - takes a connection and writes to the database
+        through it (without committing). It may be called more than once, as a batch is
+        rolled back and retried if the database is busy.\n
+
+        Returns what work returned, or raises what it raised.
+        """
+        future = Future()
+
+        with self._lock:
+            if self._closed:
+                raise WriteQueueClosedError("The write queue is closed.")
+
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write, name="phonebook-writer", daemon=True
+                )
+                self._writer.start()
+
+            self._queue.put((work, future))
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+
+        return future.result()
+
+    def _write(self) -> None:
+        """Commits the queued writes in batches until the queue is closed"""
+        while True:
+            item = self._queue.get()
+
+            # None is queued by close(), after every write that was submitted before it
+            if item is None:
+                return
+
+            batch = [item]
+            closing = False
+            deadline = time.monotonic() + self.max_delay
+
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    closing = True
+                    break
+
+                batch.append(item)
+
+            self._flush(batch)
+
+            if closing:
+                return
+
+    def _flush(self, batch: list[tuple]) -> None:
+        """Runs a batch of writes in one transaction and hands back their results"""
+
+        def run_batch(con) -> list[tuple]:
+            # Take the write lock up front, as the savepoints below would otherwise
+            # start a deferred transaction
+            if not con.in_transaction:
+                con.execute("BEGIN IMMEDIATE")
+
+            outcomes = []
+
+            for work, _ in batch:
+                con.execute("SAVEPOINT queued_write")
+
+                try:
+                    outcomes.append((work(con), None))
+                except Exception as error:
+                    # A busy database fails the whole batch, which is then retried
+                    if isinstance(error, sqlite3.OperationalError) and is_busy_error(
+                        error
+                    ):
+                        raise
+
+                    con.execute("ROLLBACK TO queued_write")
+                    outcomes.append((None, error))
+
+                con.execute("RELEASE queued_write")
+
+            return outcomes
+
+        started = time.perf_counter()
+
+        try:
+            outcomes = self.pool.run_in_transaction(run_batch)
+        except Exception as error:
+            # Nothing in the batch was committed
+            outcomes = [(None, error)] * len(batch)
+
+        flush_seconds = time.perf_counter() - started
+
+        with self._lock:
+            self._batches += 1
+            self._writes += len(batch)
+            self._max_batch_size = max(self._max_batch_size, len(batch))
+            self._flush_seconds += flush_seconds
+            self._last_flush_seconds = flush_seconds
+            self._max_flush_seconds = max(self._max_flush_seconds, flush_seconds)
+
+        # Only now is every write in the batch durable (as far as the synchronous mode
+        # the database is in makes it)
+        for (_, future), (result, error) in zip(batch, outcomes):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def reopen(self) -> None:
+        """Lets writes be submitted again after the queue was closed"""
+        with self._lock:
+            self._closed = False
+
+    def close(self) -> None:
+        """
+        Stops the writer once it has committed every write submitted before this was
+        called
+        """
+        with self._lock:
+            self._closed = True
+            writer = self._writer
+            self._writer = None
+
+            if writer is not None:
+                self._queue.put(None)
+
+        if writer is not None:
+            writer.join()
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Returns how many batches and writes have been committed, how big the batches
+        and the queue have been and how long the batches took to commit (in
+        milliseconds)
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "writes": self._writes,
+                "mean_batch_size": self._writes / self._batches if self._batches else 0,
+                "max_batch_size": self._max_batch_size,
+                "last_flush_ms": self._last_flush_seconds * 1000,
+                "mean_flush_ms": (
+                    self._flush_seconds * 1000 / self._batches if self._batches else 0
+                ),
+                "max_flush_ms": self._max_flush_seconds * 1000,
+            }
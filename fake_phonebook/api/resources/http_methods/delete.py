@@ -1,40 +1,30 @@
-import sqlite3
+from api.resources.helpers.cache import invalidate_contacts
+from api.resources.helpers.suggest import get_suggest_index
+from api.resources.stores.base import ContactStore
+from api.resources.stores.sqlite import get_store
 
-from api.resources.helpers.env import PATH_TO_DB
-from api.resources.http_methods.get import get_contact_by_id
 
-
-def delete_contact_from_db(contact_data: dict[str, str]) -> dict[str, str] | None:
+def delete_contact_from_db(
+    contact_data: dict[str, str], store: ContactStore | None = None
+) -> dict[str, str] | None:
     """
     Takes a dictionary with a contact's id and deletes this from the database.\n
 
     :param - contact_data (a dictionary of a contact's id as a key-value pair)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
 
     Returns the id, name and phone_number of the contact removed from the database
     if the contact exists in the db and they were deleted from the db without an issue.
     Returns None if otherwise.
     """
-    # Check that an id key-value pair was given. If not, return None
-    if contact_data.get("id") is None:
-        return None
-
-    # Check that a contact with this id exists in the database. If not, return None.
-    contact_to_delete = get_contact_by_id(contact_data.get("id"))
-
-    if contact_to_delete is None:
-        return None
+    deleted_contacts = delete_contacts_from_db([contact_data], store)
 
-    # Now delete this contact from the database
-    with sqlite3.connect(PATH_TO_DB) as con:
-        cur = con.cursor()
-        cur.execute(f"delete from contacts where id = '{contact_data.get('id')}'")
-        con.commit()
-
-    return contact_to_delete
+    return deleted_contacts[0] if deleted_contacts is not None else None
 
 
 def delete_contacts_from_db(
-    contacts_data: list[dict[str, str]]
+    contacts_data: list[dict[str, str]], store: ContactStore | None = None
 ) -> list[dict[str, str]] | None:
     """
     Takes a list of dictionaries with a contact's id and deletes this from the
@@ -42,40 +32,64 @@ def delete_contacts_from_db(
 
     :param - contacts_data (a list of dictionaries of contacts denoted by an id as a
     key-value pair)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
 
     Returns a list of the contacts removed as dictionaries with their id, name and,
     phone_number of the contact removed from the database if the contact exists in the db
-    and they were deleted from the db without an issue. Returns None if otherwise.
+    and they were deleted from the db without an issue. Returns None if otherwise.\n
+
+    Every contact is deleted at once (by one statement, with the SQLite store), which
+    returns the contacts it deleted, so the contacts don't have to be looked up first.
     """
-    # Check that an id key-value pair was given. If not, do not add them to the
-    # contacts_to_remove list
-    contacts_to_delete = [
-        contact for contact in contacts_data if contact.get("id") is not None
-    ]
+    # Check that an id key-value pair was given. If not, do not delete the contact.
+    return delete_contacts_by_id(
+        [
+            contact.get("id")
+            for contact in contacts_data
+            if isinstance(contact, dict) and isinstance(contact.get("id"), str)
+        ],
+        store,
+    )
+
+
+def delete_contacts_by_id(
+    contact_ids: list[str], store: ContactStore | None = None
+) -> list[dict[str, str]] | None:
+    """
+    Takes a list of the ids of contacts (e.g. from
+    api.resources.helpers.validation.validate_contact_ids()) and deletes these from the
+    database.\n
+
+    :param - contact_ids (list of str) - the ids of the contacts to delete\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+
+    Returns the same as delete_contacts_from_db().
+    """
+    store = store if store is not None else get_store()
 
-    # If the contacts_to_remove list is empty, return None
-    if len(contacts_to_delete) == 0:
+    # Ids given more than once are only deleted once
+    ids_to_delete = list(dict.fromkeys(contact_ids))
+
+    # If there are no ids to delete, return None
+    if len(ids_to_delete) == 0:
         return None
 
-    # Get the contacts who actually exists in the database
-    deleted_contacts = [
-        get_contact_by_id(contact.get("id"))
-        for contact in contacts_to_delete
-        if get_contact_by_id(contact.get("id")) is not None
-    ]
+    deleted_contacts = {
+        contact["id"]: contact for contact in store.delete_many(ids_to_delete)
+    }
 
-    # If the deleted_contacts list is empty, return None
+    # If none of the contacts existed, return None
     if len(deleted_contacts) == 0:
         return None
 
-    # Create a formatted string of a tuple with all the ids to delete to insert into
-    # the delete from table clause
-    group_of_ids = ", ".join([f"'{contact.get('id')}'" for contact in deleted_contacts])
+    invalidate_contacts(store.name, list(deleted_contacts))
+    get_suggest_index(store).remove(list(deleted_contacts))
 
-    # Now delete these contacts from the database
-    with sqlite3.connect(PATH_TO_DB) as con:
-        cur = con.cursor()
-        cur.execute(f"delete from contacts where id in ({group_of_ids})")
-        con.commit()
-
-    return deleted_contacts
+    # Return the contacts in the order they were asked to be deleted in
+    return [
+        deleted_contacts[contact_id]
+        for contact_id in ids_to_delete
+        if contact_id in deleted_contacts
+    ]
@@ -1,69 +1,374 @@
-import sqlite3
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
 
-from api.resources.helpers.env import PATH_TO_DB
+from api.resources.helpers.cache import get_contact_cache
+from api.resources.helpers.dial_codes import DIAL_CODES
+from api.resources.helpers.phone import MIN_PHONE_SUFFIX_LENGTH, phone_digits
+from api.resources.helpers.search import parse_search_query
+from api.resources.helpers.suggest import get_suggest_index
+from api.resources.stores.base import CONTACT_FIELDS, ContactStore, project
+from api.resources.stores.sqlite import get_store
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-def get_contacts(filters={}) -> list[dict[str, str]] | None:
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+
+def get_name_filter(filters={}) -> str | None:
+    """
+    Returns the start of the names in the name filter, or None if there isn't one.\n
+
+    Raises a ValueError if it was given more than once (so it is a list).
+    """
+    name = filters.get("name")
+
+    if name is not None and not isinstance(name, str):
+        raise ValueError("The name can only be given once.")
+
+    return name
+
+
+def get_country_filter(filters={}) -> str | None:
+    """
+    Returns the (upper case) country code in the country filter, or None if there isn't
+    one.\n
+
+    Raises a ValueError if it isn't the code of a country with a dial code (see
+    api.resources.helpers.dial_codes).
+    """
+    country = filters.get("country")
+
+    if country is None:
+        return None
+
+    if not isinstance(country, str) or country.upper() not in DIAL_CODES.countries:
+        raise ValueError(f"'{country}' is not the code of a country with a dial code.")
+
+    return country.upper()
+
+
+def get_fields(
+    filters={}, allowed: tuple[str, ...] = CONTACT_FIELDS
+) -> tuple[str, ...] | None:
+    """
+    Returns the fields asked for in the fields filter (a comma separated list, e.g.
+    id,name) in the order of allowed, or None if there isn't one (i.e. every field).\n
+
+    Raises a ValueError if a field isn't in allowed, or none are given.
+    """
+    fields = filters.get("fields")
+
+    if fields is None:
+        return None
+
+    # The parameter is a list if it was given more than once
+    if isinstance(fields, str):
+        fields = [fields]
+
+    fields = {
+        field.strip()
+        for value in fields
+        for field in value.split(",")
+        if len(field.strip()) != 0
+    }
+
+    if len(fields) == 0 or not fields.issubset(allowed):
+        raise ValueError(f"The fields must be some of {', '.join(allowed)}.")
+
+    return tuple(field for field in allowed if field in fields)
+
+
+def get_contacts(
+    filters={}, store: ContactStore | None = None
+) -> list[dict[str, str]] | None:
     """
     Returns a list of contacts and their phone number in the phonebook ordered in
     alphabetical order (a-z)
 
     :param - filters (None by default), but this is for all the query parameters (for
-    now, it should only be name)
-    """
-    sql_query = "SELECT id, name, phone_number FROM contacts"
-    where = " WHERE "
-    where_clause = []
-    order_by_clause = " ORDER BY name"
-
-    if filters != {}:
-        for key in filters.keys():
-            if key in ["name"]:
-                where_clause.append(
-                    f"{key.replace('-', '_')} LIKE '{filters.get(key)}%'"
-                )
-
-    if where_clause != []:
-        sql_query += where + " AND ".join(where_clause)
-
-    sql_query += order_by_clause
-
-    with sqlite3.connect(PATH_TO_DB) as con:
-        cur = con.cursor()
-        contacts = [
-            {
-                "id": contact[0],
-                "name": contact[1],
-                "phone_number": contact[2],
-            }
-            for contact in cur.execute(f"{sql_query}")
-        ]
+    now, name, country, the code of the country their phone number is from, e.g. GB,
+    and fields, the fields of the contacts to return, see get_fields())\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)
+    """
+    contacts = list(iter_contacts(filters, store))
 
     return contacts if len(contacts) > 0 else None
 
 
-def get_contact_by_id(contact_id: str) -> dict[str, str] | None:
+def iter_contacts(filters={}, store: ContactStore | None = None):
+    """
+    Yields the contacts get_contacts() would return, one at a time, as they are read
+    from the store.\n
+
+    :param - filters (None by default), but this is for all the query parameters (for
+    now, name, country and fields)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+
+    Raises a ValueError (straight away, rather than when the first contact is asked
+    for) if the name, country or fields filter isn't valid (see get_name_filter(),
+    get_country_filter() and get_fields()).\n
+
+    With the SQLite store, the contacts are read a chunk at a time and a connection is
+    only borrowed from the pool while a chunk is read (the first one straight away), so
+    a contact written while they are being read may or may not be among them.
+    """
+    store = store if store is not None else get_store()
+
+    return store.iter_contacts(
+        get_name_filter(filters), get_country_filter(filters), get_fields(filters)
+    )
+
+
+def encode_cursor(contact: dict[str, str]) -> str:
+    """
+    Returns an opaque cursor pointing just after the given contact in the (name, id)
+    order that pages of contacts are returned in.
+    """
+    key = json.dumps([contact["name"], contact["id"]]).encode("utf-8")
+    return urlsafe_b64encode(key).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """
+    Returns the (name, id) a cursor made by encode_cursor() points after.\n
+
+    Raises a ValueError if the cursor was not made by encode_cursor().
+    """
+    try:
+        name, contact_id = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+    except (Base64Error, UnicodeError, TypeError, ValueError):
+        raise ValueError(f"'{cursor}' is not a valid cursor.")
+
+    if not isinstance(name, str) or not isinstance(contact_id, str):
+        raise ValueError(f"'{cursor}' is not a valid cursor.")
+
+    return name, contact_id
+
+
+def get_page_of_contacts(
+    filters={},
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    store: ContactStore | None = None,
+) -> tuple[list[dict[str, str]], str | None]:
+    """
+    Returns a page of (at most limit) contacts in the same order as get_contacts(),
+    starting after the contact the cursor points to, and the cursor of the next page.\n
+
+    :param - filters (dict) - the query parameters (for now, name, country and
+    fields)\n
+    :param - limit (int) - the most contacts to return\n
+    :param - cursor (str) - the cursor returned with the previous page (None for the
+    first page)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+
+    The next cursor is None if this is the last page. Every page seeks straight to
+    its first contact in the (name, id) order, so deep pages cost the same as the
+    first. With a name filter, a page seeks to the contact after the cursor and stops
+    at the end of the names starting with the filter (see name_prefix_range() in
+    api.resources.helpers.statements), so this holds for it too.\n
+
+    Raises a ValueError if the cursor, or the name, country or fields filter, isn't
+    valid.
+    """
+    store = store if store is not None else get_store()
+    fields = get_fields(filters)
+
+    # Ask for one more contact than needed to find out if there is a next page (and
+    # for the name and id of the contacts, to make the cursor of the next page from)
+    contacts = store.get_page(
+        get_name_filter(filters),
+        decode_cursor(cursor) if cursor is not None else None,
+        limit + 1,
+        get_country_filter(filters),
+        tuple(
+            field
+            for field in CONTACT_FIELDS
+            if fields is None or field in fields or field in ("id", "name")
+        ),
+    )
+
+    next_cursor = None
+
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        next_cursor = encode_cursor(contacts[-1])
+
+    if fields is not None:
+        contacts = [project(contact, fields) for contact in contacts]
+
+    return contacts, next_cursor
+
+
+def get_contacts_by_phone(
+    phone_number: str,
+    match: str = "exact",
+    limit: int = DEFAULT_PAGE_SIZE,
+    store: ContactStore | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> list[dict[str, str]]:
+    """
+    Returns (at most limit) contacts with this phone number, in the same order as
+    get_contacts(). Phone numbers are compared by their digits (see
+    api.resources.helpers.phone), so spaces, dashes and brackets don't matter.\n
+
+    :param - phone_number (str) - the phone number, or its last digits\n
+    :param - match (str) - "exact" to find the whole phone number, or "suffix" to find
+    phone numbers that end with it (e.g. the last 4 digits)\n
+    :param - limit (int) - the most contacts to return\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+    :param - fields (tuple) - the fields of the contacts to return (see get_fields()),
+    or None for all of them\n
+
+    Raises a ValueError if match isn't exact or suffix, the phone number has no digits
+    or a suffix has fewer than MIN_PHONE_SUFFIX_LENGTH.
+    """
+    if match not in ("exact", "suffix"):
+        raise ValueError(f"'{match}' is not exact or suffix.")
+
+    # A suffix is only digits, so a leading 00 is kept
+    if match == "suffix":
+        digits = "".join(char for char in phone_number if char in "0123456789")
+    else:
+        digits = phone_digits(phone_number)
+
+    if len(digits) == 0:
+        raise ValueError("The phone number has no digits.")
+
+    if match == "suffix" and len(digits) < MIN_PHONE_SUFFIX_LENGTH:
+        raise ValueError(
+            f"The end of a phone number must have at least {MIN_PHONE_SUFFIX_LENGTH} "
+            "digits."
+        )
+
+    store = store if store is not None else get_store()
+
+    return store.find_by_phone(digits, match == "suffix", limit, fields)
+
+
+def search_contacts(
+    query: str, limit: int = DEFAULT_SEARCH_LIMIT, store: ContactStore | None = None
+) -> list[dict[str, str]]:
+    """
+    Returns (at most limit) contacts with a name that matches the search query, best
+    matches first (see api.resources.helpers.search for what matches).\n
+
+    :param - query (str) - what was typed in the search box, e.g. "smith" or "ad* smi*"\n
+    :param - limit (int) - the most contacts to return\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+
+    Raises a ValueError if the query can't be searched for (e.g. it has no words).\n
+
+    With the SQLite store, the words are looked up in the contacts_fts full text index
+    rather than by scanning the names.
+    """
+    store = store if store is not None else get_store()
+
+    return store.search(parse_search_query(query), limit)
+
+
+def suggest_contacts(
+    prefix: str, k: int = DEFAULT_SUGGESTIONS, store: ContactStore | None = None
+) -> list[dict[str, str]]:
+    """
+    Returns the id and name of (at most k) contacts whose name starts with prefix
+    (ignoring case and accents), for suggesting names as they are typed.\n
+
+    :param - prefix (str) - what has been typed so far\n
+    :param - k (int) - the most suggestions to return\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+
+    The names are looked up in an in-process index (see api.resources.helpers.suggest)
+    unless the phonebook is too big for it, when the store is asked instead.
+    """
+    store = store if store is not None else get_store()
+
+    suggestions = get_suggest_index(store).suggest(prefix, k)
+
+    if suggestions is None:
+        suggestions = [
+            {"id": contact["id"], "name": contact["name"]}
+            for contact in store.get_page(prefix, None, k)
+        ]
+
+    return suggestions
+
+
+def get_contact_stats(store: ContactStore | None = None) -> dict:
+    """
+    Returns how many contacts there are in the phonebook, how many of them are from each
+    country (by the dial code of their phone number, most contacts first) and how many
+    are from a country that isn't known.\n
+
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+
+    With the SQLite store, the counts are read from the contact_country_counts table
+    (which triggers keep up to date) rather than counted.
+    """
+    store = store if store is not None else get_store()
+
+    counts = store.count_by_country()
+    unknown = counts.pop("", 0)
+
+    countries = [
+        # (a code that has since left the dial codes is still counted)
+        dict(DIAL_CODES.countries.get(code, {"code": code}), contacts=contacts)
+        for code, contacts in sorted(
+            counts.items(), key=lambda item: (-item[1], item[0])
+        )
+    ]
+
+    return {
+        "contacts": sum(counts.values()) + unknown,
+        "countries": countries,
+        "unknown_country": unknown,
+    }
+
+
+def get_contact_by_id(
+    contact_id: str, store: ContactStore | None = None
+) -> dict[str, str] | None:
     """
     Returns a dictionary representing a contact by their id, name and
     phone_number.\n
 
     :param - contact_id (string)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
 
-    If a contact is not associated with this id, the function returns None.
-    """
-    with sqlite3.connect(PATH_TO_DB) as con:
-        cur = con.cursor()
-        contacts = [
-            {
-                "id": contact[0],
-                "name": contact[1],
-                "phone_number": contact[2],
-            }
-            for contact in cur.execute(
-                f"""
-                SELECT id, name, phone_number FROM contacts WHERE id = '{contact_id}'
-                """
-            )
-        ]
+    If a contact is not associated with this id, the function returns None.\n
+
+    Contacts found in the store are cached, so asking for the same contact again
+    doesn't go to the store. The cache checks whether the contacts have changed (by any
+    process, see ContactStore.version()) at most every check_interval seconds (see
+    api.resources.helpers.cache.ContactCache).
+    """
+    store = store if store is not None else get_store()
+    cache = get_contact_cache(store.name)
+    cache.check_version(store.version)
+
+    contact = cache.get(contact_id)
+    if contact is not None:
+        return contact
+
+    contact = store.get(contact_id)
+
+    if contact is None:
+        return None
+
+    cache.put(contact)
 
-    return contacts[0] if len(contacts) == 1 else None
+    return contact
@@ -1,82 +1,72 @@
-import os
-import sqlite3
 from uuid import uuid4
 
-from api.resources.helpers.env import PARENT_DIR, PATH_TO_DB
+from api.resources.helpers.cache import invalidate_contacts
+from api.resources.helpers.streaming import MalformedItem
+from api.resources.helpers.suggest import get_suggest_index
+from api.resources.helpers.validation import ValidationError, validate_contact
+from api.resources.stores.base import ContactStore
+from api.resources.stores.sqlite import get_store
 
+# How many contacts a bulk POST inserts per transaction
+BULK_CHUNK_SIZE = 5000
 
-def add_contacts_to_db(contact_row: list[tuple]) -> int:
+
+def add_contacts_to_db(
+    contact_row: list[tuple], store: ContactStore | None = None
+) -> int:
     """
     Writes data about fake contacts from a list of tuples (where each tuple is a contact's
     record) to a database \n
 
     :param - contact-row (tuple) - the tuple representing the rows of a contact to write
     to the database.\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
 
     returns the number of rows written to the database
     """
-    # Set initially to False as we will then check if the fake_contacts.db already exists
-    only_insert = True if "fake_contacts.db" in os.listdir(PARENT_DIR) else False
-
-    # Create a database called fake_contacts
-    with sqlite3.connect(PATH_TO_DB) as con:
-        cur = con.cursor()
-
-        if only_insert is False:
-            # Create the table in the fake_contacts database
-            cur.execute(
-                """
-                CREATE TABLE contacts(
-                    id,
-                    name,
-                    phone_number
-                )
-                """
-            )
-
-        # Check whether the contact already exists in the db before inserting them
-        contacts_in_the_db = 0
-        contacts_to_insert = []
-        for record in contact_row:
-            temp_result = [
-                row
-                for row in cur.execute(
-                    f"SELECT * FROM contacts WHERE name = '{record[1]}'"
-                )
-            ]
+    store = store if store is not None else get_store()
 
-            if len(temp_result) != 0:
-                contacts_in_the_db += 1
-            else:
-                contacts_to_insert.append(tuple(record))
+    contacts_to_insert = store.insert_many(contact_row)
 
-        if len(contacts_to_insert) != 0:
-            # Insert the data about the fake contacts from the tuple into the table
-            cur.executemany("INSERT INTO contacts VALUES(?, ?, ?)", contacts_to_insert)
-            con.commit()
+    if len(contacts_to_insert) != 0:
+        invalidate_contacts(store.name, [record[0] for record in contacts_to_insert])
+        get_suggest_index(store).add(
+            {"id": record[0], "name": record[1]} for record in contacts_to_insert
+        )
 
     return len(contacts_to_insert)
 
 
-def post_contact_to_db(contact_data: dict[str, str]) -> str | None:
+def post_contact_to_db(
+    contact_data: dict[str, str],
+    store: ContactStore | None = None,
+    validated: bool = False,
+) -> str | None:
     """
     Takes a dictionary with a contact's name and phone_number and loads this
     to the database.\n
 
     :param - contact_data (a dictionary consisting of a name, phone_number key,
     value pair)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+    :param - validated (bool) - whether contact_data has already been checked and
+    normalized (as the Contacts resource does), so that it isn't checked again\n
 
     Returns the id of the contact if the contact doesn't exist in the db and they were
-    able to be inserted into the db without an issue. Returns None if otherwise.
+    able to be inserted into the db without an issue. Returns None if otherwise.\n
+
+    The name and phone_number in contact_data are replaced by their normalized forms
+    (see api.resources.helpers.validation), which are what is added to the db.
     """
     # When someone using the api posts a new contact to add to the phonebook, I want to
-    # enforce that they've added a "name" and "phone_number" (key, value) pair
-
-    if contact_data.get("name") is None or len((contact_data).get("name")) == 0:
-        return None
-
-    if contact_data.get("phone_number") is None or len((contact_data).get("name")) == 0:
-        return None
+    # enforce that they've added a valid "name" and "phone_number" (key, value) pair
+    if not validated:
+        try:
+            contact_data.update(validate_contact(contact_data))
+        except ValidationError:
+            return None
 
     contact_data["id"] = str(uuid4())
 
@@ -84,7 +74,78 @@ def post_contact_to_db(contact_data: dict[str, str]) -> str | None:
         (contact_data["id"], contact_data["name"], contact_data["phone_number"]),
     ]
 
-    if add_contacts_to_db(contact_record) != 0:
+    if add_contacts_to_db(contact_record, store) != 0:
         return contact_data["id"]
 
     return None
+
+
+def post_contacts_to_db(
+    contacts_data, store: ContactStore | None = None
+) -> list[dict[str, str | int]]:
+    """
+    Takes an iterable of dictionaries with contacts' names and phone_numbers and loads
+    these to the store, BULK_CHUNK_SIZE contacts per transaction.\n
+
+    :param - contacts_data (iterable) - the contacts to add (this can be a generator,
+    so that contacts are added while the rest are still being read)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+
+    Returns a list with a dictionary for each contact (in the order they were given),
+    with the contact's index and either the id it was added with or an error saying
+    why it was not added (and, if the contact wasn't valid, the errors of its fields).
+    """
+    store = store if store is not None else get_store()
+
+    results = []
+    chunk = []
+
+    def insert_chunk() -> None:
+        inserted = store.insert_many([record for _, record in chunk])
+
+        inserted_ids = set(record[0] for record in inserted)
+
+        for index, record in chunk:
+            if record[0] in inserted_ids:
+                results.append({"index": index, "id": record[0]})
+            else:
+                results.append(
+                    {
+                        "index": index,
+                        "error": "A contact with this name is already in the phonebook.",
+                    }
+                )
+
+        if len(inserted) != 0:
+            invalidate_contacts(store.name, list(inserted_ids))
+            get_suggest_index(store).add(
+                {"id": record[0], "name": record[1]} for record in inserted
+            )
+
+    for index, contact_data in enumerate(contacts_data):
+        if isinstance(contact_data, MalformedItem):
+            results.append({"index": index, "error": contact_data.reason})
+            continue
+
+        try:
+            contact = validate_contact(contact_data)
+        except ValidationError as error:
+            results.append(
+                {"index": index, "error": str(error), "errors": error.errors}
+            )
+            continue
+
+        chunk.append((index, (str(uuid4()), contact["name"], contact["phone_number"])))
+
+        if len(chunk) == BULK_CHUNK_SIZE:
+            insert_chunk()
+            chunk = []
+
+    if len(chunk) != 0:
+        insert_chunk()
+
+    # Rejected contacts were added to the results before the chunk they were in
+    results.sort(key=lambda result: result["index"])
+
+    return results
@@ -1,54 +1,66 @@
-import sqlite3
+from api.resources.helpers.cache import invalidate_contacts
+from api.resources.helpers.suggest import get_suggest_index
+from api.resources.helpers.validation import ValidationError, validate_update
+from api.resources.stores.base import ContactStore
+from api.resources.stores.sqlite import get_store
 
-from api.resources.helpers.env import PATH_TO_DB
-from api.resources.http_methods.get import get_contact_by_id
 
-
-def update_contact_in_db(contact_data: dict[str, str]) -> dict[str, str] | None:
+def update_contact_in_db(
+    contact_data: dict[str, str],
+    store: ContactStore | None = None,
+    if_match: list[str] | None = None,
+    validated: bool = False,
+) -> dict[str, str] | None:
     """
     Takes a dictionary with a contact's id, name and/or phone_number and updates
     this contact's details in the database.\n
 
     :param - contact_data (a dictionary of a contact's id as a key-value pair)\n
+    :param - store (ContactStore) - where the contacts are stored (fake_contacts.db by
+    default)\n
+    :param - if_match (list of str) - if given, the contact is only updated if its
+    current ETag is one of these ("*" matches any contact)\n
+    :param - validated (bool) - whether the name and/or phone_number in contact_data
+    have already been checked and normalized (as the Contacts resource does), so that
+    they aren't checked again\n
 
     Returns the id, (new) name and (new) phone_number of the contact updated in the
     database if the contact exists in the db and their details were updated without an
-    issue. Returns None if otherwise.
+    issue. Returns None if otherwise (including if the name or phone_number isn't valid,
+    see api.resources.helpers.validation).\n
+
+    Raises a PreconditionFailedError (see api.resources.stores.base) if the contact
+    exists, but its ETag does not match if_match, or a NameTakenError if another
+    contact already has the new name.
     """
+    store = store if store is not None else get_store()
+
     # Check if the id of the contact is given
     if contact_data.get("id") is None:
         return None
 
-    # Check if the id of the contact exists in the db
-    if get_contact_by_id(contact_data.get("id")) is None:
-        return None
+    # Check that a valid name and/or phone_number to update is given
+    if validated:
+        fields = contact_data
+    else:
+        try:
+            fields = validate_update(contact_data)
+        except ValidationError:
+            return None
 
-    # Check that the name and/or phone_number to update is given
-    name = contact_data.get("name")
-    phone_number = contact_data.get("phone_number")
+    # A name or phone_number that isn't given (None) is left as it is
+    updated_contact = store.update(
+        contact_data.get("id"),
+        fields.get("name"),
+        fields.get("phone_number"),
+        if_match,
+    )
 
-    if [name, phone_number] == [None, None]:
+    if updated_contact is None:
         return None
 
-    # Format the SET clause for the UPDATE statement
-    set_clause = "SET "
-    set_name = f"name = '{name}', " if name is not None else ""
-    set_phone_number = (
-        f"phone_number = '{phone_number}'" if phone_number is not None else ""
-    )
-    set_clause += set_name
-    set_clause += set_phone_number
-    set_clause = (
-        set_clause[: len(set_clause) - 2] if set_clause.endswith(", ") else set_clause
-    )
-
-    # Now update the details after confirming that the id, name and phone_number
-    # were given as key-value pairs
-    with sqlite3.connect(PATH_TO_DB) as con:
-        cur = con.cursor()
-        cur.execute(
-            f"UPDATE contacts {set_clause} WHERE id = '{contact_data.get('id')}'"
-        )
-        con.commit()
+    # Drop the contact's old details from the caches
+    invalidate_contacts(store.name, [contact_data.get("id")])
+    get_suggest_index(store).add([updated_contact])
 
-    return get_contact_by_id(contact_data.get("id"))
+    return updated_contact
@@ -0,0 +1,3 @@
+"""
+The engines the phonebook's contacts can be stored in (see base.ContactStore)
+"""
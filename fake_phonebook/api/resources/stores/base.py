@@ -0,0 +1,164 @@
+"""
+The interface every engine the phonebook can be stored in implements, so that the http
+methods (and the resources) don't depend on how or where the contacts are stored.
+"""
+
+import string
+
+# SQLite's NOCASE collation (which the name column uses) only folds ASCII letters
+_ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def nocase(name: str) -> str:
+    """Returns the key a name is compared and ordered by (like SQLite's NOCASE)"""
+    return name.translate(_ASCII_LOWERCASE)
+
+
+# The fields of a contact, in the order they are returned in
+CONTACT_FIELDS = ("id", "name", "phone_number")
+
+
+def project(contact: dict[str, str], fields: tuple[str, ...] | None) -> dict[str, str]:
+    """Returns a copy of a contact with only these fields (all of them if None)"""
+    if fields is None:
+        return dict(contact)
+
+    return {field: contact[field] for field in fields}
+
+
+class PreconditionFailedError(Exception):
+    """
+    Raised when a contact is not updated because none of the ETags it was required to
+    match (i.e. an If-Match header) are its current ETag
+    """
+
+
+class NameTakenError(Exception):
+    """
+    Raised when a contact is not updated because another contact already has the name
+    it would be given (ignoring case)
+    """
+
+
+class ContactStore:
+    """
+    Somewhere contacts (dictionaries with an id, name and phone_number) are stored.\n
+
+    Contacts are always listed in order of their name (ignoring the case of ASCII
+    letters) and then their id, and no two contacts can have the same name (again,
+    ignoring case).\n
+
+    The methods that list contacts can be given the fields (in CONTACT_FIELDS, in that
+    order) to return, so that a store only reads what is needed.
+    """
+
+    # Identifies the contacts in the store, so that every store of the same contacts
+    # shares the same caches (see api.resources.helpers.cache)
+    name = None
+
+    # How many threads can use the store at once without waiting for each other
+    concurrency = 1
+
+    def get(self, contact_id: str) -> dict[str, str] | None:
+        """Returns the contact with this id, or None if there isn't one"""
+        raise NotImplementedError
+
+    def iter_contacts(
+        self,
+        name_prefix: str | None = None,
+        country_code: str | None = None,
+        fields: tuple[str, ...] | None = None,
+    ):
+        """
+        Yields every contact (whose name starts with name_prefix, ignoring case, and
+        whose phone number is from the country with this country_code, see
+        api.resources.helpers.dial_codes, if they are given) in order
+        """
+        raise NotImplementedError
+
+    def get_page(
+        self,
+        name_prefix: str | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        country_code: str | None = None,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[dict[str, str]]:
+        """
+        Returns (at most) limit of the contacts iter_contacts() would yield, starting
+        after the contact with the (name, id) after (from the start if it is None)
+        """
+        raise NotImplementedError
+
+    def count_by_country(self) -> dict[str, int]:
+        """
+        Returns how many contacts there are from each country, by its code ("" for the
+        contacts whose country isn't known). Countries without contacts are left out.
+        """
+        raise NotImplementedError
+
+    def find_by_phone(
+        self,
+        digits: str,
+        suffix: bool,
+        limit: int,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[dict[str, str]]:
+        """
+        Returns (at most) limit of the contacts, in order, whose phone number's digits
+        (see api.resources.helpers.phone) are these digits, or end with them if suffix
+        is True
+        """
+        raise NotImplementedError
+
+    def search(self, terms: list[tuple[str, bool]], limit: int) -> list[dict[str, str]]:
+        """
+        Returns (at most) limit of the contacts whose names match every one of the
+        search terms (see api.resources.helpers.search), best matches first
+        """
+        raise NotImplementedError
+
+    def insert_many(self, records: list[tuple]) -> list[tuple]:
+        """
+        Inserts the records (id, name, phone_number) of contacts whose name isn't in the
+        store yet (or earlier in records) and returns the records that were inserted
+        """
+        raise NotImplementedError
+
+    def update(
+        self,
+        contact_id: str,
+        name: str | None,
+        phone_number: str | None,
+        if_match: list[str] | None = None,
+    ) -> dict[str, str] | None:
+        """
+        Changes the name and/or phone_number (those that aren't None) of the contact
+        with this id and returns the updated contact, or None if there isn't one.\n
+
+        If another contact already has the name (ignoring case), a NameTakenError is
+        raised. If if_match is given, the contact is only updated if its ETag is one of
+        them ("*" matches any contact), otherwise a PreconditionFailedError is raised.
+        """
+        raise NotImplementedError
+
+    def delete_many(self, contact_ids: list[str]) -> list[dict[str, str]]:
+        """Deletes the contacts with these ids and returns the ones that existed"""
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """
+        Returns a number that changes whenever the contacts do, in any process, so that
+        what was cached from the store can be checked before it is used
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict[str, dict]:
+        """Returns the metrics the store keeps (e.g. of its connections)"""
+        return {}
+
+    def reopen(self) -> None:
+        """Lets a closed store be used again"""
+
+    def close(self) -> None:
+        """Lets go of anything the store holds on to (e.g. connections)"""
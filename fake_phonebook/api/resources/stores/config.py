@@ -0,0 +1,42 @@
+"""
+Chooses the store the api keeps the phonebook in, from environment variables:\n
+
+PHONEBOOK_STORE - sqlite (the default) or memory\n
+PHONEBOOK_STORE_SEED - a SQLite database to copy the contacts of the memory store from
+when the api starts (it starts empty otherwise)
+"""
+
+import os
+
+from api.resources.helpers.connection_pool import ConnectionPool
+from api.resources.stores.base import ContactStore
+from api.resources.stores.memory import InMemoryContactStore
+from api.resources.stores.sqlite import SQLiteContactStore
+
+STORES = ["sqlite", "memory"]
+
+
+def create_store(environ: dict[str, str] | None = None) -> ContactStore:
+    """
+    Returns a new store of the kind chosen in environ (os.environ by default).\n
+
+    Raises a ValueError if PHONEBOOK_STORE isn't one of STORES.
+    """
+    environ = environ if environ is not None else os.environ
+
+    kind = environ.get("PHONEBOOK_STORE", "sqlite").strip().lower()
+
+    if kind == "sqlite":
+        return SQLiteContactStore(ConnectionPool())
+
+    if kind == "memory":
+        seed = environ.get("PHONEBOOK_STORE_SEED")
+
+        if seed:
+            return InMemoryContactStore.from_db(seed)
+
+        return InMemoryContactStore()
+
+    raise ValueError(
+        f"PHONEBOOK_STORE must be one of {', '.join(STORES)}, not '{kind}'."
+    )
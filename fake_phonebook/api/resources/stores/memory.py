@@ -0,0 +1,339 @@
+"""
+Stores the contacts in memory: a dictionary of contacts by their id and a sorted list of
+their names (to list them in order and find names with a prefix by bisecting it).\n
+
+The contacts are lost when the api stops, so this is for benchmarks, tests and
+read-mostly deployments that load the contacts from a database when they start.
+"""
+
+import itertools
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+
+from api.resources.helpers.dial_codes import DIAL_CODES
+from api.resources.helpers.etag import contact_etag
+from api.resources.helpers.phone import phone_digits
+from api.resources.helpers.search import matches, name_tokens
+from api.resources.stores.base import (
+    ContactStore,
+    NameTakenError,
+    PreconditionFailedError,
+    nocase,
+    project,
+)
+
+_store_ids = itertools.count(1)
+
+
+class InMemoryContactStore(ContactStore):
+    """A ContactStore that keeps the contacts in memory (see the module docstring)"""
+
+    concurrency = 4
+
+    def __init__(self, records: list[tuple] | None = None):
+        """
+        :param - records (list of tuples) - the (id, name, phone_number) of the contacts
+        the store starts with
+        """
+        self.name = f"memory:{next(_store_ids)}"
+
+        self._contacts = {}
+        # (nocase(name), id) of every contact, in order
+        self._index = []
+        # How many contacts have each nocase(name)
+        self._names = Counter()
+        # The (folded) words in each contact's name and the digits of their phone number
+        # by their id, to search them
+        self._tokens = {}
+        self._digits = {}
+        # The country code of each contact by their id, and how many contacts have each
+        self._countries = {}
+        self._country_counts = Counter()
+        # Bumped by every write (the contacts are only in this process, so a counter of
+        # its own writes is enough)
+        self._version = 0
+        self._lock = threading.Lock()
+
+        if records is not None:
+            with self._lock:
+                self._add(records)
+
+    @classmethod
+    def from_db(cls, path_to_db: str) -> "InMemoryContactStore":
+        """Returns a store with a copy of the contacts in a SQLite database"""
+        con = sqlite3.connect(path_to_db)
+
+        try:
+            records = con.execute(
+                "SELECT id, name, phone_number FROM contacts"
+            ).fetchall()
+        finally:
+            con.close()
+
+        return cls(records)
+
+    def _key(self, contact: dict[str, str]) -> tuple[str, str]:
+        """Returns where a contact is in the index"""
+        return nocase(contact["name"]), contact["id"]
+
+    def _add(self, records: list[tuple]) -> None:
+        """
+        Adds the records (id, name, phone_number) to the store, whether or not their
+        names are already in it. Only called while holding self._lock.
+        """
+        keys = []
+        country_codes = DIAL_CODES.resolve_codes(record[2] for record in records)
+        self._version += 1
+
+        for (contact_id, name, phone_number), country_code in zip(
+            records, country_codes
+        ):
+            contact = {"id": contact_id, "name": name, "phone_number": phone_number}
+            self._contacts[contact_id] = contact
+            self._names[nocase(name)] += 1
+            self._tokens[contact_id] = name_tokens(name)
+            self._digits[contact_id] = phone_digits(phone_number)
+            self._countries[contact_id] = country_code
+            self._country_counts[country_code] += 1
+            keys.append(self._key(contact))
+
+        # Inserting a few keys into the index is cheaper than sorting all of it again,
+        # but sorting (which merges the runs that are already in order) is much cheaper
+        # than inserting many
+        if len(keys) <= 16:
+            for key in keys:
+                insort(self._index, key)
+        else:
+            self._index.extend(keys)
+            self._index.sort()
+
+    def _remove(self, contact: dict[str, str]) -> None:
+        """
+        Removes a contact from the index and the counts of names and countries (only
+        called while holding self._lock)
+        """
+        self._index.pop(bisect_left(self._index, self._key(contact)))
+        self._version += 1
+        self._names[nocase(contact["name"])] -= 1
+        del self._tokens[contact["id"]]
+        del self._digits[contact["id"]]
+        country_code = self._countries.pop(contact["id"])
+        self._country_counts[country_code] -= 1
+
+        if self._country_counts[country_code] == 0:
+            del self._country_counts[country_code]
+
+        if self._names[nocase(contact["name"])] == 0:
+            del self._names[nocase(contact["name"])]
+
+    def _slice(
+        self,
+        name_prefix: str | None,
+        start: int,
+        limit: int | None,
+        country_code: str | None = None,
+        fields: tuple[str, ...] | None = None,
+    ) -> list:
+        """
+        Returns copies (of the fields) of (at most limit of) the contacts from position
+        start of the index on, while their names start with name_prefix, skipping those
+        from other countries than country_code
+        """
+        contacts = []
+        prefix = nocase(name_prefix) if name_prefix is not None else None
+
+        for position in range(start, len(self._index)):
+            name, contact_id = self._index[position]
+
+            if (prefix is not None and not name.startswith(prefix)) or (
+                limit is not None and len(contacts) == limit
+            ):
+                break
+
+            if country_code is None or self._countries[contact_id] == country_code:
+                contacts.append(project(self._contacts[contact_id], fields))
+
+        return contacts
+
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def get(self, contact_id: str) -> dict[str, str] | None:
+        with self._lock:
+            contact = self._contacts.get(contact_id)
+
+            return dict(contact) if contact is not None else None
+
+    def iter_contacts(
+        self,
+        name_prefix: str | None = None,
+        country_code: str | None = None,
+        fields: tuple[str, ...] | None = None,
+    ):
+        # Copy the contacts while holding the lock, so that they can be yielded while
+        # the store is being written to
+        with self._lock:
+            start = 0
+
+            if name_prefix is not None:
+                start = bisect_left(self._index, (nocase(name_prefix),))
+
+            contacts = self._slice(name_prefix, start, None, country_code, fields)
+
+        yield from contacts
+
+    def get_page(
+        self,
+        name_prefix: str | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        country_code: str | None = None,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[dict[str, str]]:
+        with self._lock:
+            start = 0
+
+            if name_prefix is not None:
+                start = bisect_left(self._index, (nocase(name_prefix),))
+
+            if after is not None:
+                start = max(
+                    start, bisect_right(self._index, (nocase(after[0]), after[1]))
+                )
+
+            return self._slice(name_prefix, start, limit, country_code, fields)
+
+    def count_by_country(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._country_counts)
+
+    def find_by_phone(
+        self,
+        digits: str,
+        suffix: bool,
+        limit: int,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[dict[str, str]]:
+        # Every phone number is checked
+        with self._lock:
+            found = []
+
+            for _, contact_id in self._index:
+                if len(found) == limit:
+                    break
+
+                if (
+                    self._digits[contact_id].endswith(digits)
+                    if suffix
+                    else self._digits[contact_id] == digits
+                ):
+                    found.append(project(self._contacts[contact_id], fields))
+
+            return found
+
+    def search(self, terms: list[tuple[str, bool]], limit: int) -> list[dict[str, str]]:
+        # Every name is checked, and names with fewer words (in which the matching
+        # words count for more, as with bm25) come first
+        with self._lock:
+            found = [
+                (len(self._tokens[contact_id]), name, contact_id)
+                for name, contact_id in self._index
+                if matches(terms, self._tokens[contact_id])
+            ]
+
+            found.sort()
+
+            return [
+                dict(self._contacts[contact_id]) for _, _, contact_id in found[:limit]
+            ]
+
+    def insert_many(self, records: list[tuple]) -> list[tuple]:
+        inserted = []
+        names = set()
+        ids = set()
+
+        with self._lock:
+            # Skip the records whose name is in the store or earlier in records
+            for contact_id, name, phone_number in records:
+                if (
+                    contact_id in self._contacts
+                    or contact_id in ids
+                    or nocase(name) in self._names
+                    or nocase(name) in names
+                ):
+                    continue
+
+                names.add(nocase(name))
+                ids.add(contact_id)
+                inserted.append((contact_id, name, phone_number))
+
+            self._add(inserted)
+
+        return inserted
+
+    def update(
+        self,
+        contact_id: str,
+        name: str | None,
+        phone_number: str | None,
+        if_match: list[str] | None = None,
+    ) -> dict[str, str] | None:
+        with self._lock:
+            contact = self._contacts.get(contact_id)
+
+            if contact is None:
+                return None
+
+            if (
+                name is not None
+                and nocase(name) != nocase(contact["name"])
+                and nocase(name) in self._names
+            ):
+                raise NameTakenError(f"A contact is already called {name}.")
+
+            if (
+                if_match is not None
+                and "*" not in if_match
+                and contact_etag(
+                    contact["id"], contact["name"], contact["phone_number"]
+                )
+                not in if_match
+            ):
+                raise PreconditionFailedError(
+                    f"The contact with id: {contact_id} has changed."
+                )
+
+            self._remove(contact)
+            self._add(
+                [
+                    (
+                        contact_id,
+                        name if name is not None else contact["name"],
+                        (
+                            phone_number
+                            if phone_number is not None
+                            else contact["phone_number"]
+                        ),
+                    )
+                ]
+            )
+
+            return dict(self._contacts[contact_id])
+
+    def delete_many(self, contact_ids: list[str]) -> list[dict[str, str]]:
+        deleted = []
+
+        with self._lock:
+            for contact_id in contact_ids:
+                contact = self._contacts.pop(contact_id, None)
+
+                if contact is None:
+                    continue
+
+                self._remove(contact)
+                deleted.append(contact)
+
+        return deleted
@@ -0,0 +1,368 @@
+"""
+Stores the contacts in a SQLite database (fake_contacts.db by default), through a pool of
+connections to it.
+"""
+
+import json
+import threading
+
+from api.resources.helpers.connection_pool import ConnectionPool, get_pool
+from api.resources.helpers.dial_codes import DIAL_CODES
+from api.resources.helpers.phone import phone_columns, reversed_suffix_range
+from api.resources.helpers.search import to_fts5_query
+from api.resources.helpers.statements import execute, executemany, name_prefix_range
+from api.resources.helpers.write_queue import WriteQueue
+from api.resources.stores.base import (
+    CONTACT_FIELDS,
+    ContactStore,
+    NameTakenError,
+    PreconditionFailedError,
+    nocase,
+)
+
+
+def _to_contact(row: tuple, fields: tuple[str, ...] | None = None) -> dict[str, str]:
+    """
+    Returns a row of (id, name, phone_number) as a contact, or a row of only some of
+    them (the fields, in the same order) as part of one
+    """
+    return dict(zip(fields or CONTACT_FIELDS, row))
+
+
+def insert_new_contacts(cur, contact_row: list[tuple]) -> list[tuple]:
+    """
+    Inserts the records (id, name, phone_number) of contacts whose name isn't in the
+    database yet (or earlier in contact_row), without committing.\n
+
+    :param - cur (sqlite3.Cursor) - a cursor of the connection to insert with\n
+    :param - contact_row (list of tuples) - the records to insert\n
+
+    Returns the records that were inserted (the rest were skipped)
+    """
+    # Load the records into a temporary table first, so that checking them against
+    # the contacts in the db is one join (and the check and insert happen in a single
+    # statement, so another writer can't insert the same name in between)
+    execute(cur, "create_incoming_contacts")
+    execute(cur, "create_incoming_contacts_name_idx")
+    # Each contact is stored with the digits of its phone number, to find it by them,
+    # and the country the number is from
+    country_codes = DIAL_CODES.resolve_codes(record[2] for record in contact_row)
+    executemany(
+        cur,
+        "insert_incoming_contact",
+        (
+            (*record, *phone_columns(record[2]), country_code)
+            for record, country_code in zip(contact_row, country_codes)
+        ),
+    )
+
+    inserted_ids = set(row[0] for row in execute(cur, "insert_new_contacts"))
+    execute(cur, "clear_incoming_contacts")
+
+    return [tuple(record) for record in contact_row if record[0] in inserted_ids]
+
+
+# How many contacts iter_contacts() reads each time it borrows a connection
+ITER_CHUNK_SIZE = 1000
+
+
+class SQLiteContactStore(ContactStore):
+    """
+    A ContactStore backed by a SQLite database, whose writes are each one transaction
+    (retried if the database is busy, see ConnectionPool.run_in_transaction()), or are
+    committed in batches by a WriteQueue if the pool's storage has group_commit on.
+    """
+
+    def __init__(
+        self, pool: ConnectionPool | None = None, iter_chunk_size: int = ITER_CHUNK_SIZE
+    ):
+        """
+        :param - pool (ConnectionPool) - the pool of connections to the database that
+        this store owns (a new pool is created if one isn't given)\n
+        :param - iter_chunk_size (int) - how many contacts iter_contacts() reads each
+        time it borrows a connection
+        """
+        self.pool = pool if pool is not None else ConnectionPool()
+        self.iter_chunk_size = iter_chunk_size
+        self.write_queue = None
+
+        if self.pool.storage.group_commit:
+            self.write_queue = WriteQueue(
+                self.pool,
+                self.pool.storage.group_commit_size,
+                self.pool.storage.group_commit_delay,
+            )
+
+    @property
+    def name(self) -> str:
+        return self.pool.path_to_db
+
+    @property
+    def concurrency(self) -> int:
+        return self.pool.max_size
+
+    def _write(self, work):
+        """Commits work(con), in a batch of writes if group commit is on"""
+        if self.write_queue is not None:
+            return self.write_queue.submit(work)
+
+        return self.pool.run_in_transaction(work)
+
+    def version(self) -> int:
+        with self.pool.connection() as con:
+            return execute(con, "select_contacts_version").fetchone()[0]
+
+    def get(self, contact_id: str) -> dict[str, str] | None:
+        with self.pool.connection() as con:
+            row = execute(con, "select_contact_by_id", [contact_id]).fetchone()
+
+        return _to_contact(row) if row is not None else None
+
+    def iter_contacts(
+        self,
+        name_prefix: str | None = None,
+        country_code: str | None = None,
+        fields: tuple[str, ...] | None = None,
+    ):
+        # The contacts are read a chunk at a time, each chunk being the page after the
+        # last contact of the one before, and a connection is only borrowed from the
+        # pool while a chunk is read. A client reading a streamed response slowly then
+        # doesn't keep a connection from every other request.
+        # The name and id of the last contact are where the next chunk starts, so they
+        # are read even if they aren't among the fields
+        columns = fields
+        if fields is not None:
+            columns = tuple(
+                field
+                for field in CONTACT_FIELDS
+                if field in fields or field in ("id", "name")
+            )
+
+        # The first chunk is read straight away, so that an error reading it (e.g. a
+        # PoolTimeoutError) is raised before a streamed response is started
+        chunk = self.get_page(
+            name_prefix, None, self.iter_chunk_size, country_code, columns
+        )
+
+        return self._iter_chunks(chunk, name_prefix, country_code, fields, columns)
+
+    def _iter_chunks(
+        self,
+        chunk: list[dict[str, str]],
+        name_prefix: str | None,
+        country_code: str | None,
+        fields: tuple[str, ...] | None,
+        columns: tuple[str, ...] | None,
+    ):
+        """
+        Yields the contacts (only their fields) of chunk and of every chunk after it
+        """
+        while True:
+            for contact in chunk:
+                if fields == columns:
+                    yield contact
+                else:
+                    yield {field: contact[field] for field in fields}
+
+            if len(chunk) < self.iter_chunk_size:
+                return
+
+            after = (chunk[-1]["name"], chunk[-1]["id"])
+            chunk = self.get_page(
+                name_prefix, after, self.iter_chunk_size, country_code, columns
+            )
+
+    def get_page(
+        self,
+        name_prefix: str | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        country_code: str | None = None,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[dict[str, str]]:
+        # i.e. select_page, then _by_name, _in_country and _after (in that order) for
+        # each of them that is given
+        statement = "select_page"
+        parameters = []
+
+        if country_code is not None:
+            parameters.append(country_code)
+
+        if name_prefix:
+            statement += "_by_name"
+            start, end = name_prefix_range(name_prefix)
+
+            # The page seeks straight to the contact after the cursor, or to the start
+            # of the range if the cursor is before it (as one from another filter can
+            # be), and the range ends it. "" is before every id.
+            if after is not None and nocase(after[0]) < nocase(start):
+                after = (start, "")
+
+            parameters.extend([start] if after is None else after)
+            parameters.append(end)
+        elif after is not None:
+            parameters.extend(after)
+
+        if country_code is not None:
+            statement += "_in_country"
+
+        if after is not None:
+            statement += "_after"
+
+        parameters.append(limit)
+
+        with self.pool.connection() as con:
+            return [
+                _to_contact(row, fields)
+                for row in execute(con, statement, parameters, fields)
+            ]
+
+    def find_by_phone(
+        self,
+        digits: str,
+        suffix: bool,
+        limit: int,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[dict[str, str]]:
+        if suffix:
+            statement = "select_contacts_by_phone_suffix"
+            parameters = [*reversed_suffix_range(digits), limit]
+        else:
+            statement = "select_contacts_by_phone"
+            parameters = [digits, limit]
+
+        with self.pool.connection() as con:
+            return [
+                _to_contact(row, fields)
+                for row in execute(con, statement, parameters, fields)
+            ]
+
+    def count_by_country(self) -> dict[str, int]:
+        # Read from the contact_country_counts table rather than counted
+        with self.pool.connection() as con:
+            return dict(execute(con, "select_country_counts").fetchall())
+
+    def search(self, terms: list[tuple[str, bool]], limit: int) -> list[dict[str, str]]:
+        parameters = [to_fts5_query(terms), limit]
+
+        with self.pool.connection() as con:
+            return [
+                _to_contact(row) for row in execute(con, "search_contacts", parameters)
+            ]
+
+    def insert_many(self, records: list[tuple]) -> list[tuple]:
+        return self._write(lambda con: insert_new_contacts(con.cursor(), records))
+
+    def update(
+        self,
+        contact_id: str,
+        name: str | None,
+        phone_number: str | None,
+        if_match: list[str] | None = None,
+    ) -> dict[str, str] | None:
+        # A name or phone_number that isn't given (None) is left as it is
+        parameters = [
+            name,
+            phone_number,
+            *(
+                [
+                    *phone_columns(phone_number),
+                    *DIAL_CODES.resolve_codes([phone_number]),
+                ]
+                if phone_number is not None
+                else [None, None, None]
+            ),
+            contact_id,
+        ]
+
+        if if_match is None or "*" in if_match:
+            statement = "update_contact"
+        else:
+            statement = "update_contact_if_match"
+            parameters.append(json.dumps(if_match))
+
+        # For the check that no other contact has the name
+        parameters.extend([name, name])
+
+        def update(con) -> tuple[tuple | None, Exception | None]:
+            """
+            Updates the contact and reads its new details back with one statement, and
+            finds out why it wasn't updated (if it exists) if that didn't update it
+            """
+            cur = con.cursor()
+            updated_contacts = execute(cur, statement, parameters).fetchall()
+
+            if len(updated_contacts) != 0:
+                return updated_contacts[0], None
+
+            # Only when the update was conditional, or renamed the contact, is it worth
+            # finding out why nothing was updated
+            if (if_match is None and name is None) or execute(
+                cur, "contact_exists", [contact_id]
+            ).fetchone() is None:
+                return None, None
+
+            if name is not None and (
+                execute(cur, "name_taken", [name, contact_id]).fetchone() is not None
+            ):
+                return None, NameTakenError(f"A contact is already called {name}.")
+
+            return None, PreconditionFailedError(
+                f"The contact with id: {contact_id} has changed."
+            )
+
+        updated_contact, error = self._write(update)
+
+        if error is not None:
+            raise error
+
+        return _to_contact(updated_contact) if updated_contact is not None else None
+
+    def delete_many(self, contact_ids: list[str]) -> list[dict[str, str]]:
+        # The ids are bound as a single JSON array, so there is no limit on how many
+        # there are
+        def delete(con) -> list[tuple]:
+            return execute(
+                con.cursor(), "delete_contacts", [json.dumps(contact_ids)]
+            ).fetchall()
+
+        return [_to_contact(row) for row in self._write(delete)]
+
+    def reopen(self) -> None:
+        self.pool.reopen()
+
+        if self.write_queue is not None:
+            self.write_queue.reopen()
+
+    def close(self) -> None:
+        # Commit the writes that are still queued before closing the connections
+        if self.write_queue is not None:
+            self.write_queue.close()
+
+        self.pool.close()
+
+    def stats(self) -> dict[str, dict]:
+        return {
+            "pool": self.pool.stats(),
+            "write_queue": (
+                self.write_queue.stats() if self.write_queue is not None else None
+            ),
+        }
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store() -> SQLiteContactStore:
+    """
+    Returns the store the http methods use when they are not given one explicitly
+    (fake_contacts.db, through the shared pool)
+    """
+    global _default_store
+
+    with _default_store_lock:
+        if _default_store is None or _default_store.pool is not get_pool():
+            _default_store = SQLiteContactStore(get_pool())
+
+        return _default_store
@@ -0,0 +1,121 @@
+"""
+A benchmark of the media types the api can send a list of contacts as (see
+api/resources/helpers/media.py), e.g.\n
+python benchmark_media.py --rows 100000 --repeat 5\n
+
+Each handler registered on the app writes (and reads back) the same list of fake
+contacts, and the quickest of the repeats is reported along with the size of the body.
+The json module's dumps is timed too, as it is what the api used before orjson.
+"""
+
+import io
+import json
+import time
+
+import click
+import falcon
+from api.resources.helpers.media import AVAILABLE_MEDIA_TYPES, create_media_handlers
+
+
+def fake_contacts(rows: int) -> list[dict[str, str]]:
+    """Returns rows contacts that look like the ones in the phonebook"""
+    return [
+        {
+            "id": f"{row:032x}",
+            "name": f"Contact Number {row}",
+            "phone_number": f"+44 7700 {row % 1000000:06d}",
+        }
+        for row in range(rows)
+    ]
+
+
+def best_time(function, repeat: int) -> float:
+    """Returns the fewest seconds function() took in repeat runs"""
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def run_benchmark(rows: int, repeat: int) -> list[dict[str, str | int | float]]:
+    """
+    Returns how long each media type took to write and read rows contacts (in
+    milliseconds) and how many bytes they were written as
+    """
+    contacts = fake_contacts(rows)
+    handlers = create_media_handlers()
+    results = []
+
+    # What Contacts.send_result() used to do
+    body = json.dumps(contacts, ensure_ascii=False).encode("utf-8")
+    results.append(
+        {
+            "media_type": "json module",
+            "bytes": len(body),
+            "serialize_ms": best_time(
+                lambda: json.dumps(contacts, ensure_ascii=False).encode("utf-8"),
+                repeat,
+            )
+            * 1000,
+            "deserialize_ms": best_time(lambda: json.loads(body), repeat) * 1000,
+        }
+    )
+
+    for media_type in sorted(AVAILABLE_MEDIA_TYPES):
+        handler = handlers[media_type]
+        body = handler.serialize(contacts, media_type)
+
+        results.append(
+            {
+                "media_type": media_type,
+                "bytes": len(body),
+                "serialize_ms": best_time(
+                    lambda: handler.serialize(contacts, media_type), repeat
+                )
+                * 1000,
+                "deserialize_ms": best_time(
+                    lambda: handler.deserialize(io.BytesIO(body), media_type, None),
+                    repeat,
+                )
+                * 1000,
+            }
+        )
+
+    return results
+
+
+@click.command()
+@click.option(
+    "--rows",
+    type=click.IntRange(min=1),
+    default=100000,
+    show_default=True,
+    help="How many contacts to write and read.",
+)
+@click.option(
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="How many times to time each media type (the quickest is reported).",
+)
+def cli(rows: int, repeat: int) -> None:
+    """Times writing and reading a list of contacts as each media type"""
+    click.echo(f"{rows} contacts, best of {repeat} (falcon {falcon.__version__})\n")
+    click.echo(
+        f"{'media type':<24}{'bytes':>12}{'serialize ms':>16}{'deserialize ms':>16}"
+    )
+
+    for result in run_benchmark(rows, repeat):
+        click.echo(
+            f"{result['media_type']:<24}{result['bytes']:>12}"
+            f"{result['serialize_ms']:>16.1f}{result['deserialize_ms']:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    cli()
@@ -7,6 +7,7 @@ import os
 import sqlite3
 from uuid import uuid4
 
+from api.resources.helpers.schema import PEOPLE_MIGRATIONS, migrate
 from create_and_load.phone_numbers.phone_number import get_phone_number
 from faker import Faker
 
@@ -104,31 +105,15 @@ def load_people_to_db(csv_file_name: str) -> int:
     returns the number of rows written to the database
     """
 
-    # Set initially to False as we will then check if the fake_people.db already exists
     parent_dir = os.path.dirname(__file__).partition("create_and_load")[0]
     path_to_db = os.path.join(parent_dir, "fake_people.db")
-    only_insert = True if "fake_people.db" in os.listdir(parent_dir) else False
 
-    # Create a database called fake_people
+    # Create a database called fake_people (and the people table) if it doesn't exist,
+    # or bring an existing one up to date with the latest schema
     con = sqlite3.connect(path_to_db)
+    migrate(con, PEOPLE_MIGRATIONS)
     cur = con.cursor()
 
-    if only_insert is False:
-        # Create the table in the fake_people database
-        cur.execute(
-            """
-            CREATE TABLE people(
-                id,
-                full_name,
-                first_name,
-                last_name,
-                email_address,
-                phone_number,
-                linkedin_profile
-            )
-            """
-        )
-
     # Insert the data about the fake people from the csv into the table
     with open(csv_file_name, "r", newline="\n") as file:
         reader = csv.reader(file, delimiter=",")
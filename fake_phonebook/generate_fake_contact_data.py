@@ -6,9 +6,12 @@ Author: nlutala (Nathan Lutala)
 """
 
 import logging
-import os
 import sqlite3
 
+from api.resources.helpers.dial_codes import DIAL_CODES
+from api.resources.helpers.env import PATH_TO_DB
+from api.resources.helpers.phone import phone_columns
+from api.resources.helpers.schema import CONTACTS_MIGRATIONS, migrate
 from create_and_load.fake_contacts.fake_contact_records import get_contacts
 
 # Python Basics: Python scope and LEGB rule
@@ -32,29 +35,28 @@ if __name__ == "__main__":
     # Step 1 - Create data about fake contacts
     contacts = get_contacts(NUM_OF_PEOPLE_TO_GENERATE)
 
-    # Step 2 - Check if the database already exists
-    # If it does, just insert the new values into the database
-    # If not, create the database, table and insert into the table
-    parent_dir = os.path.dirname(__file__).partition("create_and_load")[0]
-    path_to_db = os.path.join(parent_dir, "fake_contacts.db")
-
-    if "fake_contacts.db" not in os.listdir(parent_dir):
-        con = sqlite3.connect(path_to_db)
-        cur = con.cursor()
-        cur.execute(
-            """
-            CREATE TABLE contacts(
-                id,
-                name,
-                phone_number
-            )
-            """
-        )
+    # Step 2 - Create the database and table if they don't exist yet (or bring an
+    # existing database up to date with the latest schema)
+    con = sqlite3.connect(PATH_TO_DB)
+    migrate(con, CONTACTS_MIGRATIONS)
 
     # Step 3 - For i in range(NUM_CONTACTS_TO_GENERATE) write contact to the db
-    con = sqlite3.connect(path_to_db)
     cur = con.cursor()
-    cur.executemany("INSERT INTO contacts VALUES(?, ?, ?)", contacts)
+    # (along with the digits of their phone number, to find them by it, and the
+    # country it is from)
+    country_codes = DIAL_CODES.resolve_codes(contact[2] for contact in contacts)
+    cur.executemany(
+        """
+        INSERT INTO contacts(
+            id, name, phone_number, phone_digits, phone_digits_reversed, country_code
+        )
+        VALUES(?, ?, ?, ?, ?, ?)
+        """,
+        (
+            [*contact, *phone_columns(contact[2]), country_code]
+            for contact, country_code in zip(contacts, country_codes)
+        ),
+    )
     con.commit()
     con.close()
 
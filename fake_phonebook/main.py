@@ -1,27 +1,51 @@
-from wsgiref.simple_server import make_server
-
 import falcon
 from api.resources.contacts import Contacts
+from api.resources.helpers.compression import CompressionMiddleware
+from api.resources.helpers.errors import register_error_handlers
+from api.resources.helpers.media import register_media_handlers
 
 # falcon.App instances are callable WSGI apps
 # in larger applications the app is created in a separate file
 app = falcon.App()
 
-# Resources are represented by long-lived class instances
+# Reads and writes JSON (with orjson if it is installed), newline delimited JSON, CSV and
+# MessagePack (if msgpack is installed), chosen by the Content-Type and Accept headers
+register_media_handlers(app)
+
+# Answers a request the phonebook is too busy for (i.e. that no connection to it became
+# free for in time) with a 503 (Service Unavailable)
+register_error_handlers(app)
+
+# Compresses the responses for clients that accept it (configured by the
+# PHONEBOOK_COMPRESSION* environment variables)
+compression = CompressionMiddleware.from_env()
+app.add_middleware(compression)
+
+# Resources are represented by long-lived class instances (which hold on to the store of
+# the phonebook, e.g. a pool of connections to it, for as long as the app is running)
 contacts = Contacts()
 
 # Supported operations are: Create (POST), Read (GET - everyone in the resource),
 # Delete (DELETE - multiple contacts)
 app.add_route("/contacts", contacts)
 
+# Supported operations are: Read (GET - the contacts whose names match a search query)
+app.add_route("/contacts/search", contacts, suffix="search")
+
+# Supported operations are: Read (GET - the names that start with what has been typed)
+app.add_route("/contacts/suggest", contacts, suffix="suggest")
+
+# Supported operations are: Read (GET - how many contacts there are from each country)
+app.add_route("/contacts/stats", contacts, suffix="stats")
+
 # Supported operations are: Read (GET - a single contact in the resource), Update (PUT),
 # Delete (DELETE - a single contact)
 app.add_route("/contacts/{contact_id}", contacts, suffix="by_id")
 
 
 if __name__ == "__main__":
-    with make_server("", 8000, app) as httpd:
-        print("Serving on port 8000...")
+    # python main.py takes the same options as serve.py (and runs the api under gunicorn
+    # by default)
+    from serve import cli
 
-        # Serve until process is killed
-        httpd.serve_forever()
+    cli()
@@ -0,0 +1,47 @@
+import falcon.asgi
+from api.resources.async_contacts import AsyncContacts
+from api.resources.helpers.compression import CompressionMiddleware
+from api.resources.helpers.errors import register_error_handlers
+from api.resources.helpers.media import register_media_handlers
+
+# falcon.asgi.App instances are callable ASGI apps, run this one with e.g.
+# uvicorn main_asgi:app
+app = falcon.asgi.App()
+
+# Reads and writes JSON (with orjson if it is installed), newline delimited JSON, CSV and
+# MessagePack (if msgpack is installed), chosen by the Content-Type and Accept headers
+register_media_handlers(app)
+
+# Answers a request the phonebook is too busy for (i.e. that no connection to it became
+# free for in time) with a 503 (Service Unavailable)
+register_error_handlers(app)
+
+# Resources are represented by long-lived class instances (which hold on to a pool of
+# connections to the phonebook and the threads that use them for as long as the app is
+# running)
+contacts = AsyncContacts()
+
+# The resource closes its connections and threads when the server shuts down
+app.add_middleware(contacts)
+
+# Compresses the responses for clients that accept it (configured by the
+# PHONEBOOK_COMPRESSION* environment variables)
+compression = CompressionMiddleware.from_env()
+app.add_middleware(compression)
+
+# Supported operations are: Create (POST), Read (GET - everyone in the resource),
+# Delete (DELETE - multiple contacts)
+app.add_route("/contacts", contacts)
+
+# Supported operations are: Read (GET - the contacts whose names match a search query)
+app.add_route("/contacts/search", contacts, suffix="search")
+
+# Supported operations are: Read (GET - the names that start with what has been typed)
+app.add_route("/contacts/suggest", contacts, suffix="suggest")
+
+# Supported operations are: Read (GET - how many contacts there are from each country)
+app.add_route("/contacts/stats", contacts, suffix="stats")
+
+# Supported operations are: Read (GET - a single contact in the resource), Update (PUT),
+# Delete (DELETE - a single contact)
+app.add_route("/contacts/{contact_id}", contacts, suffix="by_id")
@@ -0,0 +1,279 @@
+"""
+A command line launcher for the api, which runs it under gunicorn (or uvicorn for the
+ASGI app) with the number of workers and threads sized to the machine it runs on, e.g.\n
+python serve.py --workers 4 --port 8080\n
+python serve.py --server uvicorn\n
+
+Run python serve.py --help to see every option.
+"""
+
+import os
+
+import click
+from api.resources.helpers.connection_pool import DEFAULT_POOL_SIZE
+
+WSGI_APP = "main:app"
+ASGI_APP = "main_asgi:app"
+
+
+def default_workers(asgi: bool) -> int:
+    """
+    Returns how many worker processes to run: (2 x the number of CPUs) + 1, as
+    recommended by gunicorn, so that a CPU is kept busy while a worker waits on disk.
+    An ASGI worker doesn't block on a request, so one per CPU is enough.
+    """
+    cpus = os.cpu_count() or 1
+
+    return cpus if asgi else cpus * 2 + 1
+
+
+def gunicorn_options(
+    host: str,
+    port: int,
+    workers: int,
+    threads: int,
+    asgi: bool,
+    preload: bool,
+    backlog: int,
+    timeout: int,
+    graceful_timeout: int,
+    keep_alive: int,
+    max_requests: int,
+    reload: bool,
+    pidfile: str | None,
+) -> dict:
+    """
+    Returns the gunicorn settings for the options given on the command line (see
+    cli() for what they mean)
+    """
+    if asgi:
+        worker_class = "uvicorn.workers.UvicornWorker"
+    elif threads > 1:
+        worker_class = "gthread"
+    else:
+        worker_class = "sync"
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": worker_class,
+        "threads": threads,
+        # Importing the app before forking shares its memory between the workers
+        # (copy-on-write). This is safe as connections to the phonebook are only opened
+        # once a worker handles its first request.
+        "preload_app": preload and not reload,
+        "backlog": backlog,
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "keepalive": keep_alive,
+        "reload": reload,
+    }
+
+    # Restart each worker after about max_requests requests (staggered, so they don't
+    # all restart at once) to stop them slowly growing
+    if max_requests > 0:
+        options["max_requests"] = max_requests
+        options["max_requests_jitter"] = max(max_requests // 10, 1)
+
+    if pidfile is not None:
+        options["pidfile"] = pidfile
+
+    return options
+
+
+def run_gunicorn(app_uri: str, options: dict) -> None:
+    """Runs the app (given as module:variable) under gunicorn with these settings"""
+    try:
+        from gunicorn.app.base import BaseApplication
+        from gunicorn.util import import_app
+    except ImportError:
+        raise click.ClickException(
+            "gunicorn is not installed (it doesn't run on Windows). "
+            "Try --server uvicorn or --server wsgiref instead."
+        )
+
+    class PhonebookApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return import_app(app_uri)
+
+    PhonebookApplication().run()
+
+
+def run_uvicorn(
+    host: str,
+    port: int,
+    workers: int,
+    backlog: int,
+    graceful_timeout: int,
+    keep_alive: int,
+    reload: bool,
+) -> None:
+    """Runs the ASGI app under uvicorn"""
+    try:
+        import uvicorn
+    except ImportError:
+        raise click.ClickException("uvicorn is not installed.")
+
+    uvicorn.run(
+        ASGI_APP,
+        host=host,
+        port=port,
+        # uvicorn can't reload and run several workers at once
+        workers=1 if reload else workers,
+        backlog=backlog,
+        timeout_keep_alive=keep_alive,
+        timeout_graceful_shutdown=graceful_timeout,
+        reload=reload,
+    )
+
+
+def run_wsgiref(host: str, port: int) -> None:
+    """
+    Runs the api with the (single threaded) server in the standard library. Only use
+    this for trying the api out.
+    """
+    from wsgiref.simple_server import make_server
+
+    from main import app, contacts
+
+    with make_server(host, port, app) as httpd:
+        print(f"Serving on port {port}...")
+
+        # Serve until process is killed, then close the connections to the phonebook
+        try:
+            httpd.serve_forever()
+        finally:
+            contacts.close()
+
+
+@click.command()
+@click.option(
+    "--server",
+    type=click.Choice(["gunicorn", "uvicorn", "wsgiref"]),
+    default="gunicorn",
+    show_default=True,
+    help="The server to run the api with (uvicorn runs the ASGI app).",
+)
+@click.option("--host", default="0.0.0.0", show_default=True)
+@click.option("--port", type=int, default=8000, show_default=True)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    show_default="2 x CPUs + 1, or CPUs for the ASGI app",
+    help="How many worker processes to run.",
+)
+@click.option(
+    "--threads",
+    type=click.IntRange(min=1),
+    default=DEFAULT_POOL_SIZE,
+    show_default=True,
+    help="How many threads each (gunicorn) worker handles requests with. Each worker "
+    "has this many connections to the phonebook.",
+)
+@click.option(
+    "--asgi",
+    is_flag=True,
+    help="Run the ASGI app under gunicorn (with uvicorn workers).",
+)
+@click.option(
+    "--preload/--no-preload",
+    default=True,
+    show_default=True,
+    help="Import the app once before forking the (gunicorn) workers.",
+)
+@click.option(
+    "--backlog",
+    type=click.IntRange(min=1),
+    default=2048,
+    show_default=True,
+    help="How many connections can wait to be accepted.",
+)
+@click.option(
+    "--timeout",
+    type=click.IntRange(min=0),
+    default=30,
+    show_default=True,
+    help="How many seconds a (gunicorn) worker can be silent before it is restarted.",
+)
+@click.option(
+    "--graceful-timeout",
+    type=click.IntRange(min=0),
+    default=30,
+    show_default=True,
+    help="How many seconds workers get to finish their requests when restarted.",
+)
+@click.option(
+    "--keep-alive",
+    type=click.IntRange(min=0),
+    default=5,
+    show_default=True,
+    help="How many seconds to keep an idle connection open.",
+)
+@click.option(
+    "--max-requests",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Restart a (gunicorn) worker after about this many requests (0 never does).",
+)
+@click.option(
+    "--reload",
+    is_flag=True,
+    help="Restart the workers when the code changes (for development).",
+)
+@click.option(
+    "--pidfile",
+    default=None,
+    help="Where to write the (gunicorn) master's pid, so that kill -HUP $(cat "
+    "PIDFILE) can reload the workers gracefully.",
+)
+def cli(
+    server,
+    host,
+    port,
+    workers,
+    threads,
+    asgi,
+    preload,
+    backlog,
+    timeout,
+    graceful_timeout,
+    keep_alive,
+    max_requests,
+    reload,
+    pidfile,
+):
+    """Runs the fake phonebook api."""
+    if workers is None:
+        workers = default_workers(asgi or server == "uvicorn")
+
+    if server == "wsgiref":
+        run_wsgiref(host, port)
+    elif server == "uvicorn":
+        run_uvicorn(host, port, workers, backlog, graceful_timeout, keep_alive, reload)
+    else:
+        options = gunicorn_options(
+            host,
+            port,
+            workers,
+            threads,
+            asgi,
+            preload,
+            backlog,
+            timeout,
+            graceful_timeout,
+            keep_alive,
+            max_requests,
+            reload,
+            pidfile,
+        )
+        run_gunicorn(ASGI_APP if asgi else WSGI_APP, options)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,13 +1,24 @@
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from random import choice
 from unittest.mock import Mock
+from uuid import uuid4
 
 import pytest
+from api.resources.helpers.connection_pool import ConnectionPool
+from api.resources.helpers.env import PATH_TO_DB
+from api.resources.helpers.statements import get_statement_stats
+from api.resources.helpers.storage import StorageConfig
 from api.resources.http_methods.delete import (
     delete_contact_from_db,
     delete_contacts_from_db,
 )
 from api.resources.http_methods.get import get_contact_by_id, get_contacts
-from api.resources.http_methods.post import post_contact_to_db
+from api.resources.http_methods.post import add_contacts_to_db, post_contact_to_db
+from api.resources.http_methods.update import update_contact_in_db
+from api.resources.stores.sqlite import SQLiteContactStore
 
 
 def test_delete_contacts_from_db():
@@ -133,3 +144,145 @@ def test_delete_contact_from_db():
     )
 
     assert len(get_contacts()) == len(contacts_before)
+
+
+def test_get_contact_by_id_after_writes():
+    """
+    api.resources.http_methods.get.get_contact_by_id() caches the contacts it reads, so
+    it should return a contact's new details once they are updated and None once the
+    contact is deleted, rather than what it read before.
+    """
+    contact = {"name": "Test Cached Contact", "phone_number": "+44 7123452618"}
+    contact_id = post_contact_to_db(contact)
+
+    # The second read is from the cache
+    for _ in range(2):
+        assert get_contact_by_id(contact_id) == {
+            "id": contact_id,
+            "name": contact.get("name"),
+            "phone_number": contact.get("phone_number"),
+        }
+
+    update_contact_in_db({"id": contact_id, "phone_number": "+44 7123452619"})
+    assert get_contact_by_id(contact_id) == {
+        "id": contact_id,
+        "name": contact.get("name"),
+        "phone_number": "+44 7123452619",
+    }
+
+    delete_contact_from_db({"id": contact_id})
+    assert get_contact_by_id(contact_id) is None
+
+
+def test_add_contacts_to_db_skips_duplicates():
+    """
+    api.resources.http_methods.post.add_contacts_to_db() should add only the first of
+    the contacts with the same name, and none with the name (in any case) of a contact
+    already in the database.
+    """
+    existing_contact = choice(
+        [contact for contact in get_contacts() if contact.get("name").isascii()]
+    )
+    contacts_before = get_contacts()
+
+    records = [
+        (str(uuid4()), existing_contact.get("name").upper(), "+44 7123452621"),
+        (str(uuid4()), "Test Duplicate Contact", "+44 7123452622"),
+        (str(uuid4()), "test duplicate contact", "+44 7123452623"),
+    ]
+    assert add_contacts_to_db(records) == 1
+
+    assert len(get_contacts()) == len(contacts_before) + 1
+    assert get_contact_by_id(records[0][0]) is None
+    assert get_contact_by_id(records[2][0]) is None
+    assert delete_contact_from_db({"id": records[1][0]}) == {
+        "id": records[1][0],
+        "name": records[1][1],
+        "phone_number": records[1][2],
+    }
+
+
+def test_values_are_bound_to_named_statements():
+    """
+    The http methods should run their queries as named statements, with the values
+    bound as parameters, so a name with quotes in it is stored as it is given (and
+    can't change what a statement does).
+    """
+    stats_before = get_statement_stats()
+
+    contact = {"name": "Test O'Brien' OR '1' = '1", "phone_number": "+44 7123452624"}
+    contact_id = post_contact_to_db(contact)
+
+    assert get_contact_by_id(contact_id) == {
+        "id": contact_id,
+        "name": contact.get("name"),
+        "phone_number": contact.get("phone_number"),
+    }
+    assert update_contact_in_db({"id": contact_id, "name": "Test O'Brien"}) == {
+        "id": contact_id,
+        "name": "Test O'Brien",
+        "phone_number": contact.get("phone_number"),
+    }
+    assert delete_contact_from_db({"id": contact_id}).get("name") == "Test O'Brien"
+
+    stats_after = get_statement_stats()
+    for name in ["insert_new_contacts", "update_contact", "delete_contacts"]:
+        assert stats_after[name] > stats_before[name]
+
+
+def test_concurrent_writes_are_all_committed():
+    """
+    The database is in WAL mode and a writer that finds it locked waits (and retries),
+    so contacts added from several threads at once should all be added.
+    """
+    contacts = [
+        {"name": f"Test Concurrent Contact {i}", "phone_number": f"+44 71234526{i:02d}"}
+        for i in range(20)
+    ]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contact_ids = list(executor.map(post_contact_to_db, contacts))
+
+    assert None not in contact_ids
+
+    con = sqlite3.connect(PATH_TO_DB)
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    con.close()
+
+    deleted_contacts = delete_contacts_from_db(
+        [{"id": contact_id} for contact_id in contact_ids]
+    )
+    assert len(deleted_contacts) == len(contacts)
+
+
+def test_post_contacts_with_group_commit(tmp_path):
+    """
+    With group_commit on, contacts added from several threads at once should all be
+    added, with their writes committed in fewer transactions than there are contacts.
+    """
+    path_to_db = os.path.join(tmp_path, "fake_contacts.db")
+    shutil.copy(PATH_TO_DB, path_to_db)
+
+    storage = StorageConfig(group_commit=True, group_commit_delay=0.05)
+    store = SQLiteContactStore(ConnectionPool(path_to_db, storage=storage))
+
+    contacts = [
+        {"name": f"Test Group Commit Contact {i}", "phone_number": "+44 7123452625"}
+        for i in range(20)
+    ]
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        contact_ids = list(
+            executor.map(lambda contact: post_contact_to_db(contact, store), contacts)
+        )
+
+    assert None not in contact_ids
+    assert [
+        get_contact_by_id(contact_id, store).get("name") for contact_id in contact_ids
+    ] == [contact.get("name") for contact in contacts]
+
+    stats = store.stats()["write_queue"]
+    assert stats["writes"] == len(contacts)
+    assert stats["batches"] < len(contacts)
+
+    store.close()
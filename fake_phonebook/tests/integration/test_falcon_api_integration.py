@@ -1,12 +1,22 @@
+import csv
+import gzip
+import io
 import json
+import os
 from random import choice
 
 import falcon
 import falcon.media
 import pytest
+from api.resources.contacts import Contacts
+from api.resources.helpers.compression import CompressionMiddleware
+from api.resources.helpers.connection_pool import ConnectionPool
+from api.resources.helpers.errors import register_error_handlers
 from api.resources.http_methods.delete import delete_contact_from_db
 from api.resources.http_methods.get import get_contact_by_id, get_contacts
 from api.resources.http_methods.post import post_contact_to_db
+from api.resources.stores.memory import InMemoryContactStore
+from api.resources.stores.sqlite import SQLiteContactStore
 from falcon import testing
 from main import app
 
@@ -42,9 +52,17 @@ def test_post_contact(client):
     response = client.simulate_post("/contacts", body=json.dumps(contact))
     assert response.status == falcon.HTTP_400
 
-    # Use case 4: Test that on post of a dictionary with a name and a phone_number
-    # key-value pair returns status code 201.
+    # Use case 4: Test that on post of a dictionary with a name and a phone_number that
+    # isn't one returns status code 400, with an error saying which field is wrong.
     contact["name"] = "Test Post Contact"
+    contact["phone_number"] = "not a phone number"
+    response = client.simulate_post("/contacts", body=json.dumps(contact))
+    assert response.status == falcon.HTTP_400
+    assert [error["field"] for error in response.json["errors"]] == ["phone_number"]
+
+    # Use case 5: Test that on post of a dictionary with a name and a phone_number
+    # key-value pair returns status code 201. The phone number is normalized.
+    contact["phone_number"] = " +44  5361237462"
     response = client.simulate_post("/contacts", body=json.dumps(contact))
 
     assert response.status == falcon.HTTP_201
@@ -59,7 +77,7 @@ def test_post_contact(client):
     assert get_contact_by_id(contact_id) == {
         "id": contact_id,
         "name": contact.get("name"),
-        "phone_number": contact.get("phone_number"),
+        "phone_number": "+44 5361237462",
     }
 
     # Delete "Test Post Contact" from the database
@@ -73,6 +91,49 @@ def test_post_contact(client):
     assert get_contact_by_id(contact_id) is None
 
 
+def test_post_contacts_in_bulk(client):
+    """
+    Test the bulk post contacts operation, with a JSON array or newline delimited JSON
+    of contacts in the body.
+    """
+    contacts = [
+        {"name": "Test Bulk Contact 1", "phone_number": "+44 5361237462"},
+        {"name": "Test Bulk Contact 2"},
+        {"name": "Test Bulk Contact 1", "phone_number": "+44 5361237463"},
+    ]
+
+    # Use case 1: Test that on post of a JSON array of contacts, the valid contacts
+    # are added and the rest are rejected with status code 201.
+    response = client.simulate_post("/contacts", body=json.dumps(contacts))
+    assert response.status == falcon.HTTP_201
+    assert response.json["created"] == 1
+    assert response.json["rejected"] == 2
+
+    results = response.json["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert "error" in results[1]
+    assert results[1]["errors"][0]["field"] == "phone_number"
+    assert "error" in results[2]
+    assert get_contact_by_id(results[0]["id"]) == {
+        "id": results[0]["id"],
+        "name": contacts[0].get("name"),
+        "phone_number": contacts[0].get("phone_number"),
+    }
+
+    # Use case 2: Test that on post of newline delimited JSON with no valid contacts,
+    # status code 400 is returned.
+    response = client.simulate_post(
+        "/contacts",
+        body="\n".join(json.dumps(contact) for contact in contacts[1:]),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status == falcon.HTTP_400
+    assert response.json["created"] == 0
+
+    # Delete "Test Bulk Contact 1" from the database
+    delete_contact_from_db({"id": results[0]["id"]})
+
+
 def test_get_contact(client):
     """
     Test that getting a contact by their id returns status code 200 (or OK), if the
@@ -105,18 +166,444 @@ def test_get_contacts(client):
     response = client.simulate_get(f"/contacts?name_starts_with=Adam+D")
     assert response.status == falcon.HTTP_OK
 
+    # Use case 3: With the name query parameter given more than once, whether or not
+    # the contacts are streamed or paged (should return status code 400)
+    for params in ["", "&stream=1", "&limit=10"]:
+        response = client.simulate_get(f"/contacts?name=a&name=b{params}")
+        assert response.status == falcon.HTTP_400
+        assert "name query parameter is only given once" in response.text
+
+
+def test_get_contacts_by_page(client):
+    """
+    Test that getting contacts a page at a time returns status code 200 (or OK) and a
+    link to the next page, until the last page is reached.
+    """
+    # Use case 1: Following the next links should give back every contact, once
+    response = client.simulate_get("/contacts?limit=500")
+    assert response.status == falcon.HTTP_OK
+
+    contacts = response.json
+    while "link" in response.headers:
+        # The Link header looks like: </contacts?limit=500&cursor=...>; rel=next
+        assert response.headers["link"].endswith("rel=next")
+        next_page = response.headers["link"].split(";")[0].strip("<>")
+
+        response = client.simulate_get(next_page)
+        assert response.status == falcon.HTTP_OK
+        contacts += response.json
+
+    assert contacts == client.simulate_get("/contacts").json
+
+    # Use case 2: A limit that isn't a positive number should return status code 400
+    response = client.simulate_get("/contacts?limit=0")
+    assert response.status == falcon.HTTP_400
+
+    # Use case 3: A cursor that wasn't given in a Link header should return status
+    # code 400
+    response = client.simulate_get("/contacts?cursor=not-a-cursor")
+    assert response.status == falcon.HTTP_400
+
+
+def test_stream_contacts(client):
+    """
+    Test that streaming all contacts, as a JSON array or as newline delimited JSON,
+    returns status code 200 (or OK) and the same contacts as getting all contacts.
+    """
+    contacts = client.simulate_get("/contacts").json
+
+    # Use case 1: With the stream query parameter
+    response = client.simulate_get("/contacts?stream=1")
+    assert response.status == falcon.HTTP_OK
+    assert response.headers["content-type"] == falcon.MEDIA_JSON
+    assert response.json == contacts
+
+    # Use case 2: With an Accept header of application/x-ndjson
+    response = client.simulate_get(
+        "/contacts", headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status == falcon.HTTP_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == contacts
+
+
+def test_search_contacts(client):
+    """
+    Test that contacts can be found by any word in their name.
+    """
+    contact_id = post_contact_to_db(
+        {"name": "Test Search Zyzzyva", "phone_number": "+44 5361237470"}
+    )
+
+    # Use case 1: a surname (or any other word in the name) finds the contact
+    response = client.simulate_get("/contacts/search", params={"q": "ZYZZYVA"})
+    assert response.status == falcon.HTTP_200
+    assert response.json == [
+        {
+            "id": contact_id,
+            "name": "Test Search Zyzzyva",
+            "phone_number": "+44 5361237470",
+        }
+    ]
+
+    # Use case 2: a word ending in * matches the start of a word
+    response = client.simulate_get(
+        "/contacts/search", params={"q": "zyzz* search", "limit": 5}
+    )
+    assert [contact["id"] for contact in response.json] == [contact_id]
+
+    # Use case 3: a query without any words is a bad request
+    response = client.simulate_get("/contacts/search", params={"q": "*"})
+    assert response.status == falcon.HTTP_400
+
+    delete_contact_from_db({"id": contact_id})
+
+    response = client.simulate_get("/contacts/search", params={"q": "zyzzyva"})
+    assert response.json == []
+
+
+def test_suggest_contacts(client):
+    """
+    Test that names are suggested as they are typed, and that new names are
+    suggested straight away.
+    """
+    response = client.simulate_get("/contacts/suggest", params={"prefix": "test sug"})
+    assert response.status == falcon.HTTP_200
+    assert response.json == []
+
+    contact_id = post_contact_to_db(
+        {"name": "Test Suggest Contact", "phone_number": "+44 5361237470"}
+    )
+
+    response = client.simulate_get(
+        "/contacts/suggest", params={"prefix": "TEST SUG", "k": 3}
+    )
+    assert response.json == [{"id": contact_id, "name": "Test Suggest Contact"}]
+
+    delete_contact_from_db({"id": contact_id})
+
+    response = client.simulate_get("/contacts/suggest", params={"prefix": "test sug"})
+    assert response.json == []
+
+    # A prefix must be given
+    response = client.simulate_get("/contacts/suggest")
+    assert response.status == falcon.HTTP_400
+
+
+def test_get_contacts_by_phone(client):
+    """
+    Test that contacts can be found by their phone number, or the end of it.
+    """
+    contact_id = post_contact_to_db(
+        {"name": "Test Phone Contact", "phone_number": "+999 (0) 5361-237470"}
+    )
+    contact = {
+        "id": contact_id,
+        "name": "Test Phone Contact",
+        "phone_number": "+999 (0) 5361-237470",
+    }
+
+    # Use case 1: the whole phone number, written differently
+    response = client.simulate_get("/contacts", params={"phone": "0099905361237470"})
+    assert response.status == falcon.HTTP_200
+    assert response.json == [contact]
+
+    # Use case 2: the last digits of the phone number
+    response = client.simulate_get(
+        "/contacts", params={"phone": "905361237470", "match": "suffix"}
+    )
+    assert response.json == [contact]
+
+    # Use case 3: too few digits, or an unknown match, are bad requests
+    for params in [
+        {"phone": "70", "match": "suffix"},
+        {"phone": "+44 1", "match": "prefix"},
+        {"phone": "+44 1", "name": "Test"},
+    ]:
+        response = client.simulate_get("/contacts", params=params)
+        assert response.status == falcon.HTTP_400
+
+    delete_contact_from_db({"id": contact_id})
+
+    response = client.simulate_get("/contacts", params={"phone": "0099905361237470"})
+    assert response.json == []
+
+
+def test_get_contacts_by_country(client):
+    """
+    Test that contacts can be listed by the country of their phone number, and that
+    the number of contacts from each country is kept up to date.
+    """
+    stats = client.simulate_get("/contacts/stats").json
+    counts = {country["code"]: country["contacts"] for country in stats["countries"]}
+
+    contact_id = post_contact_to_db(
+        {"name": "Test Country Contact", "phone_number": "+672 3 12345"}
+    )
+
+    # Use case 1: the country (in any case) and a name
+    response = client.simulate_get(
+        "/contacts", params={"country": "nf", "name": "Test Country"}
+    )
+    assert response.status == falcon.HTTP_200
+    assert response.json == [
+        {
+            "id": contact_id,
+            "name": "Test Country Contact",
+            "phone_number": "+672 3 12345",
+        }
+    ]
+
+    response = client.simulate_get(
+        "/contacts", params={"country": "GB", "name": "Test Country", "limit": 10}
+    )
+    assert response.json == []
+
+    # Use case 2: the new contact is counted straight away
+    response = client.simulate_get("/contacts/stats")
+    assert response.status == falcon.HTTP_200
+    assert response.json["contacts"] == stats["contacts"] + 1
+    assert {
+        "code": "NF",
+        "name": "Norfolk Island",
+        "dial_code": "+672",
+        "contacts": counts.get("NF", 0) + 1,
+    } in response.json["countries"]
+
+    # Use case 3: a country that isn't the code of one is a bad request
+    for params in [{"country": "XX"}, {"country": "XX", "stream": 1}]:
+        response = client.simulate_get("/contacts", params=params)
+        assert response.status == falcon.HTTP_400
+
+    delete_contact_from_db({"id": contact_id})
+
+    assert client.simulate_get("/contacts/stats").json == stats
+
+
+def test_get_contacts_fields(client):
+    """
+    Test that only the fields asked for are returned, in the same order as without
+    them.
+    """
+    contacts = client.simulate_get("/contacts").json
+
+    # Use case 1: every contact, a page of them and a stream of them
+    for params in [
+        {"fields": "name,id"},
+        {"fields": ["id", "name"]},
+        {"fields": "id,name", "stream": 1},
+    ]:
+        response = client.simulate_get("/contacts", params=params)
+        assert response.status == falcon.HTTP_200
+        assert response.json == [
+            {"id": contact["id"], "name": contact["name"]} for contact in contacts
+        ]
+
+    response = client.simulate_get("/contacts", params={"fields": "id", "limit": 5})
+    assert response.json == [{"id": contact["id"]} for contact in contacts[:5]]
+
+    # The next page carries on from the last contact, even without its name
+    next_page = response.headers["link"].split(";")[0].strip("<>")
+    assert client.simulate_get(next_page).json == [
+        {"id": contact["id"]} for contact in contacts[5:10]
+    ]
+
+    # Use case 2: a single contact, which can also have its country
+    response = client.simulate_get(
+        f"/contacts/{contacts[0]['id']}", params={"fields": "name,country"}
+    )
+    assert response.status == falcon.HTTP_200
+    assert list(response.json) == ["name", "country"]
+    assert response.json["name"] == contacts[0]["name"]
+
+    # Use case 3: fields that aren't fields of a contact are bad requests
+    for uri, params in [
+        ("/contacts", {"fields": "id,password"}),
+        ("/contacts", {"fields": ","}),
+        ("/contacts", {"fields": "country"}),
+        ("/contacts", {"fields": "id,password", "stream": 1}),
+        (f"/contacts/{contacts[0]['id']}", {"fields": "password"}),
+    ]:
+        response = client.simulate_get(uri, params=params)
+        assert response.status == falcon.HTTP_400
+
+
+def test_get_contacts_as_media_types(client):
+    """
+    Test that the contacts are sent as CSV or newline delimited JSON for clients that
+    prefer them, and that a CSV of contacts can be posted.
+    """
+    contacts = client.simulate_get("/contacts", params={"limit": 5}).json
+
+    # Use case 1: a page of contacts as CSV, or as newline delimited JSON
+    response = client.simulate_get(
+        "/contacts", params={"limit": 5}, headers={"Accept": "text/csv"}
+    )
+    assert response.status == falcon.HTTP_200
+    assert response.headers["content-type"] == "text/csv"
+    assert "Accept" in response.headers["vary"]
+    assert list(csv.DictReader(io.StringIO(response.text))) == contacts
+    assert "link" in response.headers
+
+    response = client.simulate_get(
+        "/contacts", params={"limit": 5}, headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == contacts
+
+    # Use case 2: each media type has its own ETag, and JSON is still the default
+    etags = set()
+    for accept in ["text/csv", "application/json", "*/*"]:
+        response = client.simulate_get(
+            "/contacts", params={"limit": 5}, headers={"Accept": accept}
+        )
+        etags.add(response.headers["etag"])
+    assert response.headers["content-type"] == falcon.MEDIA_JSON
+    assert len(etags) == 2
+
+    # Use case 3: no contacts are just a header row (of the fields asked for), or an
+    # empty body of newline delimited JSON
+    for params, header in [
+        ({"name": "zzzz"}, "id,name,phone_number"),
+        ({"name": "zzzz", "fields": "id,name", "limit": 5}, "id,name"),
+    ]:
+        response = client.simulate_get(
+            "/contacts", params=params, headers={"Accept": "text/csv"}
+        )
+        assert response.status == falcon.HTTP_200
+        assert response.text.splitlines() == [header]
+
+    response = client.simulate_get(
+        "/contacts",
+        params={"name": "zzzz", "limit": 5},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.status == falcon.HTTP_200
+    assert response.text == ""
+
+    # Use case 4: a CSV of contacts is added in bulk
+    response = client.simulate_post(
+        "/contacts",
+        body="name,phone_number\nTest CSV Contact,+44 5361237464\nTest CSV Contact 2,\n",
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.status == falcon.HTTP_201
+    assert response.json["created"] == 1
+    assert response.json["rejected"] == 1
+
+    # Delete "Test CSV Contact" from the database
+    delete_contact_from_db({"id": response.json["results"][0]["id"]})
+
+
+def test_get_contacts_compressed(client):
+    """
+    Test that the contacts are compressed for clients that accept gzip, whether or not
+    they are streamed, and that their ETag still gets a 304 (Not Modified).
+    """
+    contacts = client.simulate_get("/contacts").json
+
+    for params in [{"stream": 1}, {}]:
+        response = client.simulate_get(
+            "/contacts", params=params, headers={"Accept-Encoding": "gzip, deflate"}
+        )
+        assert response.status == falcon.HTTP_200
+        assert response.headers["content-encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.content)) == contacts
+
+    # The ETag of a compressed (not streamed) response is strong, with the encoding on
+    # the end, and still matches
+    etag = client.simulate_get("/contacts").headers["etag"]
+    assert response.headers["etag"] == etag[:-1] + '-gzip"'
+
+    response = client.simulate_get(
+        "/contacts",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]},
+    )
+    assert response.status == falcon.HTTP_304
+    assert response.headers["etag"] == etag[:-1] + '-gzip"'
+
+
+def test_put_contact_with_compressed_etag():
+    """
+    Test that the ETag of a compressed response can be sent back in the If-Match header
+    of a PUT.
+    """
+    compressed_app = falcon.App(
+        middleware=[CompressionMiddleware(min_size=0, encodings=("gzip",))]
+    )
+    contacts = Contacts(InMemoryContactStore())
+    compressed_app.add_route("/contacts", contacts)
+    compressed_app.add_route("/contacts/{contact_id}", contacts, suffix="by_id")
+    compressed_client = testing.TestClient(compressed_app)
+
+    response = compressed_client.simulate_post(
+        "/contacts",
+        body=json.dumps({"name": "Test Compressed Contact", "phone_number": "+44 1"}),
+    )
+    contact_id = response.text.split(": ")[-1]
+
+    response = compressed_client.simulate_get(
+        f"/contacts/{contact_id}", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert not etag.startswith("W/") and etag.endswith('-gzip"')
+
+    response = compressed_client.simulate_put(
+        f"/contacts/{contact_id}",
+        body=json.dumps({"phone_number": "+44 2"}),
+        headers={"If-Match": etag},
+    )
+    assert response.status == falcon.HTTP_201
+
+    # It no longer matches once the contact has changed
+    response = compressed_client.simulate_put(
+        f"/contacts/{contact_id}",
+        body=json.dumps({"phone_number": "+44 3"}),
+        headers={"If-Match": etag},
+    )
+    assert response.status == falcon.HTTP_412
+
+
+def test_get_contacts_not_modified(client):
+    """
+    Test that getting all contacts with the ETag of the last response in an
+    If-None-Match header returns status code 304 (Not Modified), until the phonebook
+    changes.
+    """
+    response = client.simulate_get("/contacts?name=A")
+    assert response.status == falcon.HTTP_OK
+    etag = response.headers["etag"]
+
+    # Use case 1: Nothing has changed
+    response = client.simulate_get("/contacts?name=A", headers={"If-None-Match": etag})
+    assert response.status == falcon.HTTP_304
+    assert response.text == ""
+
+    # Use case 2: A contact was added to the phonebook
+    contact_id = post_contact_to_db(
+        {"name": "A Test Contact", "phone_number": "+44 5361237462"}
+    )
+
+    response = client.simulate_get("/contacts?name=A", headers={"If-None-Match": etag})
+    assert response.status == falcon.HTTP_OK
+    assert response.headers["etag"] != etag
+    assert contact_id in [contact.get("id") for contact in response.json]
+
+    delete_contact_from_db({"id": contact_id})
+
 
 def test_put_by_id(client):
     """
     Test that you can update a contact by their id.
     """
     # Use case 1: Trying to update a contact's name and phone number when their id
-    # doesn't exist in the phonebook should return status code 400.
+    # doesn't exist in the phonebook should return status code 404.
     response = client.simulate_put(
         "/contacts/this-id-does-not-exist",
         body=json.dumps({"name": "Test Put Contact", "phone_number": "+44 5361237462"}),
     )
-    assert response.status == falcon.HTTP_400
+    assert response.status == falcon.HTTP_404
 
     # Use case 2: Trying to update a contact that exists in the phonebook, but an
     # updated name or phone_number is not given should return status code 400.
@@ -159,6 +646,18 @@ def test_put_by_id(client):
     assert get_contact_by_id(contact_id)["name"] == "Test Contact"
     assert get_contact_by_id(contact_id)["phone_number"] == "+44 5361237461"
 
+    # Renaming the contact to the name of another contact should return status code
+    # 409, and leave the contact as it was
+    other_id = post_contact_to_db(
+        {"name": "Test Other Put Contact", "phone_number": "+44 5361237460"}
+    )
+    response = client.simulate_put(
+        f"/contacts/{contact_id}", body=json.dumps({"name": "test other put contact"})
+    )
+    assert response.status == falcon.HTTP_409
+    assert get_contact_by_id(contact_id)["name"] == "Test Contact"
+    delete_contact_from_db({"id": other_id})
+
     # Delete test contact from the phonebook
     delete_contact_from_db(
         {
@@ -170,6 +669,58 @@ def test_put_by_id(client):
     assert get_contact_by_id(contact_id) is None
 
 
+def test_put_by_id_if_match(client):
+    """
+    Test that a contact is only updated if the If-Match header matches its ETag.
+    """
+    contact_id = post_contact_to_db(
+        {"name": "Test If Match Contact", "phone_number": "+44 5361237465"}
+    )
+
+    etag = client.simulate_get(f"/contacts/{contact_id}").headers["etag"]
+
+    # Use case 1: Updating the contact with its current ETag should return status code
+    # 201 and the contact's new ETag.
+    response = client.simulate_put(
+        f"/contacts/{contact_id}",
+        body=json.dumps({"phone_number": "+44 5361237466"}),
+        headers={"If-Match": etag},
+    )
+    assert response.status == falcon.HTTP_201
+    assert response.headers["etag"] != etag
+    assert response.headers["etag"] == (
+        client.simulate_get(f"/contacts/{contact_id}").headers["etag"]
+    )
+
+    # Use case 2: Updating the contact with the ETag it had before it was updated
+    # should return status code 412 and leave the contact as it is.
+    response = client.simulate_put(
+        f"/contacts/{contact_id}",
+        body=json.dumps({"phone_number": "+44 5361237467"}),
+        headers={"If-Match": etag},
+    )
+    assert response.status == falcon.HTTP_412
+    assert get_contact_by_id(contact_id)["phone_number"] == "+44 5361237466"
+
+    # Use case 3: If-Match: * should match any contact that exists, but not one that
+    # doesn't.
+    response = client.simulate_put(
+        f"/contacts/{contact_id}",
+        body=json.dumps({"phone_number": "+44 5361237467"}),
+        headers={"If-Match": "*"},
+    )
+    assert response.status == falcon.HTTP_201
+
+    response = client.simulate_put(
+        "/contacts/this-id-does-not-exist",
+        body=json.dumps({"phone_number": "+44 5361237467"}),
+        headers={"If-Match": etag},
+    )
+    assert response.status == falcon.HTTP_404
+
+    delete_contact_from_db({"id": contact_id})
+
+
 def test_delete_by_id(client):
     """
     Test that you can delete a contact by their id.
@@ -207,6 +758,7 @@ def test_delete_contacts(client):
         ),
     )
     assert response.status == falcon.HTTP_400
+    assert [error["index"] for error in response.json["errors"]] == [0, 1, 2]
 
     # Use case 2: Assert when you call the delete operation on the contacts/ route with
     # ids that don't exist in the phonebook, the api should return status code 400.
@@ -237,6 +789,132 @@ def test_delete_contacts(client):
         ),
     )
     assert response.status == falcon.HTTP_201
+    assert response.json == {
+        "deleted": 2,
+        "contacts": [
+            {
+                "id": contact_id_1,
+                "name": "Test Contact 1",
+                "phone_number": "+44 5361237462",
+            },
+            {
+                "id": contact_id_2,
+                "name": "Test Contact 2",
+                "phone_number": "+44 5361237463",
+            },
+        ],
+        "not_found": [],
+    }
     assert get_contact_by_id(contact_id_1) is None
     assert get_contact_by_id(contact_id_2) is None
     assert get_contact_by_id(contact_id_3) is None
+
+
+def test_contacts_with_memory_store():
+    """
+    Test that the api works the same when the phonebook is kept in memory.
+    """
+    memory_app = falcon.App()
+    contacts = Contacts(InMemoryContactStore())
+    memory_app.add_route("/contacts", contacts)
+    memory_app.add_route("/contacts/{contact_id}", contacts, suffix="by_id")
+    memory_client = testing.TestClient(memory_app)
+
+    response = memory_client.simulate_post(
+        "/contacts",
+        body=json.dumps(
+            [
+                {"name": "Test Memory Contact", "phone_number": "+44 1"},
+                {"name": "test memory contact", "phone_number": "+44 2"},
+            ]
+        ),
+    )
+    assert response.status == falcon.HTTP_201
+    assert response.json["created"] == 1
+    contact_id = response.json["results"][0]["id"]
+
+    response = memory_client.simulate_get("/contacts", params={"name": "Test Memory"})
+    assert response.json == [
+        {"id": contact_id, "name": "Test Memory Contact", "phone_number": "+44 1"}
+    ]
+
+    response = memory_client.simulate_put(
+        f"/contacts/{contact_id}", body=json.dumps({"phone_number": "+44 3"})
+    )
+    assert response.status == falcon.HTTP_201
+
+    response = memory_client.simulate_delete(f"/contacts/{contact_id}")
+    assert response.status == falcon.HTTP_201
+    assert contacts.store.get(contact_id) is None
+
+
+def test_busy_phonebook(tmp_path):
+    """
+    Test that a request that no connection to the phonebook becomes free for (in time)
+    is answered with a 503 (Service Unavailable), whether or not it would be streamed.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "busy.db"), max_size=1, timeout=0.01)
+    busy_app = falcon.App()
+    register_error_handlers(busy_app)
+    contacts = Contacts(SQLiteContactStore(pool))
+    busy_app.add_route("/contacts", contacts)
+    busy_client = testing.TestClient(busy_app)
+
+    with pool.connection():
+        for params in [{"limit": "10"}, {"stream": "1"}]:
+            response = busy_client.simulate_get("/contacts", params=params)
+            assert response.status == falcon.HTTP_503
+            assert response.headers["retry-after"] == "1"
+
+    response = busy_client.simulate_get("/contacts", params={"stream": "1"})
+    assert response.status == falcon.HTTP_200
+    assert response.json == []
+
+    contacts.close()
+
+
+def test_bodies_are_validated_once(mocker):
+    """
+    Test that the body of a POST, PUT or DELETE is only validated by the resource, which
+    passes what it normalized on to the http_methods.
+    """
+    memory_app = falcon.App()
+    contacts = Contacts(InMemoryContactStore())
+    memory_app.add_route("/contacts", contacts)
+    memory_app.add_route("/contacts/{contact_id}", contacts, suffix="by_id")
+    memory_client = testing.TestClient(memory_app)
+
+    # The http_methods would reject every contact if they validated it again
+    mocker.patch(
+        "api.resources.http_methods.post.validate_contact",
+        side_effect=AssertionError("validated twice"),
+    )
+    mocker.patch(
+        "api.resources.http_methods.update.validate_update",
+        side_effect=AssertionError("validated twice"),
+    )
+
+    response = memory_client.simulate_post(
+        "/contacts",
+        body=json.dumps({"name": " Test Once Contact ", "phone_number": "0044 1"}),
+    )
+    assert response.status == falcon.HTTP_201
+    contact_id = response.text.split(": ")[-1]
+    assert contacts.store.get(contact_id) == {
+        "id": contact_id,
+        "name": "Test Once Contact",
+        "phone_number": "+44 1",
+    }
+
+    response = memory_client.simulate_put(
+        f"/contacts/{contact_id}", body=json.dumps({"phone_number": " 0044 2 "})
+    )
+    assert response.status == falcon.HTTP_201
+    assert contacts.store.get(contact_id)["phone_number"] == "+44 2"
+
+    response = memory_client.simulate_delete(
+        "/contacts", body=json.dumps([{"id": contact_id}, {"id": "not-a-contact"}])
+    )
+    assert response.status == falcon.HTTP_201
+    assert response.json["deleted"] == 1
+    assert response.json["not_found"] == ["not-a-contact"]
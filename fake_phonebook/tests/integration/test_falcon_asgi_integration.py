@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+
+import falcon
+import falcon.asgi
+import pytest
+from api.resources.async_contacts import AsyncContacts
+from api.resources.contacts import Contacts
+from api.resources.helpers.connection_pool import ConnectionPool
+from api.resources.helpers.errors import register_error_handlers
+from api.resources.http_methods.get import get_contact_by_id
+from api.resources.stores.sqlite import SQLiteContactStore
+from falcon import testing
+from main_asgi import app
+
+
+@pytest.fixture
+def client():
+    return testing.TestClient(app)
+
+
+def test_asgi_contact_lifecycle(client):
+    """
+    Test that a contact can be added, read, updated and deleted through the ASGI app.
+    """
+    # Add the contact
+    response = client.simulate_post(
+        "/contacts",
+        body=json.dumps(
+            {"name": "Test ASGI Contact", "phone_number": "+44 5361237470"}
+        ),
+    )
+    assert response.status == falcon.HTTP_201
+    contact_id = response.text.rpartition(" ")[2]
+
+    # Read the contact
+    response = client.simulate_get(f"/contacts/{contact_id}")
+    assert response.status == falcon.HTTP_200
+    assert response.json == {
+        "id": contact_id,
+        "name": "Test ASGI Contact",
+        "phone_number": "+44 5361237470",
+        "country": {"code": "GB", "name": "United Kingdom", "dial_code": "+44"},
+    }
+
+    # Update the contact, only if it hasn't changed since it was read
+    response = client.simulate_put(
+        f"/contacts/{contact_id}",
+        body=json.dumps({"phone_number": "+44 5361237471"}),
+        headers={"If-Match": response.headers["etag"]},
+    )
+    assert response.status == falcon.HTTP_201
+    assert get_contact_by_id(contact_id)["phone_number"] == "+44 5361237471"
+
+    # Delete the contact
+    response = client.simulate_delete(
+        "/contacts", body=json.dumps([{"id": contact_id}])
+    )
+    assert response.status == falcon.HTTP_201
+    assert response.json["deleted"] == 1
+
+    response = client.simulate_get(f"/contacts/{contact_id}")
+    assert response.status == falcon.HTTP_404
+
+
+def test_asgi_bulk_post_and_stream(client):
+    """
+    Test that the ASGI app can read a bulk POST while it is being received and stream
+    the contacts in the phonebook.
+    """
+    response = client.simulate_post(
+        "/contacts",
+        body="\n".join(
+            json.dumps({"name": f"Test ASGI Bulk Contact {i}", "phone_number": "+44 1"})
+            for i in range(3)
+        ),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status == falcon.HTTP_201
+    assert response.json["created"] == 3
+
+    response = client.simulate_get(
+        "/contacts",
+        params={"name": "Test ASGI Bulk Contact"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.status == falcon.HTTP_200
+    contacts = [json.loads(line) for line in response.text.splitlines()]
+    assert [contact["name"] for contact in contacts] == [
+        f"Test ASGI Bulk Contact {i}" for i in range(3)
+    ]
+
+    # The stream is compressed as it is sent, for clients that accept it
+    response = client.simulate_get(
+        "/contacts",
+        params={"name": "Test ASGI Bulk Contact"},
+        headers={"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"},
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert [
+        json.loads(line) for line in gzip.decompress(response.content).splitlines()
+    ] == contacts
+
+    client.simulate_delete(
+        "/contacts", body=json.dumps([{"id": contact["id"]} for contact in contacts])
+    )
+
+
+def test_asgi_busy_phonebook(tmp_path):
+    """
+    Test that the ASGI app answers a request that no connection to the phonebook becomes
+    free for (in time) with a 503 (Service Unavailable).
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "busy.db"), max_size=1, timeout=0.01)
+    busy_app = falcon.asgi.App()
+    register_error_handlers(busy_app)
+    contacts = AsyncContacts(Contacts(SQLiteContactStore(pool)))
+    busy_app.add_route("/contacts", contacts)
+    busy_client = testing.TestClient(busy_app)
+
+    with pool.connection():
+        response = busy_client.simulate_get("/contacts", params={"stream": "1"})
+        assert response.status == falcon.HTTP_503
+        assert response.headers["retry-after"] == "1"
+
+    response = busy_client.simulate_get("/contacts", params={"stream": "1"})
+    assert response.status == falcon.HTTP_200
+    assert response.json == []
+
+    contacts.close()
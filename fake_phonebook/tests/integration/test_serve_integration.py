@@ -0,0 +1,51 @@
+"""
+Tests running the api with the launcher in ./serve.py
+"""
+
+import json
+import socket
+import subprocess
+import sys
+from urllib.request import urlopen
+
+from api.resources.helpers.env import PARENT_DIR
+
+
+def test_serve_with_wsgiref():
+    """
+    python serve.py --server wsgiref should serve the api on the host and port given.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-u",
+            "serve.py",
+            "--server",
+            "wsgiref",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+        ],
+        cwd=PARENT_DIR,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+    try:
+        # The server is listening once it says so
+        assert process.stdout.readline() == f"Serving on port {port}...\n"
+
+        with urlopen(
+            f"http://127.0.0.1:{port}/contacts?limit=1", timeout=10
+        ) as response:
+            assert response.status == 200
+            assert len(json.load(response)) == 1
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        process.stdout.close()
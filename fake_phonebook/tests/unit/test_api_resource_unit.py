@@ -4,11 +4,18 @@ from random import choice
 from string import ascii_lowercase
 from unittest.mock import Mock
 
+import pytest
 from api.resources.helpers.env import PATH_TO_DB
+from api.resources.helpers.schema import CONTACTS_MIGRATIONS, migrate
 from api.resources.http_methods.delete import delete_contact_from_db
-from api.resources.http_methods.get import get_contact_by_id, get_contacts
+from api.resources.http_methods.get import (
+    get_contact_by_id,
+    get_contacts,
+    get_page_of_contacts,
+)
 from api.resources.http_methods.post import add_contacts_to_db, post_contact_to_db
 from api.resources.http_methods.update import update_contact_in_db
+from api.resources.stores.sqlite import insert_new_contacts
 from faker import Faker
 from pytest_mock import mocker
 
@@ -59,6 +66,37 @@ def test_add_contacts_to_db():
         con.commit()
 
 
+def test_insert_new_contacts_skips_duplicates():
+    """
+    api.resources.stores.sqlite.insert_new_contacts() should only insert the first
+    of the records with the same name, and none of the records with the name of a
+    contact already in the db, and return the records it inserted.
+    """
+    con = sqlite3.connect(":memory:")
+    migrate(con, CONTACTS_MIGRATIONS)
+    cur = con.cursor()
+
+    assert insert_new_contacts(cur, [("id-1", "Adam Bowman", "+44 1234567891")]) == [
+        ("id-1", "Adam Bowman", "+44 1234567891")
+    ]
+
+    records = [
+        ("id-2", "adam bowman", "+44 1234567892"),  # Already in the db
+        ("id-3", "Catherine Daniels", "+44 2345678912"),
+        ("id-4", "Catherine Daniels", "+44 2345678913"),  # Earlier in the records
+        ("id-5", "Esther Frank", "+44 3456789123"),
+    ]
+    assert insert_new_contacts(cur, records) == [records[1], records[3]]
+
+    assert [row[0] for row in cur.execute("SELECT id FROM contacts ORDER BY id")] == [
+        "id-1",
+        "id-3",
+        "id-5",
+    ]
+
+    con.close()
+
+
 def test_post_contact_to_db(mocker: Mock):
     """
     api.resources.helpers.list_contacts.post_contact_to_db() should return the id of the
@@ -159,6 +197,30 @@ def test_get_contact_by_id():
     assert get_contact_by_id("this-id-doesnt-exist") is None
 
 
+def test_get_page_of_contacts():
+    """
+    api.resources.http_methods.get.get_page_of_contacts() should return the same
+    contacts as get_contacts() when all the pages are put together, along with the cursor
+    of the next page (or None on the last page).
+    """
+    all_contacts = get_contacts()
+
+    pages = []
+    contacts, cursor = get_page_of_contacts(limit=250)
+    pages.append(contacts)
+
+    while cursor is not None:
+        assert len(contacts) == 250
+        contacts, cursor = get_page_of_contacts(limit=250, cursor=cursor)
+        pages.append(contacts)
+
+    assert [contact for page in pages for contact in page] == all_contacts
+
+    # A cursor that wasn't returned with a previous page is not valid
+    with pytest.raises(ValueError):
+        get_page_of_contacts(cursor="this-is-not-a-cursor")
+
+
 # =========================== Tests for PUT methods (Update) ===========================
 def test_update_contact_in_db(mocker: Mock):
     """
@@ -166,12 +228,17 @@ def test_update_contact_in_db(mocker: Mock):
     (new) name and/or (new) phone_number of the contact added to the database or
     None if the contact could not be deleted from the database successfully.
     """
-    # Get a random contact from the database
+    # Get a random contact from the database, whose name no other contact has (as it
+    # is given its name back at the end, and a contact can't be renamed to another
+    # contact's name)
     with sqlite3.connect(PATH_TO_DB) as con:
         cur = con.cursor()
         contacts = [
             record
-            for record in cur.execute("SELECT id, name, phone_number FROM contacts")
+            for record in cur.execute(
+                "SELECT id, name, phone_number FROM contacts "
+                "GROUP BY name COLLATE NOCASE HAVING COUNT(*) = 1"
+            )
         ]
 
     original_contact = choice(contacts)
@@ -0,0 +1,125 @@
+"""
+Tests the ContactCache in ./api/resources/helpers/cache.py
+"""
+
+from unittest.mock import Mock
+
+from api.resources.helpers.cache import CachedResult, ContactCache, ResultCache
+from pytest_mock import mocker
+
+
+def test_cache_hits_and_misses():
+    """
+    A cached contact should be returned (as a copy) until it is invalidated.
+    """
+    cache = ContactCache()
+    contact = {"id": "id-1", "name": "Adam Bowman", "phone_number": "+44 1234567891"}
+
+    assert cache.get("id-1") is None
+
+    cache.put(contact)
+    assert cache.get("id-1") == contact
+    assert cache.get("id-1") is not contact
+
+    cache.invalidate("id-1")
+    assert cache.get("id-1") is None
+
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_checks_the_version_at_most_every_interval(mocker: Mock):
+    """
+    The version of the contacts should only be read once every check_interval seconds,
+    and the cache cleared when it has changed (e.g. another process wrote to them).
+    """
+    monotonic = mocker.patch("api.resources.helpers.cache.time.monotonic")
+    monotonic.return_value = 100.0
+    read_version = Mock(return_value=1)
+
+    cache = ContactCache(check_interval=1.0)
+    cache.check_version(read_version)
+    cache.put({"id": "id-1", "name": "One", "phone_number": "+44 1"})
+
+    # Within the interval the version isn't read, even once it has changed
+    read_version.return_value = 2
+    monotonic.return_value = 100.5
+    cache.check_version(read_version)
+    assert read_version.call_count == 1
+    assert cache.get("id-1") is not None
+
+    monotonic.return_value = 101.0
+    cache.check_version(read_version)
+    assert read_version.call_count == 2
+    assert cache.get("id-1") is None
+
+    # An unchanged version leaves the cache as it is
+    cache.put({"id": "id-1", "name": "One", "phone_number": "+44 1"})
+    monotonic.return_value = 102.0
+    cache.check_version(read_version)
+    assert cache.get("id-1") is not None
+
+    assert cache.stats()["version_checks"] == 3
+    assert cache.stats()["version_changes"] == 1
+
+
+def test_cache_evicts_least_recently_used_contact():
+    """
+    Once the cache is full, the contact that was used the longest time ago should be
+    evicted.
+    """
+    cache = ContactCache(max_size=2)
+
+    cache.put({"id": "id-1", "name": "One", "phone_number": "+44 1"})
+    cache.put({"id": "id-2", "name": "Two", "phone_number": "+44 2"})
+
+    # Using id-1 makes id-2 the least recently used contact
+    cache.get("id-1")
+    cache.put({"id": "id-3", "name": "Three", "phone_number": "+44 3"})
+
+    assert cache.get("id-1") is not None
+    assert cache.get("id-2") is None
+    assert cache.get("id-3") is not None
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_contacts_expire(mocker: Mock):
+    """
+    A contact should not be returned from the cache once its ttl has passed.
+    """
+    monotonic = mocker.patch("api.resources.helpers.cache.time.monotonic")
+    monotonic.return_value = 100.0
+
+    cache = ContactCache(ttl=10.0)
+    cache.put({"id": "id-1", "name": "One", "phone_number": "+44 1"})
+
+    monotonic.return_value = 105.0
+    assert cache.get("id-1") is not None
+
+    monotonic.return_value = 111.0
+    assert cache.get("id-1") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_result_cache_is_invalidated_by_writes():
+    """
+    A cached result should only be returned at the version of the contacts it was read
+    at, so a result read before a write (by any process) is never served after it.
+    """
+    cache = ResultCache()
+    result = CachedResult(b"[]")
+
+    cache.put("/contacts", 1, result)
+    assert cache.get("/contacts", 1) is result
+
+    # Another process wrote to the contacts
+    assert cache.get("/contacts", 2) is None
+
+    # This result was read at version 1, while the contacts were changing
+    cache.put("/contacts", 1, result)
+    assert cache.get("/contacts", 2) is None
+
+    cache.put("/contacts", 2, result)
+    cache.clear()
+    assert cache.get("/contacts", 2) is None
@@ -0,0 +1,128 @@
+"""
+Tests the CompressionMiddleware in ./api/resources/helpers/compression.py
+"""
+
+import gzip
+import json
+
+import falcon
+import pytest
+from api.resources.helpers.compression import (
+    CompressionMiddleware,
+    choose_encoding,
+    encoded_etag,
+    strip_encoding,
+)
+from falcon import testing
+
+CONTACTS = [
+    {"id": f"id-{i}", "name": f"Contact {i}", "phone_number": "+1 5550100"}
+    for i in range(200)
+]
+
+
+class FakeContacts:
+    def on_get(self, req, resp):
+        resp.media = CONTACTS[: req.get_param_as_int("count", default=200)]
+
+    def on_get_stream(self, req, resp):
+        resp.stream = (f"{contact}\n".encode("utf-8") for contact in CONTACTS)
+
+
+def test_choose_encoding():
+    """
+    The encoding the client wants most should be chosen, with ties going to the
+    encoding preferred by the api.
+    """
+    assert choose_encoding(None, ("zstd", "gzip")) is None
+    assert choose_encoding("gzip, deflate", ("zstd", "gzip")) == "gzip"
+    assert choose_encoding("gzip, zstd", ("zstd", "gzip")) == "zstd"
+    assert choose_encoding("gzip, zstd;q=0.5", ("zstd", "gzip")) == "gzip"
+    assert choose_encoding("*", ("zstd", "gzip")) == "zstd"
+    assert choose_encoding("*, zstd;q=0", ("zstd", "gzip")) == "gzip"
+    assert choose_encoding("GZIP;q=0", ("gzip",)) is None
+    assert choose_encoding("identity", ("gzip",)) is None
+
+
+def test_encoded_etags():
+    """
+    A compressed response's ETag should have its encoding on the end (and stay strong),
+    and strip_encoding() should take it off again.
+    """
+    assert encoded_etag('"abc"', "gzip") == '"abc-gzip"'
+    assert encoded_etag('W/"abc"', "br") == 'W/"abc-br"'
+    assert strip_encoding("abc-gzip") == "abc"
+    assert strip_encoding("abc-zstd") == "abc"
+    assert strip_encoding("abc") == "abc"
+    assert strip_encoding("abc-def") == "abc-def"
+    assert strip_encoding("*") == "*"
+
+
+def test_middleware_compresses_large_and_streamed_bodies():
+    """
+    Bodies at least min_size long (and streamed ones) should be compressed for clients
+    that accept it, and the bytes in and out should be counted.
+    """
+    compression = CompressionMiddleware(min_size=1024, level=1, encodings=("gzip",))
+    app = falcon.App(middleware=[compression])
+    app.add_route("/contacts", FakeContacts())
+    app.add_route("/contacts/stream", FakeContacts(), suffix="stream")
+    client = testing.TestClient(app)
+
+    # A large body
+    response = client.simulate_get("/contacts", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(response.content)) == CONTACTS
+
+    # A small body, or a client that doesn't accept gzip
+    for params, headers in [
+        ({"count": 1}, {"Accept-Encoding": "gzip"}),
+        ({}, {"Accept-Encoding": "br"}),
+        ({}, {}),
+    ]:
+        response = client.simulate_get("/contacts", params=params, headers=headers)
+        assert "content-encoding" not in response.headers
+        assert response.json == CONTACTS[: params.get("count", 200)]
+
+    # A streamed body
+    response = client.simulate_get(
+        "/contacts/stream", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.content).decode("utf-8") == "".join(
+        f"{contact}\n" for contact in CONTACTS
+    )
+
+    stats = compression.stats()
+    assert stats["responses"] == {"gzip": 2}
+    assert stats["too_small"] == 1
+    assert 0 < stats["bytes_out"] < stats["bytes_in"]
+
+
+def test_middleware_from_env():
+    """
+    The middleware should be configured by the PHONEBOOK_COMPRESSION* environment
+    variables, and refuse settings it can't use.
+    """
+    compression = CompressionMiddleware.from_env(
+        {
+            "PHONEBOOK_COMPRESSION_MIN_SIZE": "100",
+            "PHONEBOOK_COMPRESSION_LEVEL": "9",
+            "PHONEBOOK_COMPRESSION_ENCODINGS": "GZIP",
+        }
+    )
+    assert (compression.min_size, compression.level) == (100, 9)
+    assert compression.encodings == ("gzip",)
+
+    assert (
+        CompressionMiddleware.from_env({"PHONEBOOK_COMPRESSION": "0"}).encodings == ()
+    )
+
+    for environ in [
+        {"PHONEBOOK_COMPRESSION_LEVEL": "10"},
+        {"PHONEBOOK_COMPRESSION_LEVEL": "fast"},
+        {"PHONEBOOK_COMPRESSION_ENCODINGS": "deflate"},
+    ]:
+        with pytest.raises(ValueError):
+            CompressionMiddleware.from_env(environ)
@@ -0,0 +1,201 @@
+"""
+Tests the ConnectionPool in ./api/resources/helpers/connection_pool.py
+"""
+
+import os
+import sqlite3
+
+import pytest
+from api.resources.helpers.connection_pool import (
+    ConnectionPool,
+    PoolClosedError,
+    PoolTimeoutError,
+)
+from api.resources.helpers.storage import StorageConfig
+
+
+def test_connections_are_reused(tmp_path):
+    """
+    A connection released back to the pool should be handed out again instead of a new
+    connection being opened.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "pool.db"), max_size=2)
+
+    with pool.connection() as con_1:
+        pass
+
+    with pool.connection() as con_2:
+        pass
+
+    assert con_1 is con_2
+    assert pool.stats()["size"] == 1
+    assert pool.stats()["acquired"] == 2
+    assert pool.stats()["in_use"] == 0
+
+    pool.close()
+
+
+def test_pool_is_bounded(tmp_path):
+    """
+    The pool should never open more than max_size connections and should raise a
+    PoolTimeoutError if no connection is released in time.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "pool.db"), max_size=1, timeout=0.01)
+
+    con = pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    assert pool.stats()["size"] == 1
+    assert pool.stats()["waits"] == 0
+
+    pool.release(con)
+    pool.close()
+
+
+def test_uncommitted_transactions_are_rolled_back(tmp_path):
+    """
+    A transaction left open by a caller should not leak into the next caller.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "pool.db"), max_size=1)
+
+    with pool.connection() as con:
+        con.execute("CREATE TABLE t(x)")
+        con.commit()
+        con.execute("INSERT INTO t VALUES(1)")
+
+    with pool.connection() as con:
+        assert con.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    pool.close()
+
+
+def test_closed_pool_refuses_connections(tmp_path):
+    """
+    Once a pool is closed it should not lend out any more connections.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "pool.db"))
+    pool.close()
+
+    with pytest.raises(PoolClosedError):
+        pool.acquire()
+
+
+def test_connections_from_before_a_reopen_are_closed(tmp_path):
+    """
+    A connection lent out before the pool was closed (and reopened) should be closed
+    when it is released, instead of blocking to be handed back to a full pool.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "pool.db"), max_size=1, timeout=0.01)
+
+    old_con = pool.acquire()
+    pool.close()
+    pool.reopen()
+
+    # The reopened pool fills up with a new connection
+    with pool.connection() as new_con:
+        pass
+
+    pool.release(old_con)
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        old_con.execute("SELECT 1")
+
+    with pool.connection() as con:
+        assert con is new_con
+
+    assert pool.stats()["size"] == 1
+    assert pool.stats()["idle"] == 1
+    assert pool.stats()["in_use"] == 0
+
+    pool.close()
+
+
+def test_connections_use_the_storage_config(tmp_path):
+    """
+    Every connection should be configured with the pool's StorageConfig, and closing
+    the pool should checkpoint the WAL back into the database.
+    """
+    path_to_db = os.path.join(tmp_path, "pool.db")
+    pool = ConnectionPool(
+        path_to_db, storage=StorageConfig(busy_timeout=1234, synchronous="FULL")
+    )
+
+    with pool.connection() as con:
+        assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert con.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+        assert con.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+
+    pool.close()
+
+    assert pool.stats()["checkpoints"] == 1
+    assert (
+        not os.path.exists(path_to_db + "-wal")
+        or os.path.getsize(path_to_db + "-wal") == 0
+    )
+
+
+def test_busy_transactions_are_retried(tmp_path):
+    """
+    A transaction that fails because another connection holds the write lock should
+    be retried (up to busy_retries times) once the lock is released.
+    """
+    path_to_db = os.path.join(tmp_path, "pool.db")
+    pool = ConnectionPool(
+        path_to_db,
+        storage=StorageConfig(busy_timeout=0, busy_retries=3, busy_backoff=0.001),
+    )
+
+    with pool.connection() as con:
+        con.execute("CREATE TABLE t(x)")
+
+    # Another process holds the write lock for the first two attempts
+    blocker = sqlite3.connect(path_to_db, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    attempts = []
+
+    def insert(con):
+        attempts.append(1)
+
+        if len(attempts) == 3:
+            blocker.execute("COMMIT")
+
+        con.execute("INSERT INTO t VALUES(1)")
+
+    pool.run_in_transaction(insert)
+
+    assert len(attempts) == 3
+    assert pool.stats()["busy_retries"] == 2
+
+    # Once the retries run out, the error is raised
+    blocker.execute("BEGIN IMMEDIATE")
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.run_in_transaction(insert)
+
+    assert pool.stats()["busy_retries"] == 5
+
+    blocker.execute("COMMIT")
+    blocker.close()
+    pool.close()
+
+
+def test_storage_config_from_env():
+    """
+    StorageConfig.from_env() should read the PHONEBOOK_* environment variables and
+    refuse values it can't use.
+    """
+    storage = StorageConfig.from_env(
+        {"PHONEBOOK_JOURNAL_MODE": "delete", "PHONEBOOK_BUSY_RETRIES": "2"}
+    )
+
+    assert storage.journal_mode == "DELETE"
+    assert storage.busy_retries == 2
+    assert "PRAGMA journal_mode = DELETE" in storage.pragmas()
+
+    with pytest.raises(ValueError):
+        StorageConfig.from_env({"PHONEBOOK_BUSY_TIMEOUT_MS": "soon"})
+
+    with pytest.raises(ValueError):
+        StorageConfig.from_env({"PHONEBOOK_SYNCHRONOUS": "SOMETIMES"})
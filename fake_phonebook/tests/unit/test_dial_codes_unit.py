@@ -0,0 +1,47 @@
+"""
+Tests the DialCodeTrie in ./api/resources/helpers/dial_codes.py
+"""
+
+from api.resources.helpers.dial_codes import DIAL_CODES, DialCodeTrie
+from create_and_load.phone_numbers.country_codes import country_codes
+
+
+def test_resolve_longest_dial_code():
+    """
+    A phone number should resolve to the country of the longest dial code it starts
+    with, however the dial code is written in country_codes.
+    """
+    assert DIAL_CODES.resolve("+44 5361237462")["code"] == "GB"
+    assert DIAL_CODES.resolve("+1 684 1234567")["code"] == "AS"
+    assert DIAL_CODES.resolve("+1 268 1234567")["code"] == "AG"
+    assert DIAL_CODES.resolve("+1 555 1234567")["code"] == "US"
+    assert DIAL_CODES.resolve("+7 7123456789")["code"] == "KZ"
+    assert DIAL_CODES.resolve("0079123456789")["code"] == "RU"
+
+    # Numbers without a (known) dial code
+    assert DIAL_CODES.resolve("07700 900123") is None
+    assert DIAL_CODES.resolve("+999 123") is None
+
+
+def test_resolve_many():
+    """
+    resolve_many() (and resolve_codes()) should resolve every number (including
+    repeated ones) in order, the same way as resolve().
+    """
+    phone_numbers = ["+44 1", "+262 016446817", "+44 1", "12345"]
+
+    assert [
+        country["code"] if country is not None else None
+        for country in DIAL_CODES.resolve_many(iter(phone_numbers))
+    ] == ["GB", "RE", "GB", None]
+    assert DIAL_CODES.resolve_codes(iter(phone_numbers)) == ["GB", "RE", "GB", ""]
+
+    # Every country generated phone numbers can be from resolves to a country with
+    # the same dial code
+    trie = DialCodeTrie(country_codes)
+    for country in country_codes:
+        if country["dial_code"] is not None:
+            resolved = trie.resolve(country["dial_code"] + " 000")
+            assert resolved["dial_code"].replace(" ", "") == country[
+                "dial_code"
+            ].replace(" ", "")
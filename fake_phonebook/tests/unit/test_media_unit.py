@@ -0,0 +1,122 @@
+"""
+Tests the media handlers in ./api/resources/helpers/media.py and the benchmark of them
+in ./benchmark_media.py
+"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+
+import falcon
+import pytest
+from api.resources.helpers.media import (
+    AVAILABLE_MEDIA_TYPES,
+    MEDIA_CSV,
+    MEDIA_MSGPACK,
+    MEDIA_NDJSON,
+    CSVHandler,
+    NDJSONHandler,
+    create_media_handlers,
+    loads,
+)
+from benchmark_media import run_benchmark
+
+CONTACTS = [
+    {"id": "1", "name": "Zoë Smith", "phone_number": "+44 7700 900000"},
+    {"id": "2", "name": 'Adam "Ad" Jones, Jr', "phone_number": "+1 5550100"},
+]
+
+
+def test_handlers_read_back_what_they_write():
+    """Each handler should read back the contacts it wrote, accents and all"""
+    handlers = create_media_handlers()
+
+    for media_type in [falcon.MEDIA_JSON, MEDIA_NDJSON, MEDIA_CSV]:
+        handler = handlers[media_type]
+        body = handler.serialize(CONTACTS, media_type)
+
+        assert handler.deserialize(io.BytesIO(body), media_type, len(body)) == CONTACTS
+
+    assert loads(handlers[falcon.MEDIA_JSON].serialize(CONTACTS, None)) == CONTACTS
+
+
+def test_csv_handler():
+    """
+    The CSV should have a header row, values that aren't strings should be written as
+    JSON and no contacts (None or an empty list) should be just the header row.
+    """
+    handler = CSVHandler()
+
+    assert handler.serialize([], MEDIA_CSV) == b"id,name,phone_number\r\n"
+    assert handler.serialize(None, MEDIA_CSV, ("id", "name")) == b"id,name\r\n"
+    assert NDJSONHandler().serialize(None, MEDIA_NDJSON) == b""
+    assert handler.serialize(
+        {"id": "1", "country": {"code": "GB"}}, MEDIA_CSV
+    ).splitlines() == [b"id,country", b'1,"{""code"":""GB""}"']
+
+
+# Imports the media handlers with orjson and msgpack missing (a None in sys.modules
+# makes importing it raise an ImportError) and prints what they can do
+WITHOUT_OPTIONAL_PACKAGES = """
+import json, sys
+sys.modules.update(orjson=None, msgpack=None)
+from api.resources.helpers import media
+contacts = json.loads(sys.argv[1])
+json_handler = media.create_media_handlers()["application/json"]
+print(json.dumps({
+    "media_types": sorted(media.AVAILABLE_MEDIA_TYPES),
+    "json": json_handler.serialize(contacts, None).decode("utf-8"),
+}))
+"""
+
+
+def test_handlers_without_the_optional_packages():
+    """
+    Without msgpack, MessagePack shouldn't be offered, and without orjson, JSON should
+    be written with the json module, in the same bytes as orjson writes.
+    """
+    handlers = create_media_handlers()
+    assert MEDIA_MSGPACK in AVAILABLE_MEDIA_TYPES
+    body = handlers[MEDIA_MSGPACK].serialize(CONTACTS, MEDIA_MSGPACK)
+    assert (
+        handlers[MEDIA_MSGPACK].deserialize(io.BytesIO(body), MEDIA_MSGPACK, None)
+        == CONTACTS
+    )
+
+    # In another process, so that the modules of this one are left as they are
+    output = subprocess.run(
+        [sys.executable, "-c", WITHOUT_OPTIONAL_PACKAGES, json.dumps(CONTACTS)],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        capture_output=True,
+        check=True,
+    )
+    result = json.loads(output.stdout)
+
+    assert result["media_types"] == sorted([falcon.MEDIA_JSON, MEDIA_NDJSON, MEDIA_CSV])
+    assert result["json"].encode("utf-8") == handlers[falcon.MEDIA_JSON].serialize(
+        CONTACTS, None
+    )
+
+
+def test_malformed_bodies():
+    """Bodies that can't be read should raise a MediaMalformedError"""
+    with pytest.raises(falcon.MediaMalformedError):
+        NDJSONHandler().deserialize(io.BytesIO(b'{"id": "1"}\n{"id'), MEDIA_NDJSON, 16)
+
+    with pytest.raises(falcon.MediaMalformedError):
+        CSVHandler().deserialize(io.BytesIO(b"\xff\xfe"), MEDIA_CSV, 2)
+
+
+def test_benchmark():
+    """The benchmark should time (and size) every available media type"""
+    results = run_benchmark(rows=10, repeat=1)
+
+    assert results[0]["media_type"] == "json module"
+    assert {result["media_type"] for result in results} >= {
+        falcon.MEDIA_JSON,
+        MEDIA_NDJSON,
+        MEDIA_CSV,
+    }
+    assert all(result["bytes"] > 0 for result in results)
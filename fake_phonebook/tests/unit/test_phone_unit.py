@@ -0,0 +1,40 @@
+"""
+Tests the phone number normalization in ./api/resources/helpers/phone.py
+"""
+
+from api.resources.helpers.phone import (
+    phone_columns,
+    phone_digits,
+    reversed_suffix_range,
+)
+
+
+def test_phone_digits():
+    """
+    Phone numbers written differently should have the same digits.
+    """
+    for phone_number in [
+        "+44 5361237462",
+        "+44 (5361) 237-462",
+        "0044 5361 237462",
+        " 44 5361237462",
+    ]:
+        assert phone_digits(phone_number) == "445361237462"
+
+    # A leading 00 is only the international call prefix without a +
+    assert phone_digits("+00 1234") == "001234"
+    assert phone_columns("+1 473 25802947") == ("147325802947", "749208523741")
+
+
+def test_reversed_suffix_range():
+    """
+    The range should hold every reversed number that ends with the suffix, and nothing
+    else.
+    """
+    start, end = reversed_suffix_range("7462")
+
+    for digits in ["7462", "445361237462", "97462"]:
+        assert start <= digits[::-1] < end
+
+    for digits in ["462", "445361237463", "74629"]:
+        assert not start <= digits[::-1] < end
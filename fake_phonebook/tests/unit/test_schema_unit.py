@@ -0,0 +1,119 @@
+"""
+Tests the migrations in ./api/resources/helpers/schema.py
+"""
+
+import os
+import sqlite3
+
+from api.resources.helpers.schema import (
+    CONTACTS_MIGRATIONS,
+    get_schema_version,
+    migrate,
+)
+
+
+def create_legacy_contacts_db(path_to_db: str) -> sqlite3.Connection:
+    """
+    Returns a connection to a database with the untyped contacts table that was created
+    before the migrations existed.
+    """
+    con = sqlite3.connect(path_to_db)
+    con.execute("CREATE TABLE contacts(id, name, phone_number)")
+    con.executemany(
+        "INSERT INTO contacts VALUES(?, ?, ?)",
+        [
+            ("id-1", "Adam Bowman", "+44 1234567891"),
+            ("id-2", "Catherine Daniels", "+44 2345678912"),
+        ],
+    )
+    con.commit()
+
+    return con
+
+
+def test_migrate_upgrades_legacy_contacts_db_in_place(tmp_path):
+    """
+    migrate() should keep the existing contacts while adding the id primary key and
+    the indexes on name and phone_number.
+    """
+    con = create_legacy_contacts_db(os.path.join(tmp_path, "contacts.db"))
+
+    assert get_schema_version(con) == 0
+    assert migrate(con, CONTACTS_MIGRATIONS) == len(CONTACTS_MIGRATIONS)
+    assert get_schema_version(con) == len(CONTACTS_MIGRATIONS)
+
+    assert [
+        row
+        for row in con.execute(
+            "SELECT id, name, phone_number FROM contacts ORDER BY id"
+        )
+    ] == [
+        ("id-1", "Adam Bowman", "+44 1234567891"),
+        ("id-2", "Catherine Daniels", "+44 2345678912"),
+    ]
+
+    indexes = [row[1] for row in con.execute("PRAGMA index_list(contacts)")]
+    assert "contacts_name_idx" in indexes
+    assert "contacts_phone_number_idx" in indexes
+
+    # The contacts that were already there should be in the full text index
+    assert [
+        row[0]
+        for row in con.execute(
+            "SELECT contacts.id FROM contacts_fts "
+            "JOIN contacts ON contacts.rowid = contacts_fts.rowid "
+            "WHERE contacts_fts MATCH 'daniels'"
+        )
+    ] == ["id-2"]
+
+    # The digits of the phone numbers that were already there should be filled in
+    assert [
+        row
+        for row in con.execute(
+            "SELECT phone_digits, phone_digits_reversed FROM contacts ORDER BY id"
+        )
+    ] == [("441234567891", "198765432144"), ("442345678912", "219876543244")]
+
+    # So should the country of the phone numbers, and how many contacts are from each
+    assert [
+        row[0] for row in con.execute("SELECT country_code FROM contacts ORDER BY id")
+    ] == ["GB", "GB"]
+    assert con.execute("SELECT * FROM contact_country_counts").fetchall() == [("GB", 2)]
+
+    # ...which the triggers should keep up to date
+    con.execute(
+        "INSERT INTO contacts(id, name, phone_number, country_code) "
+        "VALUES('id-3', 'Dan Brown', '+1 2025550123', 'US')"
+    )
+    con.execute("UPDATE contacts SET country_code = 'US' WHERE id = 'id-1'")
+    con.execute("DELETE FROM contacts WHERE id = 'id-2'")
+    assert con.execute(
+        "SELECT * FROM contact_country_counts ORDER BY country_code"
+    ).fetchall() == [("GB", 0), ("US", 2)]
+    con.rollback()
+
+    # Running the migrations again should not do anything
+    assert migrate(con, CONTACTS_MIGRATIONS) == 0
+
+    con.close()
+
+
+def test_lookups_use_the_indexes(tmp_path):
+    """
+    Looking a contact up by id, name (including a LIKE 'x%' prefix), phone_number or
+    country_code should search an index rather than scan the contacts table.
+    """
+    con = create_legacy_contacts_db(os.path.join(tmp_path, "contacts.db"))
+    migrate(con, CONTACTS_MIGRATIONS)
+
+    for query in [
+        "SELECT * FROM contacts WHERE id = 'id-1'",
+        "SELECT * FROM contacts WHERE name = 'Adam Bowman'",
+        "SELECT * FROM contacts WHERE name LIKE 'adam%'",
+        "SELECT * FROM contacts WHERE phone_number = '+44 1234567891'",
+        "SELECT * FROM contacts WHERE country_code = 'GB' ORDER BY name, id",
+    ]:
+        plan = " ".join(row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {query}"))
+        assert plan.startswith("SEARCH")
+
+    con.close()
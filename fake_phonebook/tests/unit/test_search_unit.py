@@ -0,0 +1,45 @@
+"""
+Tests the search queries in ./api/resources/helpers/search.py
+"""
+
+import pytest
+from api.resources.helpers.search import (
+    MAX_SEARCH_TERMS,
+    matches,
+    name_tokens,
+    parse_search_query,
+    to_fts5_query,
+)
+
+
+def test_parse_search_query():
+    """
+    A query should be split into folded words, and anything that isn't a letter or a
+    digit (including FTS5 syntax) should be ignored.
+    """
+    assert parse_search_query("Smith") == [("smith", False)]
+    assert parse_search_query(' ZOË  o\'bri* NEAR("x") ') == [
+        ("zoe", False),
+        ("o", False),
+        ("bri", True),
+        ("near", False),
+        ("x", False),
+    ]
+    assert to_fts5_query(parse_search_query("adam smi*")) == '"adam" "smi"*'
+
+    for query in ["", "  *** ", "a*", " ".join(["a"] * (MAX_SEARCH_TERMS + 1))]:
+        with pytest.raises(ValueError):
+            parse_search_query(query)
+
+
+def test_matches():
+    """
+    Every term should have to be a word in the name (or start one, if it is a prefix).
+    """
+    tokens = name_tokens("Zoë Smith-Jones")
+
+    assert tokens == ["zoe", "smith", "jones"]
+    assert matches(parse_search_query("jones zoe"), tokens)
+    assert matches(parse_search_query("smi*"), tokens)
+    assert not matches(parse_search_query("smi"), tokens)
+    assert not matches(parse_search_query("zoe brown"), tokens)
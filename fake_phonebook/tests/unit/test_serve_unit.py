@@ -0,0 +1,71 @@
+"""
+Tests the launcher in ./serve.py
+"""
+
+from unittest.mock import Mock
+
+from click.testing import CliRunner
+from pytest_mock import mocker
+from serve import ASGI_APP, WSGI_APP, cli, default_workers
+
+
+def test_gunicorn_is_run_with_the_options_given(mocker: Mock):
+    """
+    By default, the WSGI app should be run under gunicorn with threaded workers sized
+    to the number of CPUs and preloaded, and the options given should be passed on.
+    """
+    mocker.patch("serve.os.cpu_count", return_value=4)
+    run_gunicorn = mocker.patch("serve.run_gunicorn")
+
+    result = CliRunner().invoke(cli, ["--port", "9000", "--backlog", "64"])
+    assert result.exit_code == 0
+
+    app_uri, options = run_gunicorn.call_args.args
+    assert app_uri == WSGI_APP
+    assert options["bind"] == "0.0.0.0:9000"
+    assert options["workers"] == 9
+    assert options["worker_class"] == "gthread"
+    assert options["preload_app"] is True
+    assert options["backlog"] == 64
+
+    # The ASGI app runs under gunicorn with uvicorn workers, one per CPU
+    CliRunner().invoke(cli, ["--asgi", "--max-requests", "1000"])
+
+    app_uri, options = run_gunicorn.call_args.args
+    assert app_uri == ASGI_APP
+    assert options["workers"] == 4
+    assert options["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert options["max_requests"] == 1000
+    assert options["max_requests_jitter"] == 100
+
+
+def test_reload_is_not_preloaded(mocker: Mock):
+    """
+    The app can't be reloaded if it was imported before the workers were forked, so
+    --reload should turn preloading off.
+    """
+    run_gunicorn = mocker.patch("serve.run_gunicorn")
+
+    CliRunner().invoke(cli, ["--reload", "--threads", "1"])
+
+    _, options = run_gunicorn.call_args.args
+    assert options["reload"] is True
+    assert options["preload_app"] is False
+    assert options["worker_class"] == "sync"
+
+
+def test_uvicorn_runs_the_asgi_app(mocker: Mock):
+    """
+    --server uvicorn should run the ASGI app with one worker per CPU.
+    """
+    run_uvicorn = mocker.patch("serve.run_uvicorn")
+
+    result = CliRunner().invoke(cli, ["--server", "uvicorn", "--keep-alive", "10"])
+    assert result.exit_code == 0
+
+    host, port, workers, backlog, graceful_timeout, keep_alive, reload = (
+        run_uvicorn.call_args.args
+    )
+    assert workers == default_workers(asgi=True)
+    assert keep_alive == 10
+    assert reload is False
@@ -0,0 +1,202 @@
+"""
+Tests the named statements in ./api/resources/helpers/statements.py
+"""
+
+import sqlite3
+
+import pytest
+from api.resources.helpers.etag import contact_etag
+from api.resources.helpers.schema import CONTACTS_MIGRATIONS, migrate
+from api.resources.helpers.statements import (
+    STATEMENTS,
+    execute,
+    get_sql,
+    get_statement_stats,
+    name_prefix_range,
+)
+
+
+def create_contacts_db() -> sqlite3.Connection:
+    """Returns a connection to an in-memory database with an empty contacts table"""
+    con = sqlite3.connect(":memory:")
+    con.create_function("contact_etag", 3, contact_etag, deterministic=True)
+    migrate(con, CONTACTS_MIGRATIONS)
+
+    return con
+
+
+def test_statements_are_valid_sql():
+    """
+    Every statement should compile against the contacts table (the temp table used by
+    insert_new_contacts() is created first).
+    """
+    con = create_contacts_db()
+    execute(con, "create_incoming_contacts")
+
+    for name in STATEMENTS:
+        sql = get_sql(name, None)
+
+        if not sql.lstrip().startswith("CREATE"):
+            con.execute(f"EXPLAIN {sql}", [None] * sql.count("?"))
+
+    con.close()
+
+
+def test_execute_counts_executions_and_binds_values():
+    """
+    execute() should count how many times each statement is run, and values should be
+    bound as parameters (so they can't change what the statement does).
+    """
+    con = create_contacts_db()
+    con.execute(
+        "INSERT INTO contacts(id, name, phone_number) VALUES(?, ?, ?)",
+        ("id-1", "Adam Bowman", "+44 1"),
+    )
+
+    before = get_statement_stats()["select_contact_by_id"]
+
+    assert execute(con, "select_contact_by_id", ["id-1"]).fetchall() == [
+        ("id-1", "Adam Bowman", "+44 1")
+    ]
+    assert execute(con, "select_contact_by_id", ["' OR '1' = '1"]).fetchall() == []
+
+    assert get_statement_stats()["select_contact_by_id"] == before + 2
+
+    con.close()
+
+
+def test_execute_reads_only_the_columns_asked_for():
+    """
+    A statement that reads contacts should only read the columns it is given (which
+    lets a page of ids and names be read from the name index alone), and only columns
+    of a contact can be given.
+    """
+    con = create_contacts_db()
+    con.execute(
+        "INSERT INTO contacts(id, name, phone_number) VALUES(?, ?, ?)",
+        ("id-1", "Adam Bowman", "+44 1"),
+    )
+
+    assert execute(con, "select_page", [10], ("id", "name")).fetchall() == [
+        ("id-1", "Adam Bowman")
+    ]
+
+    sql = get_sql("select_page", ("id", "name"))
+    plan = " ".join(row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}", [10]))
+    assert "COVERING INDEX contacts_name_idx" in plan
+
+    with pytest.raises(ValueError):
+        execute(con, "select_page", [10], ("id", "1; DROP TABLE contacts"))
+
+    con.close()
+
+
+def test_get_sql_is_cached():
+    """
+    get_sql() should only build the SQL of a statement (for a set of columns) once.
+    """
+    get_sql.cache_clear()
+
+    sql = get_sql("select_page", ("id", "name"))
+    assert get_sql("select_page", ("id", "name")) is sql
+    get_sql("select_page", None)
+
+    assert get_sql.cache_info().hits == 1
+    assert get_sql.cache_info().misses == 2
+
+
+def test_name_filters_search_the_name_index():
+    """
+    Every statement that filters contacts by name should search an index for the names
+    starting with the prefix (rather than scan it), and the range of those names should
+    hold only them (e.g. a % or _ in the prefix only matches itself).
+    """
+    con = create_contacts_db()
+    start, end = name_prefix_range("adam")
+
+    for name in STATEMENTS:
+        if "_by_name" not in name:
+            continue
+
+        # The parameters come in the order their parts of the name do
+        parameters = ["GB"] if "_in_country" in name else []
+
+        if name.endswith("_after"):
+            parameters.extend(["Adam Bowman", "id-1", end])
+        else:
+            parameters.extend([start, end])
+
+        parameters.append(10)
+
+        plan = " ".join(
+            row[3]
+            for row in con.execute(f"EXPLAIN QUERY PLAN {get_sql(name)}", parameters)
+        )
+        assert plan.startswith("SEARCH"), name
+        assert "name<?" in plan, name
+
+    assert name_prefix_range("Adam") == ("Adam", "adan")
+    # NOCASE has no upper case letters, so the character after @ is [ rather than A
+    assert name_prefix_range("A@") == ("A@", "a[")
+    assert name_prefix_range("az") == ("az", "a{")
+    assert name_prefix_range("a\U0010ffff") == ("a\U0010ffff", "b")
+
+    with pytest.raises(ValueError):
+        name_prefix_range("\U0010ffff")
+
+    con.executemany(
+        "INSERT INTO contacts(id, name, phone_number) VALUES(?, ?, ?)",
+        [
+            ("id-1", "100% Pure", "+44 1"),
+            ("id-2", "1000 Pure", "+44 2"),
+            ("id-3", "ADAM Bowman", "+44 3"),
+            ("id-4", "Adan Smith", "+44 4"),
+            ("id-5", "Ad[am", "+44 5"),
+        ],
+    )
+
+    for prefix, ids in [
+        ("100%", ["id-1"]),
+        ("10_", []),
+        ("adam", ["id-3"]),
+        ("AD", ["id-5", "id-3", "id-4"]),
+        ("Ad@", []),
+    ]:
+        rows = execute(con, "select_page_by_name", [*name_prefix_range(prefix), 10])
+        assert [row[0] for row in rows] == ids, prefix
+
+    con.close()
+
+
+def test_deep_name_filtered_pages_seek_to_the_cursor():
+    """
+    A page of the names starting with a prefix should cost the same however deep it is,
+    as the statement seeks straight to the cursor rather than stepping past every name
+    before it.
+    """
+    con = create_contacts_db()
+    con.executemany(
+        "INSERT INTO contacts(id, name, phone_number) VALUES(?, ?, ?)",
+        [(f"id-{i:05d}", f"Adam {i:05d}", "+44 1") for i in range(20000)],
+    )
+    _, end = name_prefix_range("adam")
+
+    def steps(after: tuple[str, str]) -> int:
+        """Returns how many thousands of steps SQLite took to read the page"""
+        ticks = 0
+
+        def tick() -> int:
+            nonlocal ticks
+            ticks += 1
+            return 0
+
+        con.set_progress_handler(tick, 1000)
+        rows = execute(con, "select_page_by_name_after", [*after, end, 10]).fetchall()
+        con.set_progress_handler(None, 1000)
+
+        assert len(rows) == 10
+        return ticks
+
+    assert steps(("Adam 19000", "id-19000")) <= steps(("Adam 00000", "id-00000")) + 1
+
+    con.close()
@@ -0,0 +1,314 @@
+"""
+Tests the ContactStores in ./api/resources/stores
+"""
+
+import os
+
+import pytest
+from api.resources.helpers.cache import get_contact_cache
+from api.resources.helpers.connection_pool import ConnectionPool, PoolTimeoutError
+from api.resources.helpers.etag import contact_etag
+from api.resources.helpers.statements import get_statement_stats
+from api.resources.http_methods.get import get_contact_by_id
+from api.resources.stores.base import NameTakenError, PreconditionFailedError
+from api.resources.stores.config import create_store
+from api.resources.stores.memory import InMemoryContactStore
+from api.resources.stores.sqlite import SQLiteContactStore
+
+RECORDS = [
+    ("id-1", "adam Bowman", "+44 1234567891"),
+    ("id-2", "Adam Smith", "+44 1234567892"),
+    ("id-3", "Beth Jones", "+44 1234567893"),
+    ("id-4", "ADAM BOWMAN", "+44 1234567894"),
+    ("id-5", "Carl Evans", "+44 1234567895"),
+]
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteContactStore(ConnectionPool(os.path.join(tmp_path, "store.db")))
+    else:
+        store = InMemoryContactStore()
+
+    yield store
+
+    store.close()
+
+
+def test_stores_behave_the_same(store):
+    """
+    Every store should skip duplicate names, list contacts in (name, id) order, page
+    through them and update and delete them in the same way.
+    """
+    # "ADAM BOWMAN" is the same name as "adam Bowman" (ignoring case)
+    assert store.insert_many(RECORDS) == [
+        RECORDS[0],
+        RECORDS[1],
+        RECORDS[2],
+        RECORDS[4],
+    ]
+    assert store.insert_many([("id-6", "Beth JONES", "+44 1")]) == []
+
+    assert [contact["id"] for contact in store.iter_contacts()] == [
+        "id-1",
+        "id-2",
+        "id-3",
+        "id-5",
+    ]
+    assert [contact["id"] for contact in store.iter_contacts("ADAM")] == [
+        "id-1",
+        "id-2",
+    ]
+
+    assert store.get_page(None, None, 2) == [
+        {"id": "id-1", "name": "adam Bowman", "phone_number": "+44 1234567891"},
+        {"id": "id-2", "name": "Adam Smith", "phone_number": "+44 1234567892"},
+    ]
+    assert [
+        contact["id"] for contact in store.get_page(None, ("Adam Smith", "id-2"), 2)
+    ] == [
+        "id-3",
+        "id-5",
+    ]
+    assert store.get_page("adam", ("Adam Smith", "id-2"), 2) == []
+    assert [
+        contact["id"] for contact in store.get_page("ADAM", ("adam bowman", "id-1"), 2)
+    ] == ["id-2"]
+
+    # A cursor before the prefix starts the page at the prefix, and one after the names
+    # starting with it gives an empty page
+    assert [contact["id"] for contact in store.get_page("b", ("Adam", "id-9"), 2)] == [
+        "id-3"
+    ]
+    assert store.get_page("adam", ("Beth", "id-0"), 2) == []
+
+    # Only the fields asked for are returned
+    assert list(store.iter_contacts("adam", fields=("id", "name"))) == [
+        {"id": "id-1", "name": "adam Bowman"},
+        {"id": "id-2", "name": "Adam Smith"},
+    ]
+    assert store.get_page(None, None, 1, fields=("phone_number",)) == [
+        {"phone_number": "+44 1234567891"}
+    ]
+
+    # Searching finds a contact by any word in its name, and ranks shorter names first
+    store.insert_many([("id-7", "Adam Bowman Smith", "+44 1234567897")])
+    assert [contact["id"] for contact in store.search([("bowman", False)], 10)] == [
+        "id-1",
+        "id-7",
+    ]
+    assert [contact["id"] for contact in store.search([("smi", True)], 1)] == ["id-2"]
+    assert store.search([("smi", False)], 10) == []
+    store.delete_many(["id-7"])
+
+    # Contacts can be found by (the end of) their phone number, however it is written
+    assert [
+        contact["id"] for contact in store.find_by_phone("441234567893", False, 10)
+    ] == ["id-3"]
+    assert [contact["id"] for contact in store.find_by_phone("7893", True, 10)] == [
+        "id-3"
+    ]
+    assert [contact["id"] for contact in store.find_by_phone("891", True, 10)] == [
+        "id-1"
+    ]
+    assert store.find_by_phone("1234567893", False, 10) == []
+    assert store.find_by_phone("7893", True, 10, ("name",)) == [{"name": "Beth Jones"}]
+
+    # Contacts can be listed and counted by the country their phone number is from
+    store.insert_many(
+        [
+            ("id-10", "Dan Brown", "+1 202 555 0123"),
+            ("id-11", "Eve Stone", "020 7946 0000"),
+        ]
+    )
+    assert store.count_by_country() == {"GB": 4, "US": 1, "": 1}
+    assert [contact["id"] for contact in store.iter_contacts(None, "US")] == ["id-10"]
+    assert [contact["id"] for contact in store.iter_contacts("adam", "GB")] == [
+        "id-1",
+        "id-2",
+    ]
+    assert [
+        contact["id"]
+        for contact in store.get_page(None, ("Adam Smith", "id-2"), 10, "GB")
+    ] == ["id-3", "id-5"]
+    assert store.get_page("adam", None, 10, "US") == []
+
+    # Changing a phone number moves the contact to the country of the new one
+    store.update("id-10", None, "+44 7700 900123")
+    assert store.count_by_country() == {"GB": 5, "": 1}
+    store.delete_many(["id-10", "id-11"])
+    assert store.count_by_country() == {"GB": 4}
+
+    # Renaming a contact moves it in the order
+    assert store.update("id-1", "Zoe Bowman", None) == {
+        "id": "id-1",
+        "name": "Zoe Bowman",
+        "phone_number": "+44 1234567891",
+    }
+    assert [contact["id"] for contact in store.iter_contacts()][-1] == "id-1"
+    assert store.search([("zoe", False)], 10)[0]["id"] == "id-1"
+    assert store.search([("bowman", False), ("adam", False)], 10) == []
+    assert store.update("id-9", "Nobody", None) is None
+
+    # A contact can't be renamed to the name of another one (ignoring case), but can
+    # change the case of its own
+    with pytest.raises(NameTakenError):
+        store.update("id-2", "ZOE bowman", None)
+    with pytest.raises(NameTakenError):
+        store.update("id-2", "Zoe Bowman", None, ["*"])
+    assert store.update("id-1", "ZOE BOWMAN", None)["name"] == "ZOE BOWMAN"
+    assert store.update("id-1", "Zoe Bowman", None)["name"] == "Zoe Bowman"
+    assert store.get("id-2")["name"] == "Adam Smith"
+
+    with pytest.raises(PreconditionFailedError):
+        store.update("id-2", None, "+44 2", ["not-the-etag"])
+
+    etag = contact_etag("id-2", "Adam Smith", "+44 1234567892")
+    assert store.update("id-2", None, "+44 (2)", [etag])["phone_number"] == "+44 (2)"
+    assert [contact["id"] for contact in store.find_by_phone("442", False, 10)] == [
+        "id-2"
+    ]
+
+    deleted = store.delete_many(["id-3", "id-9", "id-5"])
+    assert sorted(contact["id"] for contact in deleted) == ["id-3", "id-5"]
+    assert store.get("id-3") is None
+    assert store.get("id-2") == {
+        "id": "id-2",
+        "name": "Adam Smith",
+        "phone_number": "+44 (2)",
+    }
+
+
+def test_memory_store_from_db(tmp_path):
+    """
+    InMemoryContactStore.from_db() should copy every contact in a database, and
+    create_store() should build the store chosen by PHONEBOOK_STORE.
+    """
+    path_to_db = os.path.join(tmp_path, "seed.db")
+    sqlite_store = SQLiteContactStore(ConnectionPool(path_to_db))
+    sqlite_store.insert_many(RECORDS)
+    sqlite_store.close()
+
+    store = create_store(
+        {"PHONEBOOK_STORE": "memory", "PHONEBOOK_STORE_SEED": path_to_db}
+    )
+
+    assert isinstance(store, InMemoryContactStore)
+
+    sqlite_store = SQLiteContactStore(ConnectionPool(path_to_db))
+    assert list(store.iter_contacts()) == list(sqlite_store.iter_contacts())
+    sqlite_store.close()
+
+    with pytest.raises(ValueError):
+        create_store({"PHONEBOOK_STORE": "postgres"})
+
+
+def test_version_changes_with_every_write(store):
+    """
+    The version of the contacts should change on every insert, update and delete, and
+    (with SQLite) when another process writes to the database.
+    """
+    versions = [store.version()]
+
+    store.insert_many(RECORDS[:2])
+    versions.append(store.version())
+    store.update("id-1", "Adam Bowman", None)
+    versions.append(store.version())
+    store.delete_many(["id-2"])
+    versions.append(store.version())
+
+    assert len(set(versions)) == 4
+
+    if isinstance(store, SQLiteContactStore):
+        # Another store (with a pool of its own) stands in for another process
+        other = SQLiteContactStore(ConnectionPool(store.name))
+        other.delete_many(["id-1"])
+        other.close()
+
+        assert store.version() != versions[-1]
+
+
+def test_cached_contacts_are_checked_against_other_processes(tmp_path, mocker):
+    """
+    A contact cached by one process should not be returned once another process has
+    changed or deleted it and the cache has checked the version of the contacts again.
+    """
+    monotonic = mocker.patch("api.resources.helpers.cache.time.monotonic")
+    monotonic.return_value = 100.0
+
+    path_to_db = os.path.join(tmp_path, "store.db")
+    store = SQLiteContactStore(ConnectionPool(path_to_db))
+    store.insert_many(RECORDS[:1])
+    interval = get_contact_cache(store.name).check_interval
+
+    assert get_contact_by_id("id-1", store)["name"] == "adam Bowman"
+
+    # Another store (with a pool of its own, and without going through the http
+    # methods that invalidate the cache) stands in for another process
+    other = SQLiteContactStore(ConnectionPool(path_to_db))
+    other.update("id-1", "Adam Bowman", None)
+    monotonic.return_value += interval
+    assert get_contact_by_id("id-1", store)["name"] == "Adam Bowman"
+
+    other.delete_many(["id-1"])
+    monotonic.return_value += interval
+    assert get_contact_by_id("id-1", store) is None
+
+    other.close()
+    store.close()
+
+
+def test_cached_contacts_are_read_without_queries(tmp_path):
+    """
+    Reading a cached contact again should not run any statement (the version of the
+    contacts is only read once every check_interval seconds).
+    """
+    store = SQLiteContactStore(ConnectionPool(os.path.join(tmp_path, "store.db")))
+    store.insert_many(RECORDS[:1])
+
+    get_contact_by_id("id-1", store)
+    before = get_statement_stats()
+
+    for _ in range(100):
+        assert get_contact_by_id("id-1", store)["name"] == "adam Bowman"
+
+    assert get_statement_stats() == before
+
+    store.close()
+
+
+def test_iter_contacts_gives_the_connection_back_between_chunks(tmp_path):
+    """
+    The SQLite store should read the contacts it iterates over a chunk at a time, and
+    only hold on to a connection while it reads a chunk, so a slow reader doesn't keep
+    it from other requests. The first chunk should be read straight away.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "store.db"), max_size=1, timeout=0.01)
+    store = SQLiteContactStore(pool, iter_chunk_size=2)
+    store.insert_many(RECORDS)
+
+    contacts = store.iter_contacts()
+    assert next(contacts)["id"] == "id-1"
+
+    # The only connection is free while the rest of the contacts are still to be read
+    with pool.connection():
+        pass
+
+    assert [contact["id"] for contact in contacts] == ["id-2", "id-3", "id-5"]
+
+    # The name and id the chunks start after are read, but only the fields are given
+    assert list(store.iter_contacts("adam", fields=("phone_number",))) == [
+        {"phone_number": "+44 1234567891"},
+        {"phone_number": "+44 1234567892"},
+    ]
+    assert list(store.iter_contacts(fields=("name", "id")))[2:] == [
+        {"name": "Beth Jones", "id": "id-3"},
+        {"name": "Carl Evans", "id": "id-5"},
+    ]
+
+    with pool.connection():
+        with pytest.raises(PoolTimeoutError):
+            store.iter_contacts()
+
+    store.close()
@@ -0,0 +1,91 @@
+"""
+Tests the helpers in ./api/resources/helpers/streaming.py
+"""
+
+import io
+import json
+
+import falcon
+from api.resources.helpers.media import create_media_handlers
+from api.resources.helpers.streaming import (
+    MEDIA_NDJSON,
+    MalformedItem,
+    iter_json_array,
+    iter_ndjson,
+    stream_json,
+    stream_ndjson,
+)
+
+CONTACTS = [
+    {"id": "id-1", "name": "Adam Bowman", "phone_number": "+44 1234567891"},
+    {"id": "id-2", "name": "Catherine Daniels", "phone_number": "+44 2345678912"},
+    {"id": "id-3", "name": "Esther Frank", "phone_number": "+44 3456789123"},
+]
+
+
+def test_stream_json_and_ndjson():
+    """
+    stream_json() and stream_ndjson() should yield bytes that, put back together, are
+    the JSON array (or lines of JSON) of the contacts given.
+    """
+    assert json.loads(b"".join(stream_json(iter(CONTACTS), chunk_size=10))) == CONTACTS
+    assert json.loads(b"".join(stream_json(iter([])))) == []
+
+    lines = b"".join(stream_ndjson(iter(CONTACTS), chunk_size=10)).splitlines()
+    assert [json.loads(line) for line in lines] == CONTACTS
+
+
+def test_streamed_bodies_are_the_same_as_serialized_ones():
+    """
+    stream_json() and stream_ndjson() should yield the same bytes as the JSON and
+    newline delimited JSON media handlers write (names that aren't ASCII included).
+    """
+    contacts = CONTACTS + [
+        {"id": "id-4", "name": "Zoë Ørsted", "phone_number": "+45 32123456"}
+    ]
+    handlers = create_media_handlers()
+
+    for stream, media_type in [
+        (stream_json, falcon.MEDIA_JSON),
+        (stream_ndjson, MEDIA_NDJSON),
+    ]:
+        body = handlers[media_type].serialize(contacts, media_type)
+        assert b"".join(stream(iter(contacts), chunk_size=10)) == body
+
+
+def test_iter_json_array():
+    """
+    iter_json_array() should yield the items of a JSON array however the stream is split
+    into chunks, and a MalformedItem if the array is not valid JSON.
+    """
+    body = json.dumps(CONTACTS).encode("utf-8")
+
+    for chunk_size in [1, 7, 1024]:
+        assert (
+            list(iter_json_array(io.BytesIO(body), chunk_size=chunk_size)) == CONTACTS
+        )
+
+    # The start of the array may already have been read from the stream
+    stream = io.BytesIO(body)
+    first_chunk = stream.read(5)
+    assert list(iter_json_array(stream, first_chunk)) == CONTACTS
+
+    items = list(iter_json_array(io.BytesIO(b'[{"name": "A"}, {"name": ')))
+    assert items[0] == {"name": "A"}
+    assert isinstance(items[1], MalformedItem)
+
+    items = list(iter_json_array(io.BytesIO(b'{"name": "A"}')))
+    assert isinstance(items[0], MalformedItem)
+
+
+def test_iter_ndjson():
+    """
+    iter_ndjson() should yield the item on each (non-blank) line and a MalformedItem for
+    a line that is not valid JSON.
+    """
+    body = b'{"name": "A"}\n\nnot json\n{"name": "B"}'
+    items = list(iter_ndjson(io.BytesIO(body), chunk_size=4))
+
+    assert items[0] == {"name": "A"}
+    assert isinstance(items[1], MalformedItem)
+    assert items[2] == {"name": "B"}
@@ -0,0 +1,74 @@
+"""
+Tests the SuggestIndex in ./api/resources/helpers/suggest.py
+"""
+
+import time
+
+from api.resources.helpers.suggest import SuggestIndex
+
+CONTACTS = [
+    {"id": "id-1", "name": "John Smith", "phone_number": "+44 1234567891"},
+    {"id": "id-2", "name": "Johnson  Adams", "phone_number": "+44 1234567892"},
+    {"id": "id-3", "name": "Zoë Jones", "phone_number": "+44 1234567893"},
+    {"id": "id-4", "name": "john brown", "phone_number": "+44 1234567894"},
+]
+
+
+def names(suggestions: list[dict[str, str]]) -> list[str]:
+    return [suggestion["name"] for suggestion in suggestions]
+
+
+def test_suggest_by_prefix():
+    """
+    Names should be suggested in order of their folded names, at most k at a time, and
+    be kept up to date by add() and remove().
+    """
+    index = SuggestIndex(lambda: iter(CONTACTS))
+
+    assert names(index.suggest("JOHN", 10)) == [
+        "john brown",
+        "John Smith",
+        "Johnson  Adams",
+    ]
+    assert names(index.suggest("john ", 10)) == ["john brown", "John Smith"]
+    assert names(index.suggest("johnson a", 10)) == ["Johnson  Adams"]
+    assert names(index.suggest("zoe", 10)) == ["Zoë Jones"]
+    assert index.suggest("john", 1) == [{"id": "id-4", "name": "john brown"}]
+    assert index.suggest("x", 10) == []
+
+    index.add(
+        [{"id": "id-5", "name": "John Adams"}, {"id": "id-1", "name": "Jon Smith"}]
+    )
+    index.remove(["id-4"])
+
+    assert names(index.suggest("jo", 10)) == [
+        "John Adams",
+        "Johnson  Adams",
+        "Jon Smith",
+    ]
+    assert index.stats()["size"] == 4
+    assert index.stats()["loads"] == 1
+
+
+def test_suggest_overflow_and_refresh():
+    """
+    An index with more contacts than max_entries should hold no names (and return
+    None), and a stale index should be reloaded in the background.
+    """
+    contacts = list(CONTACTS)
+    index = SuggestIndex(lambda: iter(contacts), max_entries=3, refresh_interval=0)
+
+    assert index.suggest("john", 10) is None
+    assert index.stats()["size"] == 0
+
+    # Once there are few enough contacts again, a reload fills the index
+    contacts.pop()
+
+    for _ in range(100):
+        if index.suggest("john", 10) is not None:
+            break
+
+        time.sleep(0.01)
+
+    assert names(index.suggest("john", 10)) == ["John Smith", "Johnson  Adams"]
+    assert index.stats()["overflowed"] is False
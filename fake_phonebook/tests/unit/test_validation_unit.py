@@ -0,0 +1,92 @@
+"""
+Tests the validators of request bodies in ./api/resources/helpers/validation.py
+"""
+
+import pytest
+from api.resources.helpers.validation import (
+    MAX_NAME_LENGTH,
+    ValidationError,
+    normalize_phone_number,
+    validate_contact,
+    validate_contact_ids,
+    validate_update,
+)
+
+
+def test_normalize_phone_number():
+    """
+    Phone numbers should lose the whitespace around them, have single spaces and a +
+    in place of a leading 00, and be refused if they aren't phone numbers.
+    """
+    assert normalize_phone_number(" +44  5361\t237462 ") == "+44 5361 237462"
+    assert normalize_phone_number("0044 (0)20 7946-0018") == "+44 (0)20 7946-0018"
+    assert normalize_phone_number("020.7946.0018") == "020.7946.0018"
+
+    for phone_number in ["", "12", "+44 5361 2374 6212 3456", "call me", "44+1", 441]:
+        with pytest.raises(ValueError):
+            normalize_phone_number(phone_number)
+
+
+def test_validate_contact():
+    """
+    A new contact should have a valid name and phone number, which are normalized, and
+    every field that isn't valid should have an error.
+    """
+    assert validate_contact(
+        {"name": " Zoë Smith ", "phone_number": "0044 5361237462", "email": "z@z.com"}
+    ) == {"name": "Zoë Smith", "phone_number": "+44 5361237462"}
+
+    # The phone number is checked, not the length of the name
+    with pytest.raises(ValidationError) as error:
+        validate_contact({"name": "Zoë Smith", "phone_number": ""})
+    assert error.value.errors == [
+        {"field": "phone_number", "message": str(error.value)}
+    ]
+
+    with pytest.raises(ValidationError) as error:
+        validate_contact({"name": "x" * (MAX_NAME_LENGTH + 1)})
+    assert [error["field"] for error in error.value.errors] == ["name", "phone_number"]
+
+    with pytest.raises(ValidationError) as error:
+        validate_contact(["Zoë Smith", "+44 5361237462"])
+    assert error.value.to_media() == {
+        "title": "Bad request",
+        "description": "The body must be a JSON object.",
+        "errors": [{"message": "The body must be a JSON object."}],
+    }
+
+
+def test_validate_update():
+    """An update should have a valid name and/or phone number (null is not given)"""
+    assert validate_update({"name": "Zoë Smith", "phone_number": None}) == {
+        "name": "Zoë Smith"
+    }
+    assert validate_update({"phone_number": "+44 5361237462"}) == {
+        "phone_number": "+44 5361237462"
+    }
+
+    for body in [{}, {"name": None}, {"name": "Zoë\nSmith"}, "Zoë Smith"]:
+        with pytest.raises(ValidationError):
+            validate_update(body)
+
+
+def test_validate_contact_ids():
+    """
+    The body of a DELETE should be a list of objects with ids, and the errors of the
+    items that aren't should have their index.
+    """
+    assert validate_contact_ids([{"id": "id-1"}, {"id": "id-2", "name": "Two"}]) == [
+        "id-1",
+        "id-2",
+    ]
+
+    for body in [[], {"id": "id-1"}, None]:
+        with pytest.raises(ValidationError):
+            validate_contact_ids(body)
+
+    with pytest.raises(ValidationError) as error:
+        validate_contact_ids([{"id": "id-1"}, {"fax": "32567939849"}, "id-3"])
+    assert [(error["index"], error.get("field")) for error in error.value.errors] == [
+        (1, "id"),
+        (2, None),
+    ]
@@ -0,0 +1,83 @@
+"""
+Tests the WriteQueue in ./api/resources/helpers/write_queue.py
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from api.resources.helpers.connection_pool import ConnectionPool
+from api.resources.helpers.storage import StorageConfig
+from api.resources.helpers.write_queue import WriteQueue, WriteQueueClosedError
+from api.resources.stores.sqlite import SQLiteContactStore
+
+
+def test_writes_are_committed_in_batches(tmp_path):
+    """
+    Writes submitted at the same time should share batches, and every one of them
+    should be committed by the time submit() returns.
+    """
+    pool = ConnectionPool(os.path.join(tmp_path, "queue.db"), max_size=2)
+    write_queue = WriteQueue(pool, max_batch=10, max_delay=0.05)
+
+    def insert(i):
+        return write_queue.submit(
+            lambda con: con.execute(
+                "INSERT INTO contacts(id, name, phone_number) VALUES(?, ?, ?)",
+                [f"id-{i}", f"Contact {i}", "+44 1"],
+            ).rowcount
+        )
+
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        assert list(executor.map(insert, range(40))) == [1] * 40
+
+    with pool.connection() as con:
+        assert con.execute("SELECT COUNT(*) FROM contacts").fetchone()[0] == 40
+
+    stats = write_queue.stats()
+    assert stats["writes"] == 40
+    assert stats["batches"] < 40
+    assert stats["max_batch_size"] <= 10
+    assert stats["queue_depth"] == 0
+
+    write_queue.close()
+    pool.close()
+
+
+def test_failed_write_only_fails_itself(tmp_path):
+    """
+    A write that raises should be rolled back and raise from submit(), without undoing
+    the other writes in its batch. A closed queue shouldn't take any more writes.
+    """
+    store = SQLiteContactStore(
+        ConnectionPool(
+            os.path.join(tmp_path, "queue.db"),
+            storage=StorageConfig(group_commit=True, group_commit_delay=0.05),
+        )
+    )
+    assert store.write_queue is not None
+
+    def insert_then_fail(con):
+        con.execute(
+            "INSERT INTO contacts(id, name, phone_number) VALUES('id-x', 'X', '+44 1')"
+        )
+        raise ValueError("This write fails.")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        failed = executor.submit(store.write_queue.submit, insert_then_fail)
+        inserted = executor.submit(
+            store.insert_many, [("id-1", "Adam Bowman", "+44 1234567891")]
+        )
+
+        with pytest.raises(ValueError):
+            failed.result()
+
+        assert inserted.result() == [("id-1", "Adam Bowman", "+44 1234567891")]
+
+    assert store.get("id-x") is None
+    assert store.get("id-1")["name"] == "Adam Bowman"
+
+    store.close()
+
+    with pytest.raises(WriteQueueClosedError):
+        store.insert_many([("id-2", "Beth Jones", "+44 1234567892")])